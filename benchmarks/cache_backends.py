@@ -0,0 +1,122 @@
+"""Latency and cross-worker hit rate of the memory and shared caches.
+
+Times get and set of one process against a cache holding `--keys` entries,
+then lets `--workers` forked processes look up the same keys, caching the
+misses, like gunicorn workers resolving the ids of popular URLs.
+
+    python -m benchmarks.cache_backends --keys 10000 --workers 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+import typing as t
+
+from page_analyzer import cache
+from page_analyzer import shared_cache
+
+if t.TYPE_CHECKING:
+    from multiprocessing.sharedctypes import Synchronized
+
+# where gunicorn.conf.py puts the shared cache
+CACHE_PARENT_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def create_cache(backend: str,
+                 cache_dir: str,
+                 maxsize: int,
+                 ) -> cache.CacheBackend:
+    if backend == 'shared':
+        return shared_cache.SharedCache('benchmark', maxsize=maxsize,
+                                        ttl=3600, cache_dir=cache_dir)
+    return cache.LRUCache(maxsize=maxsize, ttl=3600)
+
+
+def percentiles(timings: list[int]) -> dict[str, float]:
+    quantiles = statistics.quantiles(timings, n=100)
+    return {'p50_us': round(quantiles[49] / 1000, 2),
+            'p99_us': round(quantiles[98] / 1000, 2)}
+
+
+def measure_latency(backend: cache.CacheBackend,
+                    keys: list[str],
+                    lookups: int,
+                    ) -> dict[str, dict[str, float]]:
+    set_timings = []
+    for number, key in enumerate(keys):
+        started = time.perf_counter_ns()
+        backend.set(key, number)
+        set_timings.append(time.perf_counter_ns() - started)
+    get_timings = []
+    for key in random.choices(keys, k=lookups):
+        started = time.perf_counter_ns()
+        backend.get(key)
+        get_timings.append(time.perf_counter_ns() - started)
+    return {'set': percentiles(set_timings), 'get': percentiles(get_timings)}
+
+
+def look_up(backend_name: str,
+            cache_dir: str,
+            keys: list[str],
+            lookups: int,
+            seed: int,
+            hits: Synchronized[int],
+            ) -> None:
+    """Look up random keys in a worker, caching the misses."""
+    backend = create_cache(backend_name, cache_dir, len(keys))
+    generator = random.Random(seed)
+    for key in generator.choices(keys, k=lookups):
+        if backend.get(key) is None:
+            backend.set(key, key)
+    with hits.get_lock():
+        hits.value += backend.stats()['hits']
+
+
+def measure_hit_rate(backend_name: str,
+                     keys: list[str],
+                     workers: int,
+                     lookups: int,
+                     ) -> float:
+    context = multiprocessing.get_context('fork')
+    hits = context.Value('q', 0)
+    with tempfile.TemporaryDirectory(dir=CACHE_PARENT_DIR) as cache_dir:
+        processes = [context.Process(target=look_up,
+                                     args=(backend_name, cache_dir, keys,
+                                           lookups, seed, hits))
+                     for seed in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    return round(hits.value / (workers * lookups), 3)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keys', type=int, default=10000)
+    parser.add_argument('--lookups', type=int, default=20000,
+                        help='Lookups timed and made by every worker.')
+    parser.add_argument('--workers', type=int, default=5)
+    args = parser.parse_args()
+
+    keys = [f'https://site{number}.example.com'
+            for number in range(args.keys)]
+    results: dict[str, dict[str, t.Any]] = {}
+    for backend_name in ('memory', 'shared'):
+        with tempfile.TemporaryDirectory(dir=CACHE_PARENT_DIR) as cache_dir:
+            backend = create_cache(backend_name, cache_dir, args.keys)
+            results[backend_name] = measure_latency(backend, keys,
+                                                    args.lookups)
+        results[backend_name]['hit_rate'] = measure_hit_rate(
+            backend_name, keys, args.workers, args.lookups)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Size and scan time of url_checks before and after moving the parsed
+strings into check_contents.
+
+    DATABASE_URL=... python -m benchmarks.check_storage --checks 200000
+
+Builds the former layout with h1, title and description on every check in
+a scratch schema, applies migrations/001_check_contents.sql to it and
+reclaims the dropped columns with VACUUM FULL, the way an operator would.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import pathlib
+import time
+import typing as t
+
+import psycopg2
+from psycopg2 import sql
+
+MIGRATIONS_DIR = pathlib.Path(__file__).parent.parent / 'migrations'
+MIGRATION_PATH = MIGRATIONS_DIR / '001_check_contents.sql'
+SCHEMA = 'check_storage_benchmark'
+
+INLINE_SCHEMA = '''
+CREATE TABLE urls (
+    id bigint PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
+    name varchar(255) UNIQUE NOT NULL,
+    created_at timestamp NOT NULL
+);
+CREATE TABLE url_checks (
+    id bigint PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
+    url_id bigint REFERENCES urls (id),
+    status_code int NOT NULL,
+    h1 varchar(255),
+    title varchar(255),
+    description text,
+    created_at timestamp NOT NULL
+);
+'''
+
+# CMS defaults repeat across sites: few headings, titles and descriptions
+# combine into `distinct` contents.
+FILL = '''
+INSERT INTO urls (name, created_at)
+SELECT 'https://site' || i || '.example.com', now()
+FROM generate_series(1, %(urls)s) AS i;
+
+INSERT INTO url_checks (url_id, status_code, h1, title, description,
+                        created_at)
+SELECT 1 + i %% %(urls)s,
+       200,
+       CASE WHEN i %% 7 = 0 THEN NULL ELSE 'Home' END,
+       'Welcome to our site | Page ' || i %% %(distinct)s,
+       CASE WHEN i %% 3 = 0 THEN ''
+            ELSE 'Just another site built with a popular CMS. '
+                 || 'We make the best products for your business.'
+       END,
+       now() - i * interval '1 minute'
+FROM generate_series(1, %(checks)s) AS i;
+'''
+
+SIZE_QUERY = '''
+SELECT coalesce(sum(pg_total_relation_size(c.oid)), 0)
+FROM pg_class AS c
+JOIN pg_namespace AS n ON n.oid = c.relnamespace
+WHERE n.nspname = %s AND c.relname IN ('url_checks', 'check_contents');
+'''
+
+SCAN_QUERY = 'SELECT count(*), max(status_code) FROM url_checks;'
+
+
+def measure(cursor: t.Any) -> dict[str, float]:
+    """Return the size of the check tables and the time of a full scan."""
+    cursor.execute(SIZE_QUERY, (SCHEMA,))
+    size = int(cursor.fetchone()[0])
+    cursor.execute(SCAN_QUERY)  # warm the buffers
+    started = time.perf_counter()
+    for _ in range(5):
+        cursor.execute(SCAN_QUERY)
+    scan_time = (time.perf_counter() - started) / 5
+    return {'size_mb': round(size / 2**20, 2),
+            'scan_ms': round(scan_time * 1000, 2)}
+
+
+def run(db_url: str, checks: int, distinct: int) -> dict[str, t.Any]:
+    connection = psycopg2.connect(db_url)
+    connection.autocommit = True
+    cursor = connection.cursor()
+    schema = sql.Identifier(SCHEMA)
+    try:
+        cursor.execute(sql.SQL('DROP SCHEMA IF EXISTS {} CASCADE; '
+                               'CREATE SCHEMA {};').format(schema, schema))
+        cursor.execute(sql.SQL('SET search_path TO {}').format(schema))
+        cursor.execute(INLINE_SCHEMA)
+        cursor.execute(FILL, {'urls': max(1, checks // 10),
+                              'checks': checks,
+                              'distinct': distinct})
+        cursor.execute('VACUUM ANALYZE url_checks')
+        before = measure(cursor)
+
+        cursor.execute(MIGRATION_PATH.read_text())
+        cursor.execute('VACUUM FULL ANALYZE url_checks')
+        cursor.execute('VACUUM ANALYZE check_contents')
+        after = measure(cursor)
+        cursor.execute('SELECT count(*) FROM check_contents')
+        contents = cursor.fetchone()[0]  # type: ignore
+    finally:
+        cursor.execute(sql.SQL('DROP SCHEMA IF EXISTS {} CASCADE')
+                       .format(schema))
+        connection.close()
+
+    return {'checks': checks, 'contents': contents,
+            'before': before, 'after': after,
+            'size_ratio': round(after['size_mb'] / before['size_mb'], 2)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--checks', type=int, default=200_000)
+    parser.add_argument('--distinct', type=int, default=500,
+                        help='Number of distinct titles.')
+    args = parser.parse_args()
+
+    results = run(os.environ['DATABASE_URL'], args.checks, args.distinct)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
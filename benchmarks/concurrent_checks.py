@@ -0,0 +1,90 @@
+"""Load test for concurrent URL checks.
+
+Starts a slow stand-in site and the application under gunicorn, then
+fires concurrent POST /urls/<id>/checks requests. With sync workers the
+checks serialize on the number of workers, with gthread they overlap.
+
+    python -m benchmarks.concurrent_checks --worker-class sync
+    python -m benchmarks.concurrent_checks --worker-class gthread
+
+Requires DATABASE_URL pointing to a database created from database.sql.
+"""
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import math
+import os
+import time
+
+import dotenv
+import requests
+
+from benchmarks import harness
+
+
+def fire_checks(base_url: str,
+                url_id: int,
+                total: int,
+                concurrency: int,
+                ) -> float:
+    """Send the checks concurrently, return the elapsed time."""
+    check_url = f'{base_url}/urls/{url_id}/checks'
+
+    def post_check(_: int) -> int:
+        response = requests.post(check_url, allow_redirects=False,
+                                 timeout=60)
+        return response.status_code
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        statuses = list(executor.map(post_check, range(total)))
+    elapsed = time.monotonic() - started
+
+    if any(status != 302 for status in statuses):
+        raise RuntimeError(f'Unexpected statuses: {set(statuses)}')
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--worker-class', default='gthread')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=32)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--delay', type=float, default=0.5)
+    args = parser.parse_args()
+
+    if args.worker_class == 'sync':
+        # gunicorn silently turns sync workers with threads into gthread
+        args.threads = 1
+
+    dotenv.load_dotenv()
+    profile = harness.SiteProfile(latency=args.delay, page_size=1_000)
+    env = {'GUNICORN_WORKERS': str(args.workers),
+           'GUNICORN_WORKER_CLASS': args.worker_class,
+           'GUNICORN_THREADS': str(args.threads)}
+
+    with harness.run_fleet([profile]) as sites:
+        url_id, = harness.create_site_records(os.getenv('DATABASE_URL', ''),
+                                              [sites[0].url])
+        with harness.run_gunicorn(harness.get_free_port(), env) as base_url:
+            elapsed = fire_checks(base_url, url_id,
+                                  args.requests, args.concurrency)
+
+    serialized = math.ceil(args.requests / args.workers) * args.delay
+    print(json.dumps({'worker_class': args.worker_class,
+                      'workers': args.workers,
+                      'threads': args.threads,
+                      'requests': args.requests,
+                      'elapsed_seconds': round(elapsed, 3),
+                      'checks_per_second': round(args.requests / elapsed, 2),
+                      'serialized_seconds': serialized,
+                      'speedup': round(serialized / elapsed, 2)},
+                     indent=2))
+
+
+if __name__ == '__main__':
+    main()
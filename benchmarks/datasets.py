@@ -0,0 +1,115 @@
+"""Synthetic and recorded datasets shared by the benchmarks."""
+from __future__ import annotations
+
+import datetime
+import gzip
+import pathlib
+import random
+import types
+import typing as t
+
+CORPUS_DIR = pathlib.Path(__file__).parent / 'corpus'
+FIXTURES_DIR = pathlib.Path(__file__).parent.parent / 'tests' / 'fixtures'
+
+WORDS = ('page', 'analyzer', 'site', 'search', 'engine', 'optimization',
+         'content', 'title', 'header', 'description', 'link', 'python',
+         'flask', 'postgres', 'check', 'status', 'example', 'заголовок',
+         'страница', 'проверка')
+
+
+class Url(t.NamedTuple):
+    id: int
+    name: str
+
+
+class Check(t.NamedTuple):
+    url_id: int
+    created_at: datetime.datetime
+    status_code: int
+
+
+def generate_urls(size: int, unique: int | None = None,
+                  seed: int = 0) -> list[str]:
+    """Return submitted URLs where `unique` addresses repeat."""
+    rng = random.Random(seed)
+    unique = unique or size
+    pool = []
+    for number in range(unique):
+        scheme = rng.choice(('http', 'https', 'HTTPS'))
+        host = rng.choice(('', 'www.')) + f'site{number}.example.com'
+        path = rng.choice(('', '/', '/about', '/blog/post?id=1'))
+        pool.append(f'{scheme}://{host}{path}')
+    pool.extend(('', 'example.com', 'http://'))
+    return [rng.choice(pool) for _ in range(size)]
+
+
+def generate_urls_checks(size: int,
+                         checked_share: float = 0.8,
+                         seed: int = 0,
+                         ) -> tuple[list[Url], list[Check]]:
+    """Return URL records sorted as get_urls selects them and the latest
+    check of a share of them."""
+    rng = random.Random(seed)
+    started = datetime.datetime(2020, 1, 1)
+    urls = [Url(url_id, f'https://site{url_id}.example.com')
+            for url_id in range(size, 0, -1)]
+    checks = [Check(url_id,
+                    started + datetime.timedelta(minutes=url_id),
+                    rng.choice((200, 200, 200, 301, 404, 500)))
+              for url_id in range(1, size + 1)
+              if rng.random() < checked_share]
+    return urls, checks
+
+
+def generate_html(size: int, seed: int = 0) -> str:
+    """Return a realistic HTML page of roughly `size` bytes."""
+    rng = random.Random(seed)
+
+    def sentence(length: int) -> str:
+        return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+    menu = ''.join(f'<li><a href="/section{number}">{sentence(2)}</a></li>'
+                   for number in range(10))
+    head = ('<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+            f'<title>{sentence(5)}</title>'
+            f'<meta name="description" content="{sentence(20)}">'
+            '<link rel="stylesheet" href="/static/main.css">'
+            '<script>window.dataLayer = [];</script></head><body>'
+            f'<nav><ul>{menu}</ul></nav>'
+            f'<main><h1>{sentence(6)}</h1>')
+    blocks = [head]
+    length = len(head)
+    while length < size:
+        block = (f'<article><h2>{sentence(4)}</h2><p>{sentence(60)}</p>'
+                 f'<p><a href="https://other.example.com/{length}">'
+                 f'{sentence(3)}</a><img src="/img/{length}.png" '
+                 f'alt="{sentence(2)}"></p></article>')
+        blocks.append(block)
+        length += len(block)
+    blocks.append('</main><footer>&copy; Example</footer></body></html>')
+    return ''.join(blocks)
+
+
+def load_recorded_pages() -> dict[str, str]:
+    """Return recorded pages of the corpus directory and test fixtures."""
+    paths = [FIXTURES_DIR / 'sample.html',
+             *sorted(CORPUS_DIR.glob('*.html')),
+             *sorted(CORPUS_DIR.glob('*.html.gz'))]
+    pages = {}
+    for path in paths:
+        if path.suffix == '.gz':
+            pages[path.name] = gzip.decompress(path.read_bytes()).decode()
+        else:
+            pages[path.name] = path.read_text()
+    return pages
+
+
+def make_response(html: str,
+                  status_code: int = 200,
+                  url: str = 'https://www.example.com/',
+                  ) -> t.Any:
+    """Return an object shaped like requests.Response for the parser."""
+    return types.SimpleNamespace(text=html,
+                                 content=html.encode(),
+                                 status_code=status_code,
+                                 url=url)
@@ -0,0 +1,93 @@
+"""Checks per second written by concurrent threads with a commit per check
+and through the group-committing check buffer.
+
+    DATABASE_URL=... python -m benchmarks.group_commit --threads 32
+
+Every thread writes `--checks` checks of its own URL and waits for each to
+be committed, like the check route does. The URLs are created first, all
+rows are written to the database of DATABASE_URL.
+"""
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import time
+import typing as t
+
+import dotenv
+
+from benchmarks import harness
+from page_analyzer import url_db
+from page_analyzer.url_db import check_buffer
+
+DATA = {'status_code': 200, 'h1': 'Heading', 'title': 'Title',
+        'description': 'Description'}
+
+
+def write_per_check(db_url: str, url_id: int, checks: int) -> None:
+    connection = url_db.open_connection(db_url)
+    try:
+        for _ in range(checks):
+            url_db.create_check(connection, url_id, DATA)
+            connection.commit()
+    finally:
+        url_db.close_connection(connection)
+
+
+def write_buffered(buffer: check_buffer.CheckBuffer,
+                   url_id: int,
+                   checks: int,
+                   ) -> None:
+    for _ in range(checks):
+        buffer.add(url_id, DATA).result()
+
+
+def measure(write: t.Callable[[int], None],
+            url_ids: list[int],
+            ) -> float:
+    """Run `write` for every URL in its own thread, return the seconds."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(url_ids)) as executor:
+        list(executor.map(write, url_ids))
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--checks', type=int, default=50,
+                        help='Checks written by every thread.')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=0.005)
+    args = parser.parse_args()
+
+    dotenv.load_dotenv()
+    db_url = os.environ['DATABASE_URL']
+    harness.init_schema(db_url)
+    url_ids = harness.create_site_records(
+        db_url, [f'https://commit{number}.example.com'
+                 for number in range(args.threads)])
+    total = args.threads * args.checks
+
+    results = {'per_check': total / measure(
+        lambda url_id: write_per_check(db_url, url_id, args.checks),
+        url_ids)}
+    for synchronous_commit in (True, False):
+        buffer = check_buffer.CheckBuffer(
+            db_url, size=args.batch_size, seconds=args.seconds,
+            synchronous_commit=synchronous_commit)
+        seconds = measure(
+            lambda url_id: write_buffered(buffer, url_id, args.checks),
+            url_ids)
+        buffer.close()
+        name = 'buffered' if synchronous_commit else 'buffered_async_commit'
+        results[name] = total / seconds
+
+    print(json.dumps({name: round(rate, 1)
+                      for name, rate in results.items()}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
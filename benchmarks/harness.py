@@ -0,0 +1,166 @@
+"""Building blocks of the load tests: stand-in sites and a gunicorn runner."""
+from __future__ import annotations
+
+import contextlib
+import http.server
+import os
+import pathlib
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import typing as t
+
+import psycopg2
+import requests
+
+from benchmarks import datasets
+from page_analyzer import url_db
+
+ROOT_DIR = pathlib.Path(__file__).parent.parent
+
+
+class SiteProfile(t.NamedTuple):
+    latency: float = 0.05
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    page_size: int = 20_000
+
+
+class StandInSite:
+    """Local HTTP site answering with a generated page after a delay."""
+
+    def __init__(self, profile: SiteProfile, seed: int = 0) -> None:
+        self.profile = profile
+        self.page = datasets.generate_html(profile.page_size, seed).encode()
+        self._rng = random.Random(seed)
+        self._server = http.server.ThreadingHTTPServer(
+            ('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def start(self) -> None:
+        threading.Thread(target=self._server.serve_forever,
+                         daemon=True).start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self) -> type[http.server.BaseHTTPRequestHandler]:
+        site = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                profile = site.profile
+                time.sleep(max(0.0, profile.latency + site._rng.uniform(
+                    -profile.jitter, profile.jitter)))
+                if site._rng.random() < profile.error_rate:
+                    self.send_error(503)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(site.page)))
+                self.end_headers()
+                self.wfile.write(site.page)
+
+            def log_message(self, *args: t.Any) -> None:
+                pass
+
+        return Handler
+
+
+@contextlib.contextmanager
+def run_fleet(profiles: list[SiteProfile]) -> t.Iterator[list[StandInSite]]:
+    """Run a stand-in site per profile."""
+    sites = [StandInSite(profile, seed)
+             for seed, profile in enumerate(profiles)]
+    for site in sites:
+        site.start()
+    try:
+        yield sites
+    finally:
+        for site in sites:
+            site.stop()
+
+
+def get_free_port() -> int:
+    """Return a free TCP port on localhost."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port: int = sock.getsockname()[1]
+    return port
+
+
+def init_schema(db_url: str) -> None:
+    """Create the tables from database.sql."""
+    connection = psycopg2.connect(db_url)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute((ROOT_DIR / 'database.sql').read_text())
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def create_site_records(db_url: str, site_urls: list[str]) -> list[int]:
+    """Insert the stand-in sites into the DB, return their ids.
+
+    The records are created directly because normalize_url drops the port.
+    """
+    url_ids = []
+    connection = url_db.open_connection(db_url)
+    try:
+        for site_url in site_urls:
+            url_id = url_db.check_url(connection, site_url)
+            if url_id is None:
+                url_id = url_db.create_url(connection, site_url)
+            url_ids.append(url_id)
+    finally:
+        url_db.close_connection(connection)
+    return url_ids
+
+
+@contextlib.contextmanager
+def run_gunicorn(port: int,
+                 env: dict[str, str] | None = None,
+                 poll_interval: float = 0.1,
+                 ) -> t.Iterator[str]:
+    """Run the application under gunicorn, yield its base URL.
+
+    GUNICORN_* variables of `env` override the settings of gunicorn.conf.py.
+    """
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+         'page_analyzer:app'],
+        cwd=ROOT_DIR,
+        env=os.environ | (env or {}) | {'PORT': str(port)},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_ready(base_url, interval=poll_interval)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def wait_until_ready(base_url: str,
+                     timeout: float = 15.0,
+                     interval: float = 0.1,
+                     ) -> None:
+    """Wait until the application answers on the main page."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(base_url, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(interval)
+    raise TimeoutError(f'{base_url} did not start in {timeout} seconds')
@@ -0,0 +1,196 @@
+"""End-to-end load test of the application under gunicorn.
+
+Starts a fleet of stand-in sites and the application against the database
+of DATABASE_URL, drives a mix of page views, submissions and checks and
+prints per-route latency percentiles and throughput as JSON.
+
+    python -m benchmarks.loadtest --duration 30 --concurrency 32 \\
+        --sites 20 --latency 0.2 --error-rate 0.05 --page-size 50000 \\
+        --mix get_urls=40,get_url=35,post_urls=15,post_checks=10
+"""
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import random
+import statistics
+import threading
+import time
+import typing as t
+
+import dotenv
+import requests
+
+from benchmarks import datasets
+from benchmarks import harness
+
+DEFAULT_MIX = 'get_urls=40,get_url=35,post_urls=15,post_checks=10'
+ROUTES = {'get_urls': 'GET /urls',
+          'get_url': 'GET /urls/<id>',
+          'post_urls': 'POST /urls',
+          'post_checks': 'POST /urls/<id>/checks'}
+
+
+class Sample(t.NamedTuple):
+    route: str
+    latency: float
+    failed: bool
+
+
+class Driver:
+    """Sends requests of the configured mix and records their latency."""
+
+    def __init__(self,
+                 base_url: str,
+                 url_ids: list[int],
+                 mix: dict[str, int],
+                 submitted_urls: list[str],
+                 seed: int = 0,
+                 ) -> None:
+        self.base_url = base_url
+        self.url_ids = url_ids
+        self.operations = list(mix)
+        self.weights = list(mix.values())
+        self.submitted_urls = submitted_urls
+        self.samples: list[Sample] = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def run(self, deadline: float) -> None:
+        """Send requests until the deadline."""
+        while time.monotonic() < deadline:
+            operation = self._choice(self.operations, self.weights)
+            started = time.perf_counter()
+            try:
+                response = getattr(self, operation)()
+                failed = response.status_code >= 500
+            except requests.RequestException:
+                failed = True
+            latency = time.perf_counter() - started
+            with self._lock:
+                self.samples.append(Sample(ROUTES[operation],
+                                           latency, failed))
+
+    def get_urls(self) -> requests.Response:
+        return self._session().get(f'{self.base_url}/urls', timeout=30)
+
+    def get_url(self) -> requests.Response:
+        url_id = self._choice(self.url_ids)
+        return self._session().get(f'{self.base_url}/urls/{url_id}',
+                                   timeout=30)
+
+    def post_urls(self) -> requests.Response:
+        url = self._choice(self.submitted_urls)
+        return self._session().post(f'{self.base_url}/urls',
+                                    data={'url': url},
+                                    allow_redirects=False,
+                                    timeout=30)
+
+    def post_checks(self) -> requests.Response:
+        url_id = self._choice(self.url_ids)
+        return self._session().post(f'{self.base_url}/urls/{url_id}/checks',
+                                    allow_redirects=False,
+                                    timeout=30)
+
+    def _choice(self,
+                population: list[t.Any],
+                weights: list[int] | None = None,
+                ) -> t.Any:
+        with self._lock:
+            return self._rng.choices(population, weights)[0]
+
+    def _session(self) -> requests.Session:
+        session: requests.Session | None = getattr(self._local,
+                                                   'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+
+def summarize(samples: list[Sample], elapsed: float) -> dict[str, t.Any]:
+    """Return per-route and overall percentiles and throughput."""
+    by_route: dict[str, list[Sample]] = {}
+    for sample in samples:
+        by_route.setdefault(sample.route, []).append(sample)
+    by_route['all'] = samples
+
+    report = {}
+    for route, route_samples in by_route.items():
+        latencies = sorted(sample.latency * 1000 for sample in route_samples)
+        percentiles = latencies * 99
+        if len(latencies) > 1:
+            percentiles = statistics.quantiles(latencies, n=100,
+                                               method='inclusive')
+        report[route] = {
+            'requests': len(route_samples),
+            'errors': sum(sample.failed for sample in route_samples),
+            'requests_per_second': round(len(route_samples) / elapsed, 2),
+            'p50_ms': round(percentiles[49], 2),
+            'p95_ms': round(percentiles[94], 2),
+            'p99_ms': round(percentiles[98], 2),
+        }
+    return report
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    """Parse `name=weight,...` into a dict of route weights."""
+    weights = {}
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        if name not in ROUTES:
+            raise argparse.ArgumentTypeError(f'Unknown route {name}')
+        weights[name] = int(weight)
+    return weights
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--sites', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.1,
+                        help='Mean response delay of the sites in seconds.')
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.02)
+    parser.add_argument('--page-size', type=int, default=30_000)
+    parser.add_argument('--submitted-urls', type=int, default=200,
+                        help='Distinct addresses sent to POST /urls.')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument('--init-schema', action='store_true',
+                        help='Create the tables from database.sql first.')
+    args = parser.parse_args()
+
+    dotenv.load_dotenv()
+    db_url = os.getenv('DATABASE_URL', '')
+    if args.init_schema:
+        harness.init_schema(db_url)
+
+    profiles = [harness.SiteProfile(args.latency, args.jitter,
+                                    args.error_rate, args.page_size)
+                for _ in range(args.sites)]
+    submitted_urls = datasets.generate_urls(args.submitted_urls)
+
+    with harness.run_fleet(profiles) as sites:
+        url_ids = harness.create_site_records(
+            db_url, [site.url for site in sites])
+        with harness.run_gunicorn(harness.get_free_port()) as base_url:
+            driver = Driver(base_url, url_ids, args.mix, submitted_urls)
+            started = time.monotonic()
+            deadline = started + args.duration
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                for _ in range(args.concurrency):
+                    pool.submit(driver.run, deadline)
+            elapsed = time.monotonic() - started
+
+    print(json.dumps({'config': {key: value for key, value in vars(args).items()
+                                 if key != 'init_schema'},
+                      'elapsed_seconds': round(elapsed, 2),
+                      'routes': summarize(driver.samples, elapsed)},
+                     indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Logging overhead of a request: inline handler versus queued JSON logs.
+
+Emits the log lines of a GET /urls request through the loggers of the
+application and reports the time spent in the request threads.
+
+    python -m benchmarks.logging_overhead --requests 20000 --threads 4
+"""
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import statistics
+import tempfile
+import time
+import typing as t
+
+from page_analyzer import logs
+from page_analyzer.url_db import db_operations
+from page_analyzer.url_db import url_db_operations
+
+# The format of the former logging.basicConfig call of the application.
+INLINE_FORMAT = ('[%(asctime)s] [%(levelname)s] '
+                 '[%(module)s.%(funcName)s] %(message)s')
+
+db_logger = logging.getLogger(db_operations.__name__)
+url_db_logger = logging.getLogger(url_db_operations.__name__)
+
+
+def log_request_inline() -> None:
+    """Log like the former code: root logger, messages formatted eagerly."""
+    complete = 'The {operation} is completed'
+    logging.info(complete.format(operation='DB connection'))
+    logging.info(complete.format(operation='select data'))
+    logging.info(complete.format(operation='select data'))
+    logging.info('The {entity} information was obtained from the database'
+                 .format(entity='URLs'))
+    logging.info(db_operations.CLOSE_CONNECTION_MESSAGE)
+
+
+def log_request() -> None:
+    """Log like the application: module loggers, lazy arguments."""
+    db_logger.info(db_operations.COMPLETE_OPERATION_MESSAGE, 'DB connection')
+    db_logger.info(db_operations.COMPLETE_OPERATION_MESSAGE, 'select data')
+    db_logger.info(db_operations.COMPLETE_OPERATION_MESSAGE, 'select data')
+    url_db_logger.info(url_db_operations.RECEIPT_MESSAGE, 'URLs')
+    db_logger.info(db_operations.CLOSE_CONNECTION_MESSAGE)
+
+
+def setup_inline(stream: t.TextIO) -> t.Callable[[], None]:
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(INLINE_FORMAT, '%Y-%m-%d %H:%M:%S'))
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(handler)
+    return lambda: root.removeHandler(handler)
+
+
+def setup_queue(stream: t.TextIO,
+                sampling: str = '',
+                ) -> t.Callable[[], None]:
+    logs.setup_logging(level='INFO', sampling=sampling, stream=stream)
+    return logs.stop_logging
+
+
+def run(log_request: t.Callable[[], None],
+        requests: int,
+        threads: int,
+        ) -> list[int]:
+    """Log `requests` requests from the threads, return their timings."""
+    def log_requests(count: int) -> list[int]:
+        timings = []
+        for _ in range(count):
+            started = time.perf_counter_ns()
+            log_request()
+            timings.append(time.perf_counter_ns() - started)
+        return timings
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(log_requests, requests // threads)
+                   for _ in range(threads)]
+    return [timing for future in futures for timing in future.result()]
+
+
+def measure(name: str,
+            setup: t.Callable[[t.TextIO], t.Callable[[], None]],
+            log_request: t.Callable[[], None],
+            requests: int,
+            threads: int,
+            ) -> dict[str, t.Any]:
+    with tempfile.TemporaryFile('w+') as stream:
+        teardown = setup(stream)
+        started = time.perf_counter()
+        timings = run(log_request, requests, threads)
+        elapsed = time.perf_counter() - started
+        teardown()
+        drained = time.perf_counter() - started
+        stream.seek(0)
+        lines = sum(1 for _ in stream)
+
+    percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+    return {'setup': name,
+            'request_mean_us': round(statistics.fmean(timings) / 1e3, 2),
+            'request_p99_us': round(percentiles[98] / 1e3, 2),
+            'requests_per_second': round(len(timings) / elapsed),
+            'written_lines': lines,
+            'seconds_until_written': round(drained, 3)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20_000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--sampling', default='page_analyzer=0.1',
+                        help='LOG_SAMPLING of the sampled setup.')
+    args = parser.parse_args()
+
+    logs.stop_logging()
+    setups = (
+        ('inline', setup_inline, log_request_inline),
+        ('queue', setup_queue, log_request),
+        ('queue+sampling',
+         lambda stream: setup_queue(stream, args.sampling), log_request),
+    )
+    results = [measure(name, setup, log, args.requests, args.threads)
+               for name, setup, log in setups]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Scaling of the pipelined checker with the number of parse processes.
+
+Serves large generated pages from local stand-in sites and checks them
+with page_analyzer.pipeline for every number of parse processes up to the
+CPU count, next to the former approach of fetching and parsing in threads
+of one process.
+
+    python -m benchmarks.parse_pipeline --sites 8 --page-size 500000
+
+Requires DATABASE_URL pointing to a database created from database.sql,
+the checks are written to it.
+"""
+from __future__ import annotations
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import time
+import typing as t
+
+import dotenv
+
+from benchmarks import harness
+from page_analyzer import pipeline
+from page_analyzer import url_db
+from page_analyzer import webutils
+
+
+def check_in_threads(db_url: str,
+                     urls: list[tuple[int, str]],
+                     threads: int,
+                     ) -> float:
+    """Fetch, parse and write every check in threads, return checks per
+    second."""
+    def check(url: tuple[int, str]) -> dict[str, t.Any]:
+        response = webutils.get_site_response(url[1])
+        return webutils.parse_html_response(response)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(check, urls))
+    connection = url_db.open_connection(db_url)
+    try:
+        for (url_id, _), data in zip(urls, results):
+            url_db.create_check(connection, url_id, data)
+    finally:
+        url_db.close_connection(connection)
+    return len(urls) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', type=int, default=8)
+    parser.add_argument('--checks', type=int, default=64,
+                        help='Checks per run, spread over the sites.')
+    parser.add_argument('--page-size', type=int, default=500_000)
+    parser.add_argument('--fetch-workers', type=int, default=16)
+    parser.add_argument('--max-parse-workers', type=int,
+                        default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    dotenv.load_dotenv()
+    db_url = os.environ['DATABASE_URL']
+    harness.init_schema(db_url)
+    profile = harness.SiteProfile(latency=0.0, page_size=args.page_size)
+
+    with harness.run_fleet([profile] * args.sites) as sites:
+        url_ids = harness.create_site_records(
+            db_url, [site.url for site in sites])
+        site_urls = list(zip(url_ids, (site.url for site in sites)))
+        urls = [site_urls[number % args.sites]
+                for number in range(args.checks)]
+
+        results: dict[str, t.Any] = {
+            'cpu_count': os.cpu_count(),
+            'threads_checks_per_second': round(
+                check_in_threads(db_url, urls, args.fetch_workers), 1),
+            'pipeline_checks_per_second': {},
+        }
+        for parse_workers in range(1, args.max_parse_workers + 1):
+            stats = pipeline.check_urls(db_url, urls,
+                                        fetch_workers=args.fetch_workers,
+                                        parse_workers=parse_workers)
+            results['pipeline_checks_per_second'][parse_workers] = round(
+                stats.checked / stats.seconds, 1)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
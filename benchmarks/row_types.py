@@ -0,0 +1,120 @@
+"""Per-row memory and throughput of the url_db row types against rows made
+by NamedTupleCursor, for the queries of get_urls and get_url_checks.
+
+    DATABASE_URL=... python -m benchmarks.row_types --urls 100000
+
+The rows are inserted in a transaction that is rolled back at the end.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+import tracemalloc
+import typing as t
+
+import dotenv
+from psycopg2 import sql
+
+from page_analyzer.url_db import db_operations
+from page_analyzer.url_db import rows
+
+FILL = sql.SQL('''
+INSERT INTO urls (name, created_at)
+SELECT 'https://rows' || i || '.example.com', now()
+FROM generate_series(1, %(urls)s) AS i;
+
+INSERT INTO check_contents (digest, h1, title, description, created_at)
+VALUES ('\\x00', 'Heading', 'Title', 'Description', now());
+
+INSERT INTO url_checks (url_id, status_code, content_id, created_at)
+SELECT urls.id, 200, currval(pg_get_serial_sequence('check_contents', 'id')),
+       now() - check_number * interval '1 minute'
+FROM (SELECT id FROM urls ORDER BY id DESC LIMIT %(urls)s) AS urls,
+     generate_series(1, 2) AS check_number;
+''')
+
+Query = dict[str, t.Any]
+
+
+def get_queries(url_id: int) -> dict[str, tuple[Query, type[t.NamedTuple]]]:
+    """Return select_data arguments of the measured queries."""
+    return {
+        'get_urls.urls': (
+            {'table': 'urls',
+             'fields': [('urls', field) for field in rows.URLName._fields],
+             'sorting': [(('urls', 'created_at'), 'DESC')]},
+            rows.URLName),
+        'get_urls.url_checks': (
+            {'table': 'url_checks',
+             'fields': [('url_checks', field)
+                        for field in rows.LatestCheck._fields],
+             'distinct': ('url_checks', 'url_id'),
+             'sorting': [(('url_checks', 'url_id'), 'ASC'),
+                         (('url_checks', 'created_at'), 'DESC')]},
+            rows.LatestCheck),
+        'get_url_checks': (
+            {'table': 'url_checks',
+             'fields': [('url_checks', 'id'),
+                        ('url_checks', 'status_code'),
+                        ('check_contents', 'h1'),
+                        ('check_contents', 'title'),
+                        ('check_contents', 'description'),
+                        ('url_checks', 'created_at')],
+             'joining': (('url_checks', 'content_id'),
+                         ('check_contents', 'id'))},
+            rows.URLCheck),
+    }
+
+
+def measure(connection: t.Any,
+            query: Query,
+            row_type: type[t.NamedTuple] | None,
+            repeats: int,
+            ) -> dict[str, float]:
+    """Return rows per second and peak traced bytes per row."""
+    started = time.perf_counter()
+    for _ in range(repeats):
+        result = db_operations.select_data(connection=connection,
+                                           row_type=row_type, **query)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    result = db_operations.select_data(connection=connection,
+                                       row_type=row_type, **query)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'rows': len(result),
+            'rows_per_second': round(len(result) * repeats / elapsed),
+            'peak_bytes_per_row': round(peak / max(1, len(result)), 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--urls', type=int, default=100_000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    dotenv.load_dotenv()
+    connection = db_operations.open_connection(os.environ['DATABASE_URL'])
+    results = {}
+    try:
+        db_operations.execute_query(connection=connection, query=FILL,
+                                    params={'urls': args.urls})
+        for name, (query, row_type) in get_queries(0).items():
+            results[name] = {
+                'namedtuple_cursor': measure(connection, query, None,
+                                             args.repeats),
+                'row_type': measure(connection, query, row_type,
+                                    args.repeats),
+            }
+    finally:
+        connection.rollback()
+        connection.close()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Import time of the application and cold start of gunicorn.
+
+Reports the time to import page_analyzer with the slowest modules from
+`python -X importtime`, and the time from starting gunicorn to the first
+response with and without --preload.
+
+    python -m benchmarks.startup --repeats 5 --workers 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+import typing as t
+
+from benchmarks import harness
+
+
+def measure_import() -> tuple[float, list[tuple[str, float]]]:
+    """Return the import time of page_analyzer in ms and the modules with
+    the longest own import time."""
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import page_analyzer'],
+        cwd=harness.ROOT_DIR, capture_output=True, text=True, check=True)
+    modules = []
+    total = 0.0
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line.removeprefix('import time:').split('|')
+        modules.append((name.strip(), int(own) / 1000))
+        if name.strip() == 'page_analyzer':
+            total = int(cumulative) / 1000
+    modules.sort(key=lambda module: module[1], reverse=True)
+    return total, modules
+
+
+def measure_cold_start(preload: bool, workers: int) -> float:
+    """Return the seconds from starting gunicorn to its first response."""
+    env = {'GUNICORN_WORKERS': str(workers),
+           'GUNICORN_PRELOAD': '1' if preload else '0'}
+    started = time.monotonic()
+    with harness.run_gunicorn(harness.get_free_port(), env,
+                              poll_interval=0.005):
+        elapsed = time.monotonic() - started
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10,
+                        help='Number of the slowest modules to show.')
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.repeats)]
+    report: dict[str, t.Any] = {
+        'import_ms': round(statistics.median(
+            total for total, _ in imports), 1),
+        'slowest_modules_ms': dict(imports[-1][1][:args.top]),
+    }
+    for preload in (False, True):
+        timings = [measure_cold_start(preload, args.workers)
+                   for _ in range(args.repeats)]
+        key = 'first_response_s' + ('[preload]' if preload else '')
+        report[key] = round(statistics.median(timings), 3)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""Offline micro-benchmarks of the hot paths.
+
+    python -m benchmarks.suite                      # run and compare
+    python -m benchmarks.suite --save-baseline      # store a new baseline
+    python -m benchmarks.suite --max-size 1000000   # include the 1M datasets
+    python -m benchmarks.suite --record https://example.com
+
+Every case reports throughput, latency percentiles and peak traced memory.
+Throughput is compared with benchmarks/baseline.json; the run fails when a
+case is slower than the baseline by more than --threshold. The baseline is
+machine-specific, regenerate it on the machine that runs the comparison.
+BUDGETS bound the cost of a case relative to another case of the same run,
+they hold on any machine.
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import pathlib
+import statistics
+import sys
+import time
+import tracemalloc
+import typing as t
+import urllib.parse
+
+from psycopg2 import sql
+import requests
+
+from benchmarks import datasets
+from page_analyzer import urlutils
+from page_analyzer import webutils
+from page_analyzer.url_db import db_operations
+from page_analyzer.url_db import url_db_operations
+
+BASELINE_PATH = pathlib.Path(__file__).parent / 'baseline.json'
+URL_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+HTML_SIZES = (10_000, 100_000, 1_000_000)
+
+Operation = t.Callable[..., t.Any]
+Prepared = tuple[Operation, list[tuple[t.Any, ...]]]
+
+
+class Case(t.NamedTuple):
+    name: str
+    sizes: tuple[int, ...]
+    prepare: t.Callable[[int], Prepared]
+    repeats: int = 1
+
+
+def prepare_parse_synthetic(size: int) -> Prepared:
+    pages = [datasets.make_response(datasets.generate_html(size, seed))
+             for seed in range(max(1, 1_000_000 // size // 10))]
+    return webutils.parse_html_response, [(page,) for page in pages]
+
+
+def prepare_parse_extended(size: int) -> Prepared:
+    pages = [datasets.make_response(datasets.generate_html(size, seed))
+             for seed in range(max(1, 1_000_000 // size // 10))]
+
+    def parse_extended(page: t.Any) -> dict[str, t.Any]:
+        return webutils.parse_html_response(page, extended=True)
+
+    return parse_extended, [(page,) for page in pages]
+
+
+def prepare_parse_recorded(size: int) -> Prepared:
+    pages = [datasets.make_response(html)
+             for html in datasets.load_recorded_pages().values()]
+    return webutils.parse_html_response, [(page,) for page in pages] * size
+
+
+def prepare_validate_url(size: int) -> Prepared:
+    urls = datasets.generate_urls(size, unique=size // 10 or 1)
+    return urlutils.validate_url, [(url,) for url in urls]
+
+
+def prepare_normalize_url(size: int) -> Prepared:
+    urls = datasets.generate_urls(size, unique=size // 10 or 1)
+    return urlutils.normalize_url, [(url,) for url in urls]
+
+
+def prepare_validate_urls(size: int) -> Prepared:
+    urls = datasets.generate_urls(size, unique=size // 10 or 1)
+
+    def validate_urls(urls: list[str]) -> None:
+        urlutils.analyze_url.cache_clear()
+        urlutils.validate_urls(urls)
+
+    return validate_urls, [(urls,)]
+
+
+def prepare_merge_urls_checks(size: int) -> Prepared:
+    urls, checks = datasets.generate_urls_checks(size)
+    return url_db_operations._merge_urls_checks, [(urls, checks)]
+
+
+def prepare_build_select(size: int) -> Prepared:
+    def build_select(url_id: int) -> sql.Composed:
+        selection = db_operations._generate_selection_string(
+            table='url_checks',
+            fields=[('url_checks', 'id'),
+                    ('url_checks', 'status_code'),
+                    ('check_contents', 'h1'),
+                    ('url_checks', 'created_at')])
+        joining = db_operations._generate_joining_string(
+            joining=(('url_checks', 'content_id'), ('check_contents', 'id')))
+        filtering = db_operations._generate_filtering_string(
+            filtering=(('url_checks', 'url_id'), url_id))
+        sorting = db_operations._generate_sorting_string(
+            sorting=[(('url_checks', 'created_at'), 'DESC')])
+        return sql.Composed([selection, joining, filtering, sorting])
+
+    return build_select, [(url_id,) for url_id in range(size)]
+
+
+CASES = (
+    Case('parse_html_response[synthetic]', HTML_SIZES,
+         prepare_parse_synthetic),
+    Case('parse_html_response[extended]', HTML_SIZES,
+         prepare_parse_extended),
+    Case('parse_html_response[recorded]', (10,), prepare_parse_recorded),
+    Case('validate_url', URL_SIZES, prepare_validate_url),
+    Case('normalize_url', URL_SIZES, prepare_normalize_url),
+    Case('validate_urls', URL_SIZES, prepare_validate_urls, repeats=3),
+    Case('_merge_urls_checks', URL_SIZES, prepare_merge_urls_checks,
+         repeats=3),
+    Case('query_builders', URL_SIZES, prepare_build_select),
+)
+
+# case, reference case, maximum cost of the case relative to the reference
+BUDGETS = (
+    ('parse_html_response[extended]', 'parse_html_response[synthetic]', 1.0),
+)
+
+
+def measure(operation: Operation,
+            arguments: list[tuple[t.Any, ...]],
+            repeats: int,
+            ) -> dict[str, float]:
+    """Time every call, return throughput, percentiles and peak memory."""
+    timings = []
+    for _ in range(repeats):
+        for args in arguments:
+            started = time.perf_counter_ns()
+            operation(*args)
+            timings.append(time.perf_counter_ns() - started)
+
+    tracemalloc.start()
+    for args in arguments:
+        operation(*args)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    percentiles: list[float] = [float(timings[0])] * 99
+    if len(timings) > 1:
+        percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+    return {'calls': len(timings),
+            'ops_per_second': round(len(timings) / (sum(timings) / 1e9), 2),
+            'p50_us': round(percentiles[49] / 1e3, 2),
+            'p95_us': round(percentiles[94] / 1e3, 2),
+            'p99_us': round(percentiles[98] / 1e3, 2),
+            'peak_memory_kb': round(peak_memory / 1024, 1)}
+
+
+def run(max_size: int, selected: list[str]) -> dict[str, dict[str, float]]:
+    """Run the selected cases, return results keyed by case and size."""
+    results = {}
+    for case in CASES:
+        if selected and not any(name in case.name for name in selected):
+            continue
+        for size in case.sizes:
+            if size > max_size:
+                continue
+            operation, arguments = case.prepare(size)
+            key = f'{case.name}/{size}'
+            results[key] = measure(operation, arguments, case.repeats)
+            print(key, json.dumps(results[key]), file=sys.stderr)
+    return results
+
+
+def compare(results: dict[str, dict[str, float]],
+            baseline: dict[str, dict[str, float]],
+            threshold: float,
+            ) -> list[str]:
+    """Return descriptions of cases slower than the baseline."""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        expected = baseline[key]['ops_per_second']
+        actual = result['ops_per_second']
+        if actual < expected * (1 - threshold):
+            regressions.append(f'{key}: {actual} ops/s, '
+                               f'baseline {expected} ops/s')
+    return regressions
+
+
+def check_budgets(results: dict[str, dict[str, float]]) -> list[str]:
+    """Return descriptions of cases costlier than their budget."""
+    regressions = []
+    for name, reference, budget in BUDGETS:
+        for key, result in results.items():
+            reference_key = key.replace(name, reference, 1)
+            if not key.startswith(f'{name}/') or reference_key not in results:
+                continue
+            reference_speed = results[reference_key]['ops_per_second']
+            cost = reference_speed / result['ops_per_second']
+            if cost > budget:
+                regressions.append(f'{key}: {cost:.2f}x the cost of '
+                                   f'{reference}, budget {budget}x')
+    return regressions
+
+
+def record(url: str) -> pathlib.Path:
+    """Save the page into the corpus for offline runs."""
+    response = requests.get(url, timeout=10)
+    host = urllib.parse.urlsplit(url).hostname or 'page'
+    path = datasets.CORPUS_DIR / f'{host}.html.gz'
+    datasets.CORPUS_DIR.mkdir(exist_ok=True)
+    path.write_bytes(gzip.compress(response.text.encode()))
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('cases', nargs='*',
+                        help='Run only cases containing these names.')
+    parser.add_argument('--max-size', type=int, default=100_000)
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed throughput drop, 0.2 is 20%%.')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--record', metavar='URL', action='append')
+    args = parser.parse_args()
+
+    if args.record:
+        for url in args.record:
+            print(f'Recorded {record(url)}')
+        return
+
+    results = run(args.max_size, args.cases)
+    if args.save_baseline:
+        BASELINE_PATH.write_text(json.dumps(results, indent=2) + '\n')
+        return
+
+    baseline = {}
+    if BASELINE_PATH.exists():
+        baseline = json.loads(BASELINE_PATH.read_text())
+    regressions = compare(results, baseline, args.threshold)
+    regressions.extend(check_budgets(results))
+    print(json.dumps({'results': results, 'regressions': regressions},
+                     indent=2))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""Fill a database with a large synthetic dataset using COPY.
+
+    DATABASE_URL=... python -m benchmarks.synthetic_db \\
+        --urls 1000000 --checks 50000000
+
+The database must be created from database.sql and hold no URLs yet. The
+checks per URL follow a Pareto distribution: most URLs have a few checks,
+a few URLs were checked hourly, and a share of the URLs was never checked.
+Checks of a URL mostly repeat its content, contents are shared between
+sites. The rows are streamed into COPY as they are generated, then the
+rollups are backfilled by migrations/005_check_rollups.sql and
+migrations/008_stats_totals.sql and the tables are analyzed.
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import random
+import time
+import typing as t
+
+import dotenv
+import psycopg2
+from psycopg2 import errors
+
+from page_analyzer.url_db import url_db_operations
+
+MIGRATIONS_DIR = pathlib.Path(__file__).parent.parent / 'migrations'
+ROLLUPS_PATHS = (MIGRATIONS_DIR / '005_check_rollups.sql',
+                 MIGRATIONS_DIR / '008_stats_totals.sql')
+
+# status codes of stored checks and their weights
+STATUS_CODES = ((200, 90), (301, 3), (302, 2), (404, 3), (500, 2))
+# chance that a check finds a different content than the previous one
+CONTENT_CHANGE = 0.1
+
+COPY_CONTENTS = ('COPY check_contents (digest, h1, title, description, '
+                 'created_at) FROM STDIN')
+COPY_URLS = 'COPY urls (name, created_at) FROM STDIN'
+COPY_CHECKS = ('COPY url_checks (url_id, status_code, content_id, '
+               'created_at) FROM STDIN')
+ANALYZE = ('ANALYZE urls, check_contents, url_checks, url_status, '
+           'check_stats_daily, stats_totals')
+
+
+class Spec(t.NamedTuple):
+    urls: int = 100_000
+    checks: int = 1_000_000
+    contents: int = 10_000
+    # the checks span this many days up to now
+    days: int = 365
+    # Pareto shape of the checks per URL, lower is more skewed
+    skew: float = 1.5
+    # share of the URLs that were never checked
+    unchecked: float = 0.05
+    seed: int = 0
+
+
+class _CopyStream:
+    """File-like object that reads the lines of an iterator, so COPY gets
+    the rows while they are generated."""
+
+    def __init__(self, lines: t.Iterator[str]) -> None:
+        self._lines = lines
+        self._buffer = ''
+
+    def read(self, size: int = -1) -> str:
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        for line in self._lines:
+            chunks.append(line)
+            length += len(line)
+            if 0 <= size <= length:
+                break
+        data = ''.join(chunks)
+        if size < 0:
+            self._buffer = ''
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def generate(connection: t.Any, spec: Spec) -> dict[str, t.Any]:
+    """Fill the database, return the generated row counts and seconds.
+
+    The connection must be in autocommit mode, the migration that backfills
+    the rollups commits by itself.
+    """
+    rng = random.Random(spec.seed)
+    now = datetime.datetime.now().replace(microsecond=0)
+    started = time.perf_counter()
+    cursor = connection.cursor()
+
+    contents = _copy(cursor, COPY_CONTENTS, 'check_contents', spec.contents,
+                     _content_lines(spec, now))
+    urls = _copy(cursor, COPY_URLS, 'urls', spec.urls,
+                 _url_lines(spec, now))
+    checks = {'count': 0, 'max': 0}
+    skipped_fk_checks = _skip_fk_checks(cursor)
+    cursor.copy_expert(COPY_CHECKS, _CopyStream(
+        _check_lines(spec, rng, now, urls, contents, checks)))
+    cursor.execute('RESET session_replication_role')
+    copied = time.perf_counter()
+
+    for path in ROLLUPS_PATHS:
+        cursor.execute(path.read_text())
+    cursor.execute(ANALYZE)
+    return {'urls': spec.urls,
+            'checks': checks['count'],
+            'contents': spec.contents,
+            'max_checks_per_url': checks['max'],
+            'skipped_fk_checks': skipped_fk_checks,
+            'copy_seconds': round(copied - started, 1),
+            'rollups_seconds': round(time.perf_counter() - copied, 1)}
+
+
+def _copy(cursor: t.Any,
+          query: str,
+          table: str,
+          count: int,
+          lines: t.Iterator[str],
+          ) -> range:
+    """Copy the lines into the table, return the ids of the new rows."""
+    cursor.copy_expert(query, _CopyStream(lines))
+    cursor.execute('SELECT currval(pg_get_serial_sequence(%s, %s))',
+                   (table, 'id'))
+    last = cursor.fetchone()[0]
+    ids = range(last - count + 1, last + 1)
+    # COPY takes the ids from the sequence one after another unless
+    # another session inserted into the table at the same time
+    cursor.execute(f'SELECT count(*) FROM {table} WHERE id BETWEEN %s AND %s',
+                   (ids[0], ids[-1]))
+    if cursor.fetchone()[0] != count:
+        raise RuntimeError(f'The ids of the copied {table} are not '
+                           'contiguous, was the table written concurrently?')
+    return ids
+
+
+def _skip_fk_checks(cursor: t.Any) -> bool:
+    """Disable the foreign key triggers of this session if the role may,
+    return whether it could.
+
+    The checks reference only the rows copied just before, the triggers
+    would double the time of copying them.
+    """
+    try:
+        cursor.execute('SET session_replication_role = replica')
+    except errors.InsufficientPrivilege:
+        return False
+    return True
+
+
+def _content_lines(spec: Spec, now: datetime.datetime) -> t.Iterator[str]:
+    created_at = now - datetime.timedelta(days=spec.days)
+    for number in range(spec.contents):
+        data = {'h1': f'Heading {number % 1000}',
+                'title': f'Site {number} | Home',
+                'description': f'Products and services of site {number}'}
+        digest = url_db_operations.get_content_digest(data).hex()
+        yield (f'\\\\x{digest}\t{data["h1"]}\t{data["title"]}\t'
+               f'{data["description"]}\t{created_at}\n')
+
+
+def _url_lines(spec: Spec, now: datetime.datetime) -> t.Iterator[str]:
+    # the checks of a URL start when it is added, see _check_lines
+    created_at = now - datetime.timedelta(days=spec.days)
+    for number in range(spec.urls):
+        yield f'https://site{number}.example.com\t{created_at}\n'
+
+
+def _check_lines(spec: Spec,
+                 rng: random.Random,
+                 now: datetime.datetime,
+                 url_ids: range,
+                 content_ids: range,
+                 totals: dict[str, int],
+                 ) -> t.Iterator[str]:
+    """Yield the checks of every URL, count them in `totals`."""
+    codes = [code for code, _ in STATUS_CODES]
+    weights = [weight for _, weight in STATUS_CODES]
+    span = spec.days * 86400
+    start = now.timestamp() - span
+    # the Pareto variates are at least 1 with the mean skew / (skew - 1)
+    scale = spec.checks / (spec.urls * (1 - spec.unchecked))
+    scale *= (spec.skew - 1) / spec.skew
+
+    for url_id in url_ids:
+        if rng.random() < spec.unchecked:
+            continue
+        count = max(1, round(scale * rng.paretovariate(spec.skew)))
+        # nobody checks a site more often than hourly
+        count = min(count, spec.days * 24)
+        count = min(count, spec.checks - totals['count'])
+        totals['count'] += count
+        totals['max'] = max(totals['max'], count)
+        # popular contents are shared by many sites
+        content_id = content_ids[int(len(content_ids) * rng.random() ** 3)]
+        for _ in range(count):
+            if rng.random() < CONTENT_CHANGE:
+                content_id = rng.choice(content_ids)
+            code = rng.choices(codes, weights)[0]
+            created_at = datetime.datetime.fromtimestamp(
+                start + rng.random() * span)
+            yield f'{url_id}\t{code}\t{content_id}\t{created_at}\n'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    for field, default in Spec._field_defaults.items():
+        parser.add_argument(f'--{field}', type=type(default), default=default)
+    args = parser.parse_args()
+
+    dotenv.load_dotenv()
+    connection = psycopg2.connect(os.environ['DATABASE_URL'])
+    connection.autocommit = True
+    try:
+        results = generate(connection, Spec(**vars(args)))
+    finally:
+        connection.close()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Microbenchmark of batch URL validation against per-call functions.
+
+    python -m benchmarks.url_batch --size 10000 --unique 1000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+import typing as t
+
+from benchmarks.datasets import generate_urls
+from page_analyzer import urlutils
+
+
+def per_call(urls: list[str]) -> None:
+    """Validate and normalize every URL the way post_urls used to."""
+    for url in urls:
+        if not urlutils.validate_url(url):
+            urlutils.normalize_url(url)
+
+
+def batch(urls: list[str]) -> None:
+    """Validate and normalize the URLs in a batch."""
+    urlutils.validate_urls(urls)
+
+
+def measure(function: t.Callable[[list[str]], None],
+            urls: list[str],
+            ) -> float:
+    """Return URLs per second processed by the function."""
+    started = time.perf_counter()
+    function(urls)
+    return len(urls) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=10000)
+    parser.add_argument('--unique', type=int, default=1000)
+    args = parser.parse_args()
+
+    urls = generate_urls(args.size, args.unique)
+    urlutils.analyze_url.cache_clear()
+    results = {
+        'size': args.size,
+        'unique': args.unique,
+        'per_call_urls_per_second': round(measure(per_call, urls)),
+        'batch_cold_urls_per_second': round(measure(batch, urls)),
+        'batch_warm_urls_per_second': round(measure(batch, urls)),
+        'cache': urlutils.analyze_url.cache_info()._asdict(),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,12 +4,77 @@ CREATE TABLE IF NOT EXISTS urls (
     created_at timestamp NOT NULL
 );
 
+CREATE INDEX IF NOT EXISTS urls_name_idx ON urls (name);
+
+CREATE TABLE IF NOT EXISTS check_contents (
+    id bigint PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
+    digest bytea NOT NULL UNIQUE,
+    h1 varchar(255),
+    title varchar(255),
+    description text,
+    lang varchar(35),
+    canonical text,
+    robots smallint,
+    h1_count smallint,
+    h2_count smallint,
+    internal_links integer,
+    external_links integer,
+    images integer,
+    images_with_alt integer,
+    open_graph jsonb,
+    created_at timestamp NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS url_checks (
     id bigint PRIMARY KEY  GENERATED ALWAYS AS IDENTITY,
     url_id bigint REFERENCES urls (id),
     status_code int NOT NULL,
-    h1 varchar(255),
-    title varchar(255),
-    description text,
+    content_id bigint REFERENCES check_contents (id),
+    final_url text,
+    redirects jsonb,
+    archive_key bytea,
     created_at timestamp NOT NULL
 );
+
+CREATE INDEX IF NOT EXISTS url_checks_url_id_created_at_idx
+    ON url_checks (url_id, created_at);
+
+CREATE INDEX IF NOT EXISTS url_checks_archive_key_idx
+    ON url_checks (archive_key) WHERE archive_key IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS url_check_daily (
+    url_id bigint REFERENCES urls (id),
+    day date NOT NULL,
+    checks_count int NOT NULL,
+    status_counts jsonb NOT NULL,
+    last_status_code int NOT NULL,
+    last_content_id bigint REFERENCES check_contents (id),
+    last_checked_at timestamp NOT NULL,
+    PRIMARY KEY (url_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS check_stats_daily (
+    day date NOT NULL,
+    shard smallint NOT NULL,
+    status_counts jsonb NOT NULL,
+    PRIMARY KEY (day, shard)
+);
+
+CREATE TABLE IF NOT EXISTS url_status (
+    url_id bigint PRIMARY KEY REFERENCES urls (id),
+    last_status_code int,
+    failing boolean NOT NULL,
+    checks_count bigint NOT NULL,
+    last_checked_at timestamp NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS url_status_failing_idx
+    ON url_status (url_id) WHERE failing;
+
+CREATE TABLE IF NOT EXISTS stats_totals (
+    shard smallint PRIMARY KEY,
+    urls bigint NOT NULL,
+    checked_urls bigint NOT NULL,
+    failing_urls bigint NOT NULL,
+    checks bigint NOT NULL
+);
@@ -0,0 +1,96 @@
+"""Gunicorn settings for the production server.
+
+The default worker class is gthread: a check waiting for a remote site
+blocks one thread instead of a whole worker process. Every setting can
+be overridden with the environment variables below.
+
+With GUNICORN_PRELOAD=1 the application is imported once in the master and
+the workers are forked from it: they start faster and share the memory of
+the imported modules. The master closes its DB connections before every
+fork, so no worker inherits a connection socket.
+
+The workers write metrics into PROMETHEUS_MULTIPROC_DIR, /metrics of any
+worker aggregates them. The directory is emptied when the server starts.
+
+With CACHE_BACKEND=shared the workers share their caches through an SQLite
+database in CACHE_DIR, a new directory in shared memory by default. Cached
+entries do not outlive the server, the directory is emptied on start too.
+"""
+import os
+import pathlib
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('GUNICORN_WORKERS', '5'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+preload_app = os.getenv('GUNICORN_PRELOAD', '').lower() in ('1', 'true')
+
+# Every thread of a worker may hold one DB connection at a time.
+os.environ.setdefault('DB_POOL_SIZE', str(threads))
+if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(
+        prefix='page_analyzer_metrics_')
+if 'CACHE_DIR' not in os.environ:
+    os.environ['CACHE_DIR'] = tempfile.mkdtemp(
+        prefix='page_analyzer_cache_',
+        dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+
+
+def on_starting(server):
+    """Remove metrics and cached entries left by a previous run."""
+    metrics_dir = pathlib.Path(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+    metrics_dir.mkdir(parents=True, exist_ok=True)
+    for path in metrics_dir.glob('*.db'):
+        path.unlink()
+    cache_dir = pathlib.Path(os.environ['CACHE_DIR'])
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for path in cache_dir.glob('cache.sqlite*'):
+        path.unlink()
+
+
+def when_ready(server):
+    """Import the lazily loaded modules in the master for the workers to
+    share them."""
+    if server.cfg.preload_app:
+        import bs4  # noqa: F401
+        import requests  # noqa: F401
+        import validators  # noqa: F401
+
+
+def pre_fork(server, worker):
+    """Close the DB connections of the master before forking."""
+    if server.cfg.preload_app:
+        from page_analyzer.url_db import db_operations
+
+        db_operations.reset_pools()
+
+
+def post_fork(server, worker):
+    """Restart the log listener thread, threads do not survive a fork."""
+    if server.cfg.preload_app:
+        from page_analyzer import logs
+
+        logs.setup_logging()
+
+
+def post_worker_init(worker):
+    """Let the readiness probe see the request queue of the worker."""
+    from page_analyzer import health
+
+    health.register_worker(worker)
+
+
+def worker_exit(server, worker):
+    """Write the checks still buffered by the exiting worker."""
+    from page_analyzer.url_db import check_buffer
+
+    check_buffer.close_check_buffer()
+
+
+def child_exit(server, worker):
+    """Stop reporting the live values of an exited worker."""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,60 @@
+-- Move h1, title and description of url_checks into the content-addressed
+-- check_contents table. Safe to run more than once.
+--
+-- benchmarks/check_storage.py measured 200 000 checks with 2 000 distinct
+-- contents: url_checks took 34.6 MB and a full scan 35 ms before, both
+-- tables take 17.9 MB and the scan 21 ms after VACUUM FULL url_checks. The
+-- migration reports the sizes of this database in notices.
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS check_contents (
+    id bigint PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
+    digest bytea NOT NULL UNIQUE,
+    h1 varchar(255),
+    title varchar(255),
+    description text,
+    created_at timestamp NOT NULL
+);
+
+ALTER TABLE url_checks
+    ADD COLUMN IF NOT EXISTS content_id bigint REFERENCES check_contents (id);
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT FROM information_schema.columns
+               WHERE table_name = 'url_checks' AND column_name = 'h1') THEN
+        RAISE NOTICE 'url_checks before: %',
+            pg_size_pretty(pg_total_relation_size('url_checks'));
+
+        CREATE TEMPORARY TABLE url_check_digests ON COMMIT DROP AS
+        SELECT id,
+               sha256(convert_to(
+                   json_build_array(h1, title, description)::text,
+                   'UTF8')) AS digest,
+               h1, title, description, created_at
+        FROM url_checks;
+
+        INSERT INTO check_contents (digest, h1, title, description, created_at)
+        SELECT DISTINCT ON (digest) digest, h1, title, description, created_at
+        FROM url_check_digests
+        ORDER BY digest, created_at
+        ON CONFLICT (digest) DO NOTHING;
+
+        UPDATE url_checks
+        SET content_id = check_contents.id
+        FROM url_check_digests
+        JOIN check_contents USING (digest)
+        WHERE url_checks.id = url_check_digests.id;
+
+        ALTER TABLE url_checks
+            DROP COLUMN h1,
+            DROP COLUMN title,
+            DROP COLUMN description;
+
+        RAISE NOTICE 'check_contents after: %, run VACUUM FULL url_checks '
+            'to return the space of the dropped columns',
+            pg_size_pretty(pg_total_relation_size('check_contents'));
+    END IF;
+END $$;
+
+COMMIT;
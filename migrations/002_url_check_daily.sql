@@ -0,0 +1,18 @@
+-- Daily per-URL aggregates of checks removed by the retention policy.
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS url_checks_url_id_created_at_idx
+    ON url_checks (url_id, created_at);
+
+CREATE TABLE IF NOT EXISTS url_check_daily (
+    url_id bigint REFERENCES urls (id),
+    day date NOT NULL,
+    checks_count int NOT NULL,
+    status_counts jsonb NOT NULL,
+    last_status_code int NOT NULL,
+    last_content_id bigint REFERENCES check_contents (id),
+    last_checked_at timestamp NOT NULL,
+    PRIMARY KEY (url_id, day)
+);
+
+COMMIT;
@@ -0,0 +1,18 @@
+-- Add the SEO fields stored by the extended parse (EXTENDED_PARSE) to
+-- check_contents. The columns stay NULL for contents of the basic parse.
+-- Safe to run more than once.
+BEGIN;
+
+ALTER TABLE check_contents
+    ADD COLUMN IF NOT EXISTS lang varchar(35),
+    ADD COLUMN IF NOT EXISTS canonical text,
+    ADD COLUMN IF NOT EXISTS robots smallint,
+    ADD COLUMN IF NOT EXISTS h1_count smallint,
+    ADD COLUMN IF NOT EXISTS h2_count smallint,
+    ADD COLUMN IF NOT EXISTS internal_links integer,
+    ADD COLUMN IF NOT EXISTS external_links integer,
+    ADD COLUMN IF NOT EXISTS images integer,
+    ADD COLUMN IF NOT EXISTS images_with_alt integer,
+    ADD COLUMN IF NOT EXISTS open_graph jsonb;
+
+COMMIT;
@@ -0,0 +1,9 @@
+-- Record the redirects followed by each check and the URL they led to.
+-- Both stay NULL for checks without redirects. Safe to run more than once.
+BEGIN;
+
+ALTER TABLE url_checks
+    ADD COLUMN IF NOT EXISTS final_url text,
+    ADD COLUMN IF NOT EXISTS redirects jsonb;
+
+COMMIT;
@@ -0,0 +1,65 @@
+-- Rollups read by the /stats dashboard and kept up to date by every check,
+-- backfilled from the stored checks and their daily aggregates. Safe to run
+-- more than once: rows counted since the first run are kept.
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS check_stats_daily (
+    day date NOT NULL,
+    shard smallint NOT NULL,
+    status_counts jsonb NOT NULL,
+    PRIMARY KEY (day, shard)
+);
+
+CREATE TABLE IF NOT EXISTS url_status (
+    url_id bigint PRIMARY KEY REFERENCES urls (id),
+    last_status_code int,
+    failing boolean NOT NULL,
+    checks_count bigint NOT NULL,
+    last_checked_at timestamp NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS url_status_failing_idx
+    ON url_status (url_id) WHERE failing;
+
+-- 8 is ROLLUP_SHARDS of page_analyzer/url_db/rollups.py
+INSERT INTO check_stats_daily (day, shard, status_counts)
+SELECT day, shard, jsonb_object_agg(code, total)
+FROM (
+    SELECT day, shard, code, sum(amount) AS total
+    FROM (
+        SELECT created_at::date AS day, (url_id % 8)::smallint AS shard,
+               status_code::text AS code, count(*) AS amount
+        FROM url_checks
+        GROUP BY day, shard, code
+        UNION ALL
+        SELECT day, (url_id % 8)::smallint, code, amount::bigint
+        FROM url_check_daily,
+             jsonb_each_text(status_counts) AS counts (code, amount)
+    ) AS counts
+    GROUP BY day, shard, code
+) AS per_status
+GROUP BY day, shard
+ON CONFLICT (day, shard) DO NOTHING;
+
+INSERT INTO url_status (url_id, last_status_code, failing, checks_count,
+                        last_checked_at)
+SELECT url_id, last_status_code, last_status_code >= 400, checks_count,
+       last_checked_at
+FROM (
+    SELECT url_id,
+           (array_agg(status_code ORDER BY checked_at DESC))[1]
+               AS last_status_code,
+           sum(checks) AS checks_count,
+           max(checked_at) AS last_checked_at
+    FROM (
+        SELECT url_id, status_code, created_at AS checked_at, 1 AS checks
+        FROM url_checks
+        UNION ALL
+        SELECT url_id, last_status_code, last_checked_at, checks_count
+        FROM url_check_daily
+    ) AS checks
+    GROUP BY url_id
+) AS per_url
+ON CONFLICT (url_id) DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,7 @@
+-- Index the URL names: adding a URL looks it up by name first, which
+-- scanned the whole table. Safe to run more than once.
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS urls_name_idx ON urls (name);
+
+COMMIT;
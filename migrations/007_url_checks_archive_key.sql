@@ -0,0 +1,10 @@
+-- Reference the archived response of each check, see ARCHIVE_DIR. Stays
+-- NULL for checks made without the archive. Safe to run more than once.
+BEGIN;
+
+ALTER TABLE url_checks ADD COLUMN IF NOT EXISTS archive_key bytea;
+
+CREATE INDEX IF NOT EXISTS url_checks_archive_key_idx
+    ON url_checks (archive_key) WHERE archive_key IS NOT NULL;
+
+COMMIT;
@@ -0,0 +1,24 @@
+-- Totals of the /stats dashboard kept up to date by every new URL and
+-- check, backfilled from urls and url_status. Safe to run more than once:
+-- rows counted since the first run are kept.
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS stats_totals (
+    shard smallint PRIMARY KEY,
+    urls bigint NOT NULL,
+    checked_urls bigint NOT NULL,
+    failing_urls bigint NOT NULL,
+    checks bigint NOT NULL
+);
+
+-- 8 is ROLLUP_SHARDS of page_analyzer/url_db/rollups.py
+INSERT INTO stats_totals (shard, urls, checked_urls, failing_urls, checks)
+SELECT shard, count(*), count(status.url_id),
+       count(*) FILTER (WHERE status.failing),
+       coalesce(sum(status.checks_count), 0)
+FROM (SELECT id, (id % 8)::smallint AS shard FROM urls) AS urls
+LEFT JOIN url_status AS status ON status.url_id = urls.id
+GROUP BY shard
+ON CONFLICT (shard) DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,66 @@
+-- Optional: turn url_checks into a table partitioned by month, so that
+-- `flask --app page_analyzer apply-retention --drop-partitions` can roll up
+-- and drop whole months instead of deleting rows. Run it during a
+-- maintenance window, it rewrites the table.
+BEGIN;
+
+ALTER TABLE url_checks RENAME TO url_checks_unpartitioned;
+ALTER INDEX url_checks_url_id_created_at_idx
+    RENAME TO url_checks_unpartitioned_url_id_created_at_idx;
+ALTER INDEX IF EXISTS url_checks_archive_key_idx
+    RENAME TO url_checks_unpartitioned_archive_key_idx;
+
+CREATE TABLE url_checks (
+    id bigint GENERATED ALWAYS AS IDENTITY,
+    url_id bigint REFERENCES urls (id),
+    status_code int NOT NULL,
+    content_id bigint REFERENCES check_contents (id),
+    final_url text,
+    redirects jsonb,
+    archive_key bytea,
+    created_at timestamp NOT NULL,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE INDEX url_checks_url_id_created_at_idx
+    ON url_checks (url_id, created_at);
+
+CREATE INDEX url_checks_archive_key_idx
+    ON url_checks (archive_key) WHERE archive_key IS NOT NULL;
+
+-- Catches rows outside the monthly partitions created in advance.
+CREATE TABLE url_checks_default PARTITION OF url_checks DEFAULT;
+
+DO $$
+DECLARE
+    month date;
+BEGIN
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', coalesce(min(created_at), now())),
+            date_trunc('month', now()) + interval '2 months',
+            interval '1 month')::date
+        FROM url_checks_unpartitioned
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF url_checks FOR VALUES FROM (%L) TO (%L)',
+            'url_checks_' || to_char(month, 'YYYY_MM'),
+            month,
+            month + interval '1 month');
+    END LOOP;
+END $$;
+
+INSERT INTO url_checks (id, url_id, status_code, content_id, final_url,
+                        redirects, archive_key, created_at)
+OVERRIDING SYSTEM VALUE
+SELECT id, url_id, status_code, content_id, final_url, redirects,
+       archive_key, created_at
+FROM url_checks_unpartitioned;
+
+SELECT setval(pg_get_serial_sequence('url_checks', 'id'),
+              coalesce(max(id), 0) + 1, false)
+FROM url_checks;
+
+DROP TABLE url_checks_unpartitioned;
+
+COMMIT;
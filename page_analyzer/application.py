@@ -2,27 +2,42 @@ from __future__ import annotations
 
 import logging
 import os
+import re
+import time
 import typing as t
+import uuid
 
 import dotenv
 from flask import (
     abort,
     flash,
     Flask,
+    g,
     get_flashed_messages,
     redirect,
     render_template,
     request,
+    session,
     url_for
 )
 import psycopg2
-import requests
 
+from page_analyzer import archive
+from page_analyzer import commands
+from page_analyzer import health
+from page_analyzer import live_updates
+from page_analyzer import logs
+from page_analyzer import metrics
+from page_analyzer import tracing
 from page_analyzer import url_db
 from page_analyzer import urlutils
 from page_analyzer import webutils
+from page_analyzer.url_db import change_feed
+from page_analyzer.url_db import check_buffer
+from page_analyzer.url_db import routing
 
 if t.TYPE_CHECKING:
+    import requests
     from werkzeug.exceptions import HTTPException
     from werkzeug.wrappers import Response
 
@@ -30,16 +45,107 @@ dotenv.load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY')
+app.cli.add_command(commands.apply_retention)
+app.cli.add_command(commands.show_slow_queries)
+app.cli.add_command(commands.check_urls)
+app.cli.add_command(commands.reparse_archive)
 DATABASE_URL = os.getenv('DATABASE_URL', '')
 
 WARNING_MESSAGE_TYPE = 'danger'
 SUCCES_MESSAGE_TYPE = 'success'
 INFO_MESSAGE_TYPE = 'info'
 
-logging.basicConfig(level=logging.INFO,
-                    format='[%(asctime)s] [%(levelname)s] '
-                           '[%(module)s.%(funcName)s] %(message)s',
-                    datefmt='%Y-%m-%d %H:%M:%S')
+PRIMARY_UNTIL_KEY = 'read_primary_until'
+REQUEST_ID_HEADER = 'X-Request-ID'
+REQUEST_ID_PATTERN = re.compile(r'^[\w.-]{1,64}$')
+
+logs.setup_logging()
+logger = logging.getLogger(__name__)
+
+
+@app.before_request
+def start_timer() -> None:
+    """Remember when the request processing started."""
+    g.started = time.perf_counter()
+
+
+@app.before_request
+def assign_request_id() -> None:
+    """Take the request id from the header or generate a new one."""
+    request_id = request.headers.get(REQUEST_ID_HEADER, '')
+    if not REQUEST_ID_PATTERN.match(request_id):
+        request_id = uuid.uuid4().hex
+    g.request_id = request_id
+    g.request_id_token = logs.request_id.set(request_id)
+
+
+@app.before_request
+def start_change_feed() -> None:
+    """Start the change feed listener of the worker with its first
+    request, the master of a preloaded app serves none."""
+    if change_feed.CHANGE_FEED:
+        change_feed.start_listener(DATABASE_URL)
+
+
+@app.before_request
+def start_trace() -> None:
+    """Start the trace of a sampled request."""
+    route = _get_route()
+    tracing.start_trace(f'{request.method} {route}',
+                        attributes={'http.method': request.method,
+                                    'http.route': route,
+                                    'request.id': g.request_id})
+
+
+@app.after_request
+def observe_request(response: Response) -> Response:
+    """Record the request latency by route."""
+    started = g.get('started')
+    if started is not None:
+        metrics.observe_request(request.method, _get_route(),
+                                response.status_code,
+                                time.perf_counter() - started)
+    return response
+
+
+@app.after_request
+def add_request_id(response: Response) -> Response:
+    """Return the request id to the client."""
+    if 'request_id' in g:
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+    return response
+
+
+@app.after_request
+def add_server_timing(response: Response) -> Response:
+    """Record the status in the trace, report its stages in the
+    Server-Timing header."""
+    tracing.set_attribute('http.status_code', response.status_code)
+    if tracing.SERVER_TIMING:
+        server_timing = tracing.get_server_timing()
+        if server_timing is not None:
+            response.headers['Server-Timing'] = server_timing
+    return response
+
+
+@app.teardown_request
+def end_trace(error: BaseException | None) -> None:
+    """Finish and export the trace of the request."""
+    tracing.end_trace(error)
+
+
+@app.teardown_request
+def reset_request_id(error: BaseException | None) -> None:
+    """Detach the request id from the thread."""
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        logs.request_id.reset(token)
+
+
+def _get_route() -> str:
+    """Return the matched URL rule of the request."""
+    # the rule, not the path, keeps the number of label values bounded
+    return request.url_rule.rule if request.url_rule else 'unmatched'
 
 
 @app.get('/')
@@ -53,38 +159,53 @@ def index() -> str:
 def post_urls() -> Response | tuple[str, int]:
     """Process a request to create a url record."""
     url = request.form.get('url', '')
-    errors = urlutils.validate_url(url)
+    report = urlutils.analyze_url(url)
+    normalized_url = report.normalized_url
 
-    if errors:
-        for error in errors:
+    if normalized_url is None:
+        for error in report.errors:
             flash(error, WARNING_MESSAGE_TYPE)
         messages = get_flashed_messages(with_categories=True)
         return render_template('index.html',
                                messages=messages,
                                url=url), 422
 
-    normalized_url = urlutils.normalize_url(url)
+    url_id, url_exists = _find_or_create_url(normalized_url)
+
+    if url_exists:
+        flash('Страница уже существует', INFO_MESSAGE_TYPE)
+    else:
+        flash('Страница успешно добавлена', SUCCES_MESSAGE_TYPE)
+    return redirect(url_for('get_url', id=url_id))
+
+
+def _find_or_create_url(url: str) -> tuple[int, bool]:
+    """Return the URL id and whether the record already existed."""
+    url_id = url_db.get_cached_url_id(url)
+    if url_id is not None:
+        return url_id, True
 
     connection = url_db.open_connection(DATABASE_URL)
     try:
-        url_id = url_db.check_url(connection, normalized_url)
-        if url_id is not None:
-            flash('Страница уже существует', INFO_MESSAGE_TYPE)
-            return redirect(url_for('get_url', id=url_id))
-        url_id = url_db.create_url(connection, normalized_url)
+        url_id = url_db.check_url(connection, url)
+        url_exists = url_id is not None
+        if not url_exists:
+            url_id = url_db.create_url(connection, url)
+            _remember_write()
     except psycopg2.Error:
         abort(500)
     finally:
         url_db.close_connection(connection)
 
-    flash('Страница успешно добавлена', SUCCES_MESSAGE_TYPE)
-    return redirect(url_for('get_url', id=url_id))
+    url_db.cache_url_id(url, url_id)  # type: ignore
+    return url_id, url_exists  # type: ignore
 
 
 @app.get('/urls')
 def get_urls() -> str:
     """Return the page with the list of URLs."""
-    connection = url_db.open_connection(DATABASE_URL)
+    connection = url_db.open_read_connection(DATABASE_URL,
+                                             _wrote_recently())
     try:
         urls = url_db.get_urls(connection)
     except psycopg2.Error:
@@ -99,7 +220,8 @@ def get_urls() -> str:
 @app.get('/urls/<int:id>')
 def get_url(id: int) -> str:
     """Return the page to a specific URL."""
-    connection = url_db.open_connection(DATABASE_URL)
+    connection = url_db.open_read_connection(DATABASE_URL,
+                                             _wrote_recently())
     try:
         url = url_db.get_url(connection, id)
         if url is None:
@@ -114,41 +236,168 @@ def get_url(id: int) -> str:
     return render_template('url.html',
                            messages=messages,
                            url=url,
-                           checks=checks)
+                           checks=checks,
+                           live_updates=change_feed.CHANGE_FEED)
+
+
+@app.get('/urls/<int:id>/events')
+def get_url_events(id: int) -> Response:
+    """Stream the new checks of the URL as Server-Sent Events."""
+    if not change_feed.CHANGE_FEED:
+        abort(404)
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    after = (int(last_event_id) if last_event_id.isdigit()
+             else request.args.get('after', 0, type=int))
+    if not live_updates.acquire_stream():
+        abort(503)
+    response = app.response_class(
+        live_updates.stream_checks(DATABASE_URL, id, after),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(live_updates.release_stream)
+    return response
 
 
 @app.post('/urls/<int:id>/checks')
 def post_checks(id: int) -> Response:
-    """Process a request to create a URL verification record."""
+    """Process a request to create a URL verification record.
+
+    No DB connection is held while the site is fetched or while a buffered
+    check waits for its batch: the writer of the buffer takes its own
+    connection from the same pool.
+    """
+    import requests
+
+    url_name = _get_url_name(id)
+    try:
+        response = webutils.get_site_response(url_name)
+    except requests.RequestException as error:
+        _record_failed_check(id, error)
+        flash('Произошла ошибка при проверке', INFO_MESSAGE_TYPE)
+        return redirect(url_for('get_url', id=id))
+
+    parsed_response = webutils.parse_html_response(response)
+    parsed_response['archive_key'] = archive.store_response(response)
+    _create_check(id, parsed_response)
+    _remember_write()
+
+    flash('Страница успешно проверена', SUCCES_MESSAGE_TYPE)
+    return redirect(url_for('get_url', id=id))
+
+
+def _get_url_name(url_id: int) -> str:
+    """Return the URL to check, abort if it does not exist."""
     connection = url_db.open_connection(DATABASE_URL)
     try:
-        url = url_db.get_url(connection, id)
-        if url is None:
-            abort(404)
-        response = webutils.get_site_response(url.name)  # type: ignore
-        parsed_response = webutils.parse_html_response(response)
-        url_db.create_check(connection, id, parsed_response)
+        url = url_db.get_url(connection, url_id)
     except psycopg2.Error:
         abort(500)
-    except requests.RequestException:
-        flash('Произошла ошибка при проверке', INFO_MESSAGE_TYPE)
-        return redirect(url_for('get_url', id=id))
     finally:
         url_db.close_connection(connection)
+    if url is None:
+        abort(404)
+    return url.name  # type: ignore
 
-    flash('Страница успешно проверена', SUCCES_MESSAGE_TYPE)
-    return redirect(url_for('get_url', id=id))
+
+def _create_check(url_id: int, data: dict[str, t.Any]) -> None:
+    """Create the check, in a batch shared with the concurrent checks of
+    this process if CHECK_BUFFER_SIZE is set."""
+    try:
+        if check_buffer.CHECK_BUFFER_SIZE:
+            check_buffer.get_check_buffer(DATABASE_URL).add(url_id,
+                                                            data).result()
+            return
+        connection = url_db.open_connection(DATABASE_URL)
+        try:
+            url_db.create_check(connection, url_id, data)
+        finally:
+            url_db.close_connection(connection)
+    except psycopg2.Error:
+        abort(500)
+
+
+def _record_failed_check(url_id: int,
+                         error: requests.RequestException,
+                         ) -> None:
+    """Count the failed check in the dashboard rollups."""
+    response = error.response
+    status_code = response.status_code if response is not None else None
+    connection = url_db.open_connection(DATABASE_URL)
+    try:
+        url_db.record_failed_check(connection, url_id, status_code)
+    except psycopg2.Error:
+        abort(500)
+    finally:
+        url_db.close_connection(connection)
+
+
+@app.get('/stats')
+def get_stats() -> str:
+    """Return the dashboard page."""
+    stats = _read_stats()
+    messages = get_flashed_messages(with_categories=True)
+    return render_template('stats.html', messages=messages, stats=stats)
+
+
+@app.get('/api/stats')
+def get_stats_data() -> dict[str, t.Any]:
+    """Return the dashboard statistics as JSON."""
+    return _read_stats()
+
+
+def _read_stats() -> dict[str, t.Any]:
+    """Read the statistics from the rollups, never from the checks."""
+    connection = url_db.open_read_connection(DATABASE_URL)
+    try:
+        stats = url_db.get_stats(connection)
+    except psycopg2.Error:
+        abort(500)
+    finally:
+        url_db.close_connection(connection)
+    return stats
+
+
+def _remember_write() -> None:
+    """Read from the primary while the replica may miss the client's
+    own write."""
+    if routing.DATABASE_REPLICA_URL:
+        lag = routing.REPLICA_MAX_LAG_SECONDS
+        session[PRIMARY_UNTIL_KEY] = time.time() + lag
+
+
+def _wrote_recently() -> bool:
+    return session.get(PRIMARY_UNTIL_KEY, 0) > time.time()
+
+
+@app.get('/healthz')
+def get_liveness() -> dict[str, t.Any]:
+    """Return the liveness report."""
+    return health.check_liveness()
+
+
+@app.get('/readyz')
+def get_readiness() -> tuple[dict[str, t.Any], int]:
+    """Return the readiness report, 503 when the worker is saturated."""
+    ready, report = health.check_readiness(DATABASE_URL)
+    return report, 200 if ready else 503
+
+
+@app.get('/metrics')
+def get_metrics() -> tuple[bytes, int, dict[str, str]]:
+    """Return the metrics in the Prometheus text format."""
+    data, content_type = metrics.render()
+    return data, 200, {'Content-Type': content_type}
 
 
 @app.errorhandler(404)
 def page_not_found(error: HTTPException) -> tuple[str, int]:
     """Handle error 404"""
-    logging.exception(error)
+    logger.exception(error)
     return render_template('errors/404.html'), 404
 
 
 @app.errorhandler(500)
 def internal_server_error(error: HTTPException) -> tuple[str, int]:
     """Handle error 500."""
-    logging.exception(error)
+    logger.exception(error)
     return render_template('errors/500.html'), 500
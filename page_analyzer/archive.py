@@ -0,0 +1,190 @@
+"""Append-only archive of the fetched pages, for parsing them again later.
+
+With ARCHIVE_DIR set, every checked response is stored once per distinct
+content: the archive key is the SHA-256 of the final URL, the encoding and
+the body, and the check references it. A record is a gzip member holding a
+JSON header line (URL, status code, encoding, headers, fetch time) and the
+raw body. Records are appended to segment files of ARCHIVE_SEGMENT_MB,
+which are concatenated gzip streams like WARC files: they can be read
+sequentially without the index. The index, an SQLite table of the archive
+keys and their segment, offset and length, finds known contents.
+"""
+from __future__ import annotations
+
+import contextlib
+import datetime
+import fcntl
+import gzip
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import threading
+import typing as t
+import zlib
+
+if t.TYPE_CHECKING:
+    import requests
+
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', '')
+ARCHIVE_SEGMENT_MB = float(os.getenv('ARCHIVE_SEGMENT_MB', '16'))
+
+SEGMENT_PATTERN = 'segment-*.gz'
+INDEX_NAME = 'index.sqlite'
+LOCK_NAME = 'lock'
+READ_CHUNK_SIZE = 65536
+
+CREATE_INDEX = '''
+CREATE TABLE IF NOT EXISTS records (
+    key BLOB PRIMARY KEY,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+)
+'''
+
+STORE_ERROR_MESSAGE = 'The response was not archived'
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+
+
+class Record(t.NamedTuple):
+    key: bytes
+    url: str
+    status_code: int
+    encoding: str | None
+    headers: dict[str, str]
+    fetched_at: str
+    body: bytes
+
+
+def get_archive_key(url: str, encoding: str | None, body: bytes) -> bytes:
+    """Return the SHA-256 digest identifying the content of a response."""
+    digest = hashlib.sha256(f'{url}\n{encoding or ""}\n'.encode())
+    digest.update(body)
+    return digest.digest()
+
+
+def store_response(response: requests.Response,
+                   archive_dir: str | None = None,
+                   ) -> bytes | None:
+    """Archive the response unless its content is already archived,
+    return its archive key.
+
+    Return None if the archive is disabled or could not be written, the
+    check goes on without it. `archive_dir` defaults to ARCHIVE_DIR.
+    """
+    archive_dir = ARCHIVE_DIR if archive_dir is None else archive_dir
+    if not archive_dir:
+        return None
+
+    body = response.content
+    key = get_archive_key(response.url, response.encoding, body)
+    header = {'url': response.url,
+              'status_code': response.status_code,
+              'encoding': response.encoding,
+              'headers': dict(response.headers),
+              'fetched_at': datetime.datetime.now().isoformat()}
+    try:
+        _append(pathlib.Path(archive_dir), key, header, body)
+    except (OSError, sqlite3.Error):
+        logger.exception(STORE_ERROR_MESSAGE)
+        return None
+    return key
+
+
+def list_segments(archive_dir: str = ARCHIVE_DIR) -> list[pathlib.Path]:
+    """Return the segment files in the order they were written."""
+    return sorted(pathlib.Path(archive_dir).glob(SEGMENT_PATTERN))
+
+
+def read_segment(path: pathlib.Path) -> t.Iterator[Record]:
+    """Yield the records of the segment in the order they were written."""
+    with open(path, 'rb') as segment:
+        data = memoryview(segment.read())
+    position = 0
+    while position < len(data):
+        content, position = _decompress_member(data, position)
+        header, _, body = content.partition(b'\n')
+        fields = json.loads(header)
+        yield Record(key=bytes.fromhex(fields.pop('key')), body=body,
+                     **fields)
+
+
+def _append(archive_dir: pathlib.Path,
+            key: bytes,
+            header: dict[str, t.Any],
+            body: bytes,
+            ) -> None:
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    with contextlib.closing(_open_index(archive_dir)) as index:
+        if _is_archived(index, key):
+            return
+        # compressed before taking the lock, the other threads and workers
+        # go on archiving meanwhile
+        line = json.dumps({'key': key.hex(), **header}).encode()
+        record = gzip.compress(line + b'\n' + body, compresslevel=6)
+        with _locked(archive_dir):
+            if _is_archived(index, key):
+                return
+            number, path = _get_current_segment(archive_dir)
+            with open(path, 'ab') as segment:
+                offset = segment.tell()
+                segment.write(record)
+            with index:
+                index.execute('INSERT INTO records VALUES (?, ?, ?, ?)',
+                              (key, number, offset, len(record)))
+
+
+def _is_archived(index: sqlite3.Connection, key: bytes) -> bool:
+    return index.execute('SELECT 1 FROM records WHERE key = ?',
+                         (key,)).fetchone() is not None
+
+
+@contextlib.contextmanager
+def _locked(archive_dir: pathlib.Path) -> t.Iterator[None]:
+    """Hold the archive lock of this process' threads and of the other
+    worker processes."""
+    with _lock, open(archive_dir / LOCK_NAME, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _open_index(archive_dir: pathlib.Path) -> sqlite3.Connection:
+    index = sqlite3.connect(archive_dir / INDEX_NAME)
+    index.execute(CREATE_INDEX)
+    return index
+
+
+def _get_current_segment(archive_dir: pathlib.Path,
+                         ) -> tuple[int, pathlib.Path]:
+    """Return the number and path of the segment to append to, starting a
+    new one when the last one is full."""
+    segments = list_segments(str(archive_dir))
+    number = int(segments[-1].stem.split('-')[1]) if segments else 1
+    path = archive_dir / f'segment-{number:06d}.gz'
+    if path.exists() and path.stat().st_size >= ARCHIVE_SEGMENT_MB * 2**20:
+        number += 1
+        path = archive_dir / f'segment-{number:06d}.gz'
+    return number, path
+
+
+def _decompress_member(data: memoryview, position: int) -> tuple[bytes, int]:
+    """Decompress the gzip member at the position, return its content and
+    the position of the next member."""
+    decompressor = zlib.decompressobj(wbits=31)
+    chunks = []
+    while not decompressor.eof:
+        chunk = data[position:position + READ_CHUNK_SIZE]
+        if not chunk:
+            raise EOFError('Truncated archive record')
+        chunks.append(decompressor.decompress(chunk))
+        position += len(chunk)
+    return b''.join(chunks), position - len(decompressor.unused_data)
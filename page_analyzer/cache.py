@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import collections
+import os
+import threading
+import time
+import typing as t
+
+DEFAULT_BACKEND = 'memory'
+
+
+class CacheBackend(t.Protocol):
+    """Interface shared by all cache backends."""
+
+    def get(self, key: str) -> t.Any | None:
+        ...
+
+    def set(self, key: str, value: t.Any) -> None:
+        ...
+
+    def delete(self, key: str) -> None:
+        ...
+
+    def clear(self) -> None:
+        ...
+
+    def stats(self) -> dict[str, int]:
+        ...
+
+
+BackendFactory = t.Callable[[str, int, t.Optional[float]], CacheBackend]
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with an optional TTL."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: collections.OrderedDict[str, tuple[float | None, t.Any]]
+        self._data = collections.OrderedDict()
+        self._counters: collections.Counter[str] = collections.Counter()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> t.Any | None:
+        """Return the cached value or None if it is missing or expired."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._counters['misses'] += 1
+                return None
+            expires_at, value = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return None
+            self._data.move_to_end(key)
+            self._counters['hits'] += 1
+            return value
+
+    def set(self, key: str, value: t.Any) -> None:
+        """Store the value, evicting the least recently used entries."""
+        expires_at = None
+        if self.ttl is not None:
+            expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            self._counters['sets'] += 1
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def delete(self, key: str) -> None:
+        """Remove the key from the cache if it is present."""
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self._counters['invalidations'] += 1
+
+    def clear(self) -> None:
+        """Remove all entries, keeping the counters."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Return the cache counters and current size."""
+        with self._lock:
+            counters = {name: self._counters[name]
+                        for name in ('hits', 'misses', 'sets', 'evictions',
+                                     'expirations', 'invalidations')}
+            return counters | {'size': len(self._data),
+                               'maxsize': self.maxsize}
+
+
+def _create_memory_backend(name: str,
+                           maxsize: int,
+                           ttl: float | None,
+                           ) -> CacheBackend:
+    return LRUCache(maxsize=maxsize, ttl=ttl)
+
+
+def _create_shared_backend(name: str,
+                           maxsize: int,
+                           ttl: float | None,
+                           ) -> CacheBackend:
+    # imported on first use, the memory backend needs no SQLite
+    from page_analyzer import shared_cache
+
+    return shared_cache.create_shared_backend(name, maxsize, ttl)
+
+
+_backends: dict[str, BackendFactory] = {'memory': _create_memory_backend,
+                                        'shared': _create_shared_backend}
+_caches: dict[str, CacheBackend] = {}
+_caches_lock = threading.Lock()
+
+
+def register_backend(name: str, factory: BackendFactory) -> None:
+    """Make a cache backend available through the CACHE_BACKEND variable."""
+    _backends[name] = factory
+
+
+def get_cache(name: str,
+              maxsize: int = 1024,
+              ttl: float | None = None,
+              ) -> CacheBackend:
+    """Return the named cache, creating it with the configured backend."""
+    with _caches_lock:
+        if name not in _caches:
+            backend = os.getenv('CACHE_BACKEND', DEFAULT_BACKEND)
+            _caches[name] = _backends[backend](name, maxsize, ttl)
+        return _caches[name]
+
+
+def get_stats() -> dict[str, dict[str, int]]:
+    """Return the counters of every created cache."""
+    with _caches_lock:
+        caches = dict(_caches)
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+def clear_caches() -> None:
+    """Empty every created cache."""
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.clear()
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import datetime
+import os
+import typing as t
+
+import click
+
+from page_analyzer import archive
+from page_analyzer import pipeline
+from page_analyzer import reparse
+from page_analyzer import url_db
+from page_analyzer.url_db import db_operations
+from page_analyzer.url_db import retention
+from page_analyzer.url_db import slow_queries
+
+if t.TYPE_CHECKING:
+    from psycopg2.extensions import connection
+
+
+@click.command('apply-retention')
+@click.option('--keep-days', type=int,
+              default=retention.CHECKS_RETENTION_DAYS,
+              show_default=True,
+              help='Days of raw checks to keep.')
+@click.option('--batch-size', type=int,
+              default=retention.RETENTION_BATCH_SIZE,
+              show_default=True,
+              help='Checks rolled up per transaction.')
+@click.option('--max-batches', type=int, default=None,
+              help='Stop after this many batches.')
+@click.option('--drop-partitions', is_flag=True,
+              help='Roll up and drop expired monthly partitions first.')
+def apply_retention(keep_days: int,
+                    batch_size: int,
+                    max_batches: int | None,
+                    drop_partitions: bool,
+                    ) -> None:
+    """Roll up old URL checks into daily aggregates."""
+    connection = db_operations.open_connection(os.getenv('DATABASE_URL', ''))
+    try:
+        if drop_partitions:
+            _maintain_partitions(connection, keep_days)
+        count = retention.apply_retention(connection,
+                                          keep_days=keep_days,
+                                          batch_size=batch_size,
+                                          max_batches=max_batches)
+    finally:
+        db_operations.close_connection(connection)
+
+    click.echo(f'Rolled up {count} checks')
+
+
+@click.command('slow-queries')
+@click.option('--log', 'path', default=slow_queries.SLOW_QUERY_LOG,
+              type=click.Path(dir_okay=False),
+              help='Slow query log, SLOW_QUERY_LOG by default.')
+@click.option('--top', type=int, default=10, show_default=True,
+              help='Number of statements to show.')
+def show_slow_queries(path: str, top: int) -> None:
+    """Summarize the slowest statements of the slow query log."""
+    if not path:
+        raise click.UsageError('Set SLOW_QUERY_LOG or pass --log')
+    if not os.path.exists(path):
+        raise click.FileError(path, 'the log is empty or missing')
+    offenders = slow_queries.summarize(path, top)
+    click.echo(f'{"calls":>7} {"total ms":>11} {"mean ms":>9} '
+               f'{"max ms":>9} {"plans":>6}  statement')
+    for group in offenders:
+        click.echo(f'{group["calls"]:>7} {group["total_ms"]:>11} '
+                   f'{group["mean_ms"]:>9} {group["max_ms"]:>9} '
+                   f'{group["explained"]:>6}  {group["fingerprint"]}')
+
+
+@click.command('check-urls')
+@click.option('--fetch-workers', type=int,
+              default=pipeline.PIPELINE_FETCH_WORKERS, show_default=True,
+              help='Threads fetching the sites.')
+@click.option('--parse-workers', type=int,
+              default=pipeline.PIPELINE_PARSE_WORKERS, show_default=True,
+              help='Processes parsing the pages, 0 is one per CPU.')
+@click.option('--queue-size', type=int,
+              default=pipeline.PIPELINE_QUEUE_SIZE, show_default=True,
+              help='Checks in flight before fetching pauses.')
+@click.option('--batch-size', type=int,
+              default=pipeline.PIPELINE_BATCH_SIZE, show_default=True,
+              help='Checks written per transaction.')
+def check_urls(fetch_workers: int,
+               parse_workers: int,
+               queue_size: int,
+               batch_size: int,
+               ) -> None:
+    """Check every URL, parsing the pages in parallel processes."""
+    db_url = os.getenv('DATABASE_URL', '')
+    connection = url_db.open_connection(db_url)
+    try:
+        urls = [(url.id, url.name)  # type: ignore
+                for url in url_db.get_urls(connection)]
+    finally:
+        url_db.close_connection(connection)
+
+    stats = pipeline.check_urls(db_url, urls,
+                                fetch_workers=fetch_workers,
+                                parse_workers=parse_workers,
+                                queue_size=queue_size,
+                                batch_size=batch_size)
+    click.echo(f'Checked {stats.checked} URLs, {stats.failed} failed, '
+               f'{stats.not_written} not written in {stats.seconds} s')
+
+
+@click.command('reparse-archive')
+@click.option('--archive-dir', default=archive.ARCHIVE_DIR,
+              type=click.Path(file_okay=False),
+              help='Archive of the fetched pages, ARCHIVE_DIR by default.')
+@click.option('--parse-workers', type=int,
+              default=pipeline.PIPELINE_PARSE_WORKERS, show_default=True,
+              help='Processes parsing the segments, 0 is one per CPU.')
+@click.option('--batch-size', type=int,
+              default=pipeline.PIPELINE_BATCH_SIZE, show_default=True,
+              help='Records written per transaction.')
+def reparse_archive(archive_dir: str,
+                    parse_workers: int,
+                    batch_size: int,
+                    ) -> None:
+    """Parse the archived pages again and update their checks."""
+    if not archive_dir:
+        raise click.UsageError('Set ARCHIVE_DIR or pass --archive-dir')
+    stats = reparse.reparse_archive(os.getenv('DATABASE_URL', ''),
+                                    archive_dir=archive_dir,
+                                    parse_workers=parse_workers,
+                                    batch_size=batch_size)
+    click.echo(f'Parsed {stats.records} records of {stats.segments} '
+               f'segments, updated {stats.updated_checks} checks in '
+               f'{stats.seconds} s')
+
+
+def _maintain_partitions(connection: connection, keep_days: int) -> None:
+    """Drop expired partitions and create those for the next months."""
+    for name in retention.drop_expired_partitions(connection, keep_days):
+        click.echo(f'Dropped partition {name}')
+
+    month = datetime.date.today().replace(day=1)
+    for _ in range(3):
+        retention.create_checks_partition(connection, month)
+        month = retention.next_month(month)
+    connection.commit()
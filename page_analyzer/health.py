@@ -0,0 +1,88 @@
+"""Liveness and readiness reports for the load balancer probes.
+
+The probes only read counters kept by the application and, at most, borrow
+an idle pooled DB connection: they never open a connection or wait for one.
+"""
+from __future__ import annotations
+
+import os
+import time
+import typing as t
+
+from page_analyzer import webutils
+from page_analyzer.url_db import db_operations
+
+READY_MAX_DB_WAITING = int(os.getenv('READY_MAX_DB_WAITING', '4'))
+READY_MAX_IN_FLIGHT_CHECKS = int(os.getenv('READY_MAX_IN_FLIGHT_CHECKS',
+                                           '32'))
+READY_MAX_QUEUE_DEPTH = int(os.getenv('READY_MAX_QUEUE_DEPTH', '8'))
+READY_DB_ERROR_SECONDS = float(os.getenv('READY_DB_ERROR_SECONDS', '10'))
+
+_started = time.monotonic()
+_worker: t.Any = None
+
+
+def register_worker(worker: t.Any) -> None:
+    """Remember the gunicorn worker of the process to report its queue."""
+    global _worker
+    _worker = worker
+
+
+def get_queue_depth() -> int | None:
+    """Return the number of accepted requests waiting for a free thread
+    of a gthread worker, None for other workers."""
+    thread_pool = getattr(_worker, 'tpool', None)
+    if thread_pool is None:
+        return None
+    # the executor keeps the calls waiting for a thread in this queue
+    work_queue = thread_pool._work_queue
+    return int(work_queue.qsize())
+
+
+def check_liveness() -> dict[str, t.Any]:
+    """Return the liveness report, the process answers so it is alive."""
+    return {'status': 'ok',
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.monotonic() - _started, 1)}
+
+
+def check_readiness(db_url: str) -> tuple[bool, dict[str, t.Any]]:
+    """Return whether the process should get traffic and the report."""
+    db_pools = db_operations.get_pool_stats()
+    report: dict[str, t.Any] = {
+        'db_reachable': db_operations.ping_db(db_url),
+        'seconds_since_db_error': db_operations.get_seconds_since_db_error(
+            db_url),
+        'db_pools': db_pools,
+        'in_flight_checks': webutils.get_in_flight_requests(),
+        'queue_depth': get_queue_depth(),
+    }
+    problems = _find_problems(report, db_pools)
+    report['status'] = 'unavailable' if problems else 'ok'
+    report['problems'] = problems
+    return not problems, report
+
+
+def _find_problems(report: dict[str, t.Any],
+                   db_pools: dict[str, dict[str, float]],
+                   ) -> list[str]:
+    problems = []
+    if not _is_db_reachable(report):
+        problems.append('database is unreachable')
+    if any(stats['waiting'] > READY_MAX_DB_WAITING
+           for stats in db_pools.values()):
+        problems.append('DB connection pool is saturated')
+    if report['in_flight_checks'] > READY_MAX_IN_FLIGHT_CHECKS:
+        problems.append('too many checks in flight')
+    if (report['queue_depth'] or 0) > READY_MAX_QUEUE_DEPTH:
+        problems.append('request queue is too long')
+    return problems
+
+
+def _is_db_reachable(report: dict[str, t.Any]) -> bool:
+    """Trust the ping if a connection was idle, otherwise the latest
+    failed connection attempt."""
+    if report['db_reachable'] is not None:
+        return bool(report['db_reachable'])
+    db_error_age = report['seconds_since_db_error']
+    return db_error_age is None or db_error_age >= READY_DB_ERROR_SECONDS
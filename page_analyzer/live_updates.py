@@ -0,0 +1,114 @@
+"""Server-Sent Events of the checks of a URL for its open pages.
+
+The page of a URL opens /urls/<id>/events with the id of its newest check.
+The stream sends the checks created after it, then waits for the change
+feed to announce a check of the URL and sends the new ones, each as a
+`check` event whose id is the check id. A stream lasts
+CHANGE_FEED_STREAM_SECONDS: the browser reconnects with the id of the last
+event it got, so nothing is missed while it does, and a stream blocks one
+worker thread only that long. At most CHANGE_FEED_MAX_STREAMS streams are
+open per worker. A database error ends the stream, the browser reconnects.
+"""
+from __future__ import annotations
+
+import json
+import os
+import queue
+import threading
+import time
+import typing as t
+
+from page_analyzer import url_db
+from page_analyzer.url_db import change_feed
+
+if t.TYPE_CHECKING:
+    from page_analyzer.url_db import rows
+
+CHANGE_FEED_STREAM_SECONDS = float(
+    os.getenv('CHANGE_FEED_STREAM_SECONDS', '60'))
+CHANGE_FEED_MAX_STREAMS = int(os.getenv('CHANGE_FEED_MAX_STREAMS', '4'))
+
+KEEPALIVE_SECONDS = 15.0
+RETRY_MILLISECONDS = 3000
+
+_streams = threading.BoundedSemaphore(CHANGE_FEED_MAX_STREAMS)
+
+
+def acquire_stream() -> bool:
+    """Take a stream slot of this worker, return False if none is free."""
+    return _streams.acquire(blocking=False)
+
+
+def release_stream() -> None:
+    _streams.release()
+
+
+def stream_checks(db_url: str, url_id: int, after: int) -> t.Iterator[str]:
+    """Yield the events of the checks of the URL newer than `after`."""
+    events: queue.Queue[change_feed.Event] = queue.Queue()
+    put_check_event = _get_check_handler(url_id, events)
+    change_feed.add_handler(put_check_event)
+    try:
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'
+        deadline = time.monotonic() + CHANGE_FEED_STREAM_SECONDS
+        while True:
+            for check in _read_checks(db_url, url_id, after):
+                after = check.id
+                yield format_check(check)
+            if not (yield from _keep_alive_until_event(events, deadline)):
+                return
+    finally:
+        change_feed.remove_handler(put_check_event)
+
+
+def format_check(check: rows.URLCheck) -> str:
+    """Return the `check` event of a rows.URLCheck."""
+    data = check._asdict() | {'created_at': check.created_at.date().isoformat()}
+    return (f'event: check\nid: {check.id}\n'
+            f'data: {json.dumps(data, ensure_ascii=False)}\n\n')
+
+
+def _get_check_handler(url_id: int,
+                       events: queue.Queue[change_feed.Event],
+                       ) -> change_feed.Handler:
+    """Return a change feed handler queueing the checks of the URL."""
+    def put_check_event(event: change_feed.Event) -> None:
+        if event['table'] == 'url_checks' and event['url_id'] == url_id:
+            events.put(event)
+
+    return put_check_event
+
+
+def _read_checks(db_url: str,
+                 url_id: int,
+                 after: int,
+                 ) -> list[rows.URLCheck]:
+    """Return the checks of the URL newer than `after`, oldest first."""
+    # from the primary, a replica may not have the announced check yet
+    connection = url_db.open_read_connection(db_url, True)
+    try:
+        checks: list[rows.URLCheck]
+        checks = url_db.get_new_url_checks(  # type: ignore
+            connection, url_id, after)
+    finally:
+        url_db.close_connection(connection)
+    return checks
+
+
+def _keep_alive_until_event(events: queue.Queue[change_feed.Event],
+                            deadline: float,
+                            ) -> t.Generator[str, None, bool]:
+    """Yield keepalive comments until an event arrives and drop the ones
+    queued after it, return False if the stream is over first."""
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        try:
+            events.get(timeout=min(remaining, KEEPALIVE_SECONDS))
+        except queue.Empty:
+            yield ': keepalive\n\n'
+            continue
+        while not events.empty():
+            events.get_nowait()
+        return True
@@ -0,0 +1,155 @@
+"""Logging setup: records are queued by the request threads and written by
+a background listener, so formatting and I/O stay off the request path."""
+from __future__ import annotations
+
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+import os
+import queue
+import random
+import typing as t
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+# e.g. 'page_analyzer.url_db=0.1,page_analyzer.webutils=0.5'
+LOG_SAMPLING = os.getenv('LOG_SAMPLING', '')
+
+TEXT_FORMAT = ('[%(asctime)s] [%(levelname)s] [%(request_id)s] '
+               '[%(module)s.%(funcName)s] %(message)s')
+TEXT_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+request_id: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    'request_id', default=None)
+
+_listener: QueueListener | None = None
+_queue_handler: QueueHandler | None = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the id of the current request to the records."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a share of the records below WARNING of the given loggers.
+
+    The rate of the closest configured ancestor logger applies.
+    """
+
+    def __init__(self, rates: dict[str, float]) -> None:
+        super().__init__()
+        self.rates = rates
+        self._resolved: dict[str, float] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._get_rate(record.name)
+        return rate >= 1 or random.random() < rate
+
+    def _get_rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            parts = name.split('.')
+            for length in range(len(parts), 0, -1):
+                prefix = '.'.join(parts[:length])
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+            self._resolved[name] = rate
+        return rate
+
+
+class JSONFormatter(logging.Formatter):
+    """Format a record as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc).isoformat(
+                    timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'function': f'{record.module}.{record.funcName}',
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
+    """Queue records as they are, the listener thread formats them.
+
+    The stock handler formats the message in the calling thread to make
+    the record picklable, which an in-process queue does not need.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def parse_sampling(sampling: str) -> dict[str, float]:
+    """Parse `logger=rate,...` into a dict of sampling rates."""
+    rates = {}
+    for item in filter(None, sampling.split(',')):
+        name, _, rate = item.partition('=')
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+def setup_logging(level: str = LOG_LEVEL,
+                  log_format: str = LOG_FORMAT,
+                  sampling: str = LOG_SAMPLING,
+                  stream: t.TextIO | None = None,
+                  ) -> QueueListener:
+    """Route the root logger through a queue to a background listener.
+
+    Calling it again, e.g. in a forked worker, replaces the previous setup.
+    """
+    global _listener, _queue_handler
+    stop_logging()
+
+    output = logging.StreamHandler(stream)
+    if log_format == 'json':
+        output.setFormatter(JSONFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT, TEXT_DATE_FORMAT))
+
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    _queue_handler = LazyQueueHandler(log_queue)
+    if sampling:
+        _queue_handler.addFilter(SamplingFilter(parse_sampling(sampling)))
+    _queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_queue_handler)
+
+    _listener = QueueListener(log_queue, output)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Write out the queued records and remove the queue handler."""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
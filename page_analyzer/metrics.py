@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import functools
+import os
+import time
+import typing as t
+
+import prometheus_client
+from prometheus_client import multiprocess
+
+F = t.TypeVar('F', bound=t.Callable[..., t.Any])
+
+# Values written by the gunicorn workers are aggregated through the files
+# of this directory, see gunicorn.conf.py.
+MULTIPROCESS_DIR_VARIABLE = 'PROMETHEUS_MULTIPROC_DIR'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1_000, 10_000, 50_000, 100_000, 500_000,
+                1_000_000, 5_000_000)
+
+REQUEST_LATENCY = prometheus_client.Histogram(
+    'page_analyzer_request_duration_seconds',
+    'Latency of HTTP requests by route.',
+    ['method', 'route', 'status'],
+    buckets=LATENCY_BUCKETS)
+DB_OPERATION_LATENCY = prometheus_client.Histogram(
+    'page_analyzer_db_operation_duration_seconds',
+    'Latency of url_db operations.',
+    ['operation'],
+    buckets=LATENCY_BUCKETS)
+DB_OPERATION_ERRORS = prometheus_client.Counter(
+    'page_analyzer_db_operation_errors_total',
+    'Failed url_db operations.',
+    ['operation'])
+FETCH_LATENCY = prometheus_client.Histogram(
+    'page_analyzer_fetch_duration_seconds',
+    'Latency of requests to the checked sites by response status.',
+    ['status'],
+    buckets=LATENCY_BUCKETS)
+FETCH_SIZE = prometheus_client.Histogram(
+    'page_analyzer_fetch_response_bytes',
+    'Size of the downloaded site responses.',
+    buckets=SIZE_BUCKETS)
+PARSE_LATENCY = prometheus_client.Histogram(
+    'page_analyzer_parse_duration_seconds',
+    'Time spent parsing the site responses.',
+    buckets=LATENCY_BUCKETS)
+
+
+def track_db_operation(function: F) -> F:
+    """Record the latency and failures of a url_db operation."""
+    operation = function.__name__
+
+    @functools.wraps(function)
+    def wrapper(*args: t.Any, **kwargs: t.Any) -> t.Any:
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            DB_OPERATION_ERRORS.labels(operation).inc()
+            raise
+        finally:
+            DB_OPERATION_LATENCY.labels(operation).observe(
+                time.perf_counter() - started)
+
+    return t.cast(F, wrapper)
+
+
+def observe_request(method: str,
+                    route: str,
+                    status: int,
+                    duration: float,
+                    ) -> None:
+    """Record the latency of a handled HTTP request."""
+    REQUEST_LATENCY.labels(method, route, str(status)).observe(duration)
+
+
+def observe_fetch(status: int | str,
+                  duration: float,
+                  size: int | None = None,
+                  ) -> None:
+    """Record the latency, status and size of a request to a site."""
+    FETCH_LATENCY.labels(str(status)).observe(duration)
+    if size is not None:
+        FETCH_SIZE.observe(size)
+
+
+def observe_parse(duration: float) -> None:
+    """Record the time spent parsing a site response."""
+    PARSE_LATENCY.observe(duration)
+
+
+def render() -> tuple[bytes, str]:
+    """Return the metrics in the Prometheus text format and its type.
+
+    In multiprocess mode the values of all workers are aggregated.
+    """
+    registry: prometheus_client.CollectorRegistry = prometheus_client.REGISTRY
+    if os.getenv(MULTIPROCESS_DIR_VARIABLE):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return (prometheus_client.generate_latest(registry),
+            prometheus_client.CONTENT_TYPE_LATEST)
@@ -0,0 +1,202 @@
+"""Pipelined checks of many URLs: threads fetch, processes parse.
+
+Parsing holds the GIL, so a single process parses on one core however
+many threads fetch. The fetch threads hand the raw page bytes to a pool of
+parse processes and wait for the parsed data, at most PIPELINE_QUEUE_SIZE
+checks are in flight: when parsing falls behind, fetching pauses instead
+of piling pages up in memory. The results are written in transactions of
+PIPELINE_BATCH_SIZE checks.
+"""
+from __future__ import annotations
+
+import concurrent.futures
+import datetime
+import logging
+import multiprocessing
+import os
+import time
+import types
+import typing as t
+
+from page_analyzer import archive
+from page_analyzer import redirects
+from page_analyzer import url_db
+from page_analyzer import webutils
+
+PIPELINE_FETCH_WORKERS = int(os.getenv('PIPELINE_FETCH_WORKERS', '16'))
+PIPELINE_PARSE_WORKERS = int(os.getenv('PIPELINE_PARSE_WORKERS', '0'))
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '64'))
+PIPELINE_BATCH_SIZE = int(os.getenv('PIPELINE_BATCH_SIZE', '100'))
+
+BATCH_ERROR_MESSAGE = 'A batch of %s checks was not written'
+CHECK_ERROR_MESSAGE = 'The check of %s failed'
+
+logger = logging.getLogger(__name__)
+
+
+class Page(t.NamedTuple):
+    """Fetched page sent to a parse process."""
+    url_id: int
+    content: bytes
+    encoding: str | None
+    status_code: int
+    url: str
+    redirects: redirects.Chain
+    archive_key: bytes | None = None
+
+
+class CheckResult(t.NamedTuple):
+    url_id: int
+    # the parsed data or None if the site failed
+    data: dict[str, t.Any] | None
+    # the error status code of a failed site, None without a response
+    status_code: int | None = None
+
+
+class PipelineStats(t.NamedTuple):
+    checked: int
+    failed: int
+    not_written: int
+    seconds: float
+
+
+def parse_page(page: Page) -> CheckResult:
+    """Decode and parse the page, runs in a parse process."""
+    text = page.content.decode(page.encoding or 'utf-8', errors='replace')
+    response = types.SimpleNamespace(text=text,
+                                     status_code=page.status_code,
+                                     url=page.url)
+    data = webutils.parse_html_response(response)  # type: ignore
+    if page.redirects:
+        data.update(redirects=page.redirects, final_url=page.url)
+    if page.archive_key is not None:
+        data['archive_key'] = page.archive_key
+    return CheckResult(page.url_id, data)
+
+
+def check_urls(db_url: str,
+               urls: t.Iterable[tuple[int, str]],
+               fetch_workers: int = PIPELINE_FETCH_WORKERS,
+               parse_workers: int = PIPELINE_PARSE_WORKERS,
+               queue_size: int = PIPELINE_QUEUE_SIZE,
+               batch_size: int = PIPELINE_BATCH_SIZE,
+               ) -> PipelineStats:
+    """Check the (id, name) URLs, return the pipeline counters.
+
+    `parse_workers` 0 starts a parse process per CPU. The finished checks
+    are written even if the run is interrupted.
+    """
+    started = time.perf_counter()
+    writer = _BatchWriter(db_url, batch_size)
+    # spawned processes do not inherit the locks of the fetch threads
+    context = multiprocessing.get_context('spawn')
+    try:
+        with concurrent.futures.ThreadPoolExecutor(fetch_workers) as fetchers, \
+                concurrent.futures.ProcessPoolExecutor(
+                    parse_workers or None, mp_context=context) as parsers:
+            in_flight: set[concurrent.futures.Future[CheckResult]] = set()
+            for url_id, url in urls:
+                if len(in_flight) >= queue_size:
+                    in_flight = _write_completed(in_flight, writer)
+                in_flight.add(
+                    fetchers.submit(_check_url, parsers, url_id, url))
+            while in_flight:
+                in_flight = _write_completed(in_flight, writer)
+    finally:
+        writer.flush()
+
+    return PipelineStats(checked=writer.checked,
+                         failed=writer.failed,
+                         not_written=writer.not_written,
+                         seconds=round(time.perf_counter() - started, 3))
+
+
+def _check_url(parsers: concurrent.futures.Executor,
+               url_id: int,
+               url: str,
+               ) -> CheckResult:
+    """Fetch the page and wait until a parse process has parsed it. Any
+    other error than a failed request fails the check without a status
+    code, the other checks go on."""
+    import requests
+
+    try:
+        response = webutils.get_site_response(url)
+        page = Page(url_id=url_id,
+                    content=response.content,
+                    encoding=response.encoding,
+                    status_code=response.status_code,
+                    url=response.url,
+                    redirects=redirects.get_redirect_chain(response),
+                    archive_key=archive.store_response(response))
+        return parsers.submit(parse_page, page).result()
+    except requests.RequestException as error:
+        status_code = getattr(error.response, 'status_code', None)
+        return CheckResult(url_id, None, status_code)
+    except Exception:
+        logger.exception(CHECK_ERROR_MESSAGE, url)
+        return CheckResult(url_id, None)
+
+
+def _write_completed(in_flight: set[concurrent.futures.Future[CheckResult]],
+                     writer: _BatchWriter,
+                     ) -> set[concurrent.futures.Future[CheckResult]]:
+    """Wait for at least one check, hand the finished ones to the writer,
+    return the checks still in flight."""
+    done, pending = concurrent.futures.wait(
+        in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+    for future in done:
+        writer.add(future.result())
+    return pending
+
+
+class _BatchWriter:
+    """Write the check results in transactions of `batch_size`."""
+
+    def __init__(self, db_url: str, batch_size: int) -> None:
+        self.db_url = db_url
+        self.batch_size = batch_size
+        self.checked = 0
+        self.failed = 0
+        self.not_written = 0
+        self._batch: list[CheckResult] = []
+
+    def add(self, result: CheckResult) -> None:
+        self._batch.append(result)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        try:
+            self._write(batch)
+        # any error, the other batches are still written
+        except Exception:
+            logger.exception(BATCH_ERROR_MESSAGE, len(batch))
+            self.not_written += len(batch)
+            return
+        self.failed += sum(result.data is None for result in batch)
+        self.checked += sum(result.data is not None for result in batch)
+
+    def _write(self, batch: list[CheckResult]) -> None:
+        """Write the batch in one transaction, the checks with one
+        multi-row insert."""
+        now = datetime.datetime.now()
+        checks = [(result.url_id, result.data, now)
+                  for result in batch if result.data is not None]
+        connection = url_db.open_connection(self.db_url)
+        try:
+            if checks:
+                url_db.create_checks(connection, checks)
+            for result in batch:
+                if result.data is None:
+                    url_db.record_failed_check(connection, result.url_id,
+                                               result.status_code)
+        # any error, closing the connection would commit the partial batch
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            url_db.close_connection(connection)
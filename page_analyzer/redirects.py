@@ -0,0 +1,92 @@
+"""Redirect chains of the checked sites and a cache of permanent redirects.
+
+Normalized URLs keep only the scheme and host, so many sites answer with
+one or two redirects (http to https, bare host to www) before the content.
+The targets of permanent redirects are cached for REDIRECT_CACHE_TTL, the
+checks in between request them directly and the full chain is followed
+again once the entry expires.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import typing as t
+
+from page_analyzer import cache
+
+if t.TYPE_CHECKING:
+    import requests
+
+REDIRECTS_CACHE = 'redirects'
+REDIRECT_CACHE_SIZE = int(os.getenv('REDIRECT_CACHE_SIZE', '10000'))
+REDIRECT_CACHE_TTL = float(os.getenv('REDIRECT_CACHE_TTL', '86400'))
+PERMANENT_REDIRECT_CODES = (301, 308)
+
+CACHE_HIT_MESSAGE = 'The redirect target was obtained from the cache'
+
+logger = logging.getLogger(__name__)
+
+# status code and URL of every response that redirected
+Chain = list[tuple[int, str]]
+
+
+def _get_redirects_cache() -> cache.CacheBackend:
+    return cache.get_cache(REDIRECTS_CACHE,
+                           maxsize=REDIRECT_CACHE_SIZE,
+                           ttl=REDIRECT_CACHE_TTL or None)
+
+
+def get_redirect_chain(response: requests.Response) -> Chain:
+    """Return the redirects followed before the response."""
+    return [(hop.status_code, hop.url)
+            for hop in getattr(response, 'history', [])]
+
+
+def get_cached_redirect(url: str) -> tuple[str, Chain] | None:
+    """Return the target of the permanent redirects of the URL and their
+    chain, None if they are not cached."""
+    redirect: tuple[str, Chain] | None = _get_redirects_cache().get(url)
+    if redirect is not None:
+        logger.info(CACHE_HIT_MESSAGE)
+    return redirect
+
+
+def cache_redirect(url: str, response: requests.Response) -> None:
+    """Remember where the leading permanent redirects of the response
+    lead to, forget the URL if it does not redirect permanently."""
+    chain = get_redirect_chain(response)
+    permanent: Chain = []
+    for hop in chain:
+        if hop[0] not in PERMANENT_REDIRECT_CODES:
+            break
+        permanent.append(hop)
+
+    if not permanent:
+        invalidate_redirect(url)
+        return
+    urls = [hop_url for _, hop_url in chain[1:]] + [response.url]
+    _get_redirects_cache().set(url, (urls[len(permanent) - 1], permanent))
+
+
+def restore_chain(response: requests.Response, chain: Chain) -> None:
+    """Prepend the redirects skipped thanks to the cache to the history of
+    the response of their target."""
+    import requests
+
+    hops = []
+    for status_code, url in chain:
+        hop = requests.Response()
+        hop.status_code = status_code
+        hop.url = url
+        hops.append(hop)
+    response.history = [*hops, *response.history]
+
+
+def invalidate_redirect(url: str) -> None:
+    """Forget the cached redirect target of the URL."""
+    _get_redirects_cache().delete(url)
+
+
+def get_redirect_cache_stats() -> dict[str, int]:
+    """Return the redirect cache counters."""
+    return _get_redirects_cache().stats()
@@ -0,0 +1,97 @@
+"""Parse the archived responses again and update their checks.
+
+No site is fetched: a pool of processes reads the archive segments, each
+process a whole segment at a time, and parses every record with the
+current parse_html_response. The checks referencing the records are
+pointed to the new contents in transactions of PIPELINE_BATCH_SIZE
+records while the processes parse the next segments.
+"""
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import multiprocessing
+import os
+import pathlib
+import time
+import types
+import typing as t
+
+from page_analyzer import archive
+from page_analyzer import pipeline
+from page_analyzer import url_db
+from page_analyzer import webutils
+
+# the archive key and the parsed data of a record
+Parsed = tuple[bytes, dict[str, t.Any]]
+
+
+class ReparseStats(t.NamedTuple):
+    segments: int
+    records: int
+    updated_checks: int
+    seconds: float
+
+
+def parse_segment(path: pathlib.Path) -> list[Parsed]:
+    """Parse every record of the segment, runs in a parse process."""
+    results = []
+    for record in archive.read_segment(path):
+        text = record.body.decode(record.encoding or 'utf-8',
+                                  errors='replace')
+        response = types.SimpleNamespace(text=text,
+                                         status_code=record.status_code,
+                                         url=record.url)
+        data = webutils.parse_html_response(response)  # type: ignore
+        results.append((record.key, data))
+    return results
+
+
+def reparse_archive(db_url: str,
+                    archive_dir: str = archive.ARCHIVE_DIR,
+                    parse_workers: int = pipeline.PIPELINE_PARSE_WORKERS,
+                    batch_size: int = pipeline.PIPELINE_BATCH_SIZE,
+                    ) -> ReparseStats:
+    """Parse the archive again, return the counters.
+
+    `parse_workers` 0 starts a parse process per CPU.
+    """
+    started = time.perf_counter()
+    segments = archive.list_segments(archive_dir)
+    records = updated = 0
+    workers = parse_workers or os.cpu_count() or 1
+    context = multiprocessing.get_context('spawn')
+    connection = url_db.open_connection(db_url)
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+                workers, mp_context=context) as parsers:
+            for results in _parse_segments(parsers, segments, workers):
+                records += len(results)
+                for start in range(0, len(results), batch_size):
+                    batch = results[start:start + batch_size]
+                    updated += url_db.update_archived_checks(connection,
+                                                             batch)
+                    connection.commit()
+    finally:
+        url_db.close_connection(connection)
+
+    return ReparseStats(segments=len(segments),
+                        records=records,
+                        updated_checks=updated,
+                        seconds=round(time.perf_counter() - started, 3))
+
+
+def _parse_segments(parsers: concurrent.futures.Executor,
+                    segments: list[pathlib.Path],
+                    workers: int,
+                    ) -> t.Iterator[list[Parsed]]:
+    """Yield the parsed records of every segment in order, with at most
+    two segments per process parsed or waiting to be written."""
+    in_flight: collections.deque[concurrent.futures.Future[list[Parsed]]]
+    in_flight = collections.deque()
+    for path in segments:
+        if len(in_flight) >= 2 * workers:
+            yield in_flight.popleft().result()
+        in_flight.append(parsers.submit(parse_segment, path))
+    while in_flight:
+        yield in_flight.popleft().result()
@@ -0,0 +1,177 @@
+"""Single-pass extraction of the SEO fields of a page.
+
+The parser reacts to the start and end tags it is interested in while the
+stdlib tokenizer reads the page once, no tree is built or walked. The text
+of an unclosed title or h1 ends at the next block-level start tag, at
+</body> or at the end of the page, like the basic parse of webutils reads
+it.
+"""
+from __future__ import annotations
+
+import html.parser
+import typing as t
+import urllib.parse
+
+ROBOTS_FLAGS = {'noindex': 1,
+                'nofollow': 2,
+                'noarchive': 4,
+                'nosnippet': 8,
+                'noimageindex': 16,
+                'none': 1 | 2}
+LINK_SCHEMES = ('http', 'https')
+MAX_TEXT_LENGTH = 255
+# the sizes of the check_contents columns, see migrations/003
+MAX_LANG_LENGTH = 35
+MAX_HEADING_COUNT = 32767
+# start tags that end the text of an unclosed title or h1
+BLOCK_TAGS = frozenset((
+    'address', 'article', 'aside', 'blockquote', 'body', 'dd', 'details',
+    'dialog', 'div', 'dl', 'dt', 'fieldset', 'figcaption', 'figure',
+    'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hgroup',
+    'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre', 'section', 'table', 'ul',
+))
+
+Attributes = dict[str, str]
+
+
+class SEOParser(html.parser.HTMLParser):
+    """Collect the SEO fields of a page fed to the parser."""
+
+    def __init__(self, base_url: str = '') -> None:
+        super().__init__()
+        self.base_url = base_url
+        self.host = _get_site_host(base_url)
+        self.fields: dict[str, t.Any] = {
+            'h1': None, 'title': None, 'description': None, 'lang': None,
+            'canonical': None, 'robots': None, 'h1_count': 0, 'h2_count': 0,
+            'internal_links': 0, 'external_links': 0, 'images': 0,
+            'images_with_alt': 0, 'open_graph': None,
+        }
+        self._text_field: str | None = None
+        self._text: list[str] = []
+        self._start_handlers: dict[str, t.Callable[[Attributes], None]] = {
+            'html': self._start_html,
+            'title': self._start_title,
+            'h1': self._start_h1,
+            'h2': self._start_h2,
+            'meta': self._start_meta,
+            'link': self._start_link,
+            'a': self._start_a,
+            'img': self._start_img,
+        }
+
+    def handle_starttag(self,
+                        tag: str,
+                        attrs: list[tuple[str, str | None]],
+                        ) -> None:
+        if tag in BLOCK_TAGS:
+            self._end_text()
+        handler = self._start_handlers.get(tag)
+        if handler is not None:
+            handler({name: value or '' for name, value in attrs})
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in (self._text_field, 'body'):
+            self._end_text()
+
+    def handle_data(self, data: str) -> None:
+        if self._text_field is not None:
+            self._text.append(data)
+
+    def close(self) -> None:
+        super().close()
+        self._end_text()
+
+    def _end_text(self) -> None:
+        """Store the text collected for the field, if any."""
+        if self._text_field is not None:
+            self.fields[self._text_field] = clean_text(''.join(self._text))
+            self._text_field = None
+
+    def _start_text(self, field: str) -> None:
+        """Collect the text of the first tag of the field."""
+        if self.fields[field] is None and self._text_field is None:
+            self._text_field = field
+            self._text = []
+
+    def _start_html(self, attrs: Attributes) -> None:
+        self.fields['lang'] = attrs.get('lang', '')[:MAX_LANG_LENGTH] or None
+
+    def _start_title(self, attrs: Attributes) -> None:
+        self._start_text('title')
+
+    def _start_h1(self, attrs: Attributes) -> None:
+        self._count_heading('h1_count')
+        self._start_text('h1')
+
+    def _start_h2(self, attrs: Attributes) -> None:
+        self._count_heading('h2_count')
+
+    def _count_heading(self, field: str) -> None:
+        self.fields[field] = min(self.fields[field] + 1, MAX_HEADING_COUNT)
+
+    def _start_meta(self, attrs: Attributes) -> None:
+        name = attrs.get('name', '').lower()
+        content = attrs.get('content', '')
+        if name == 'description' and self.fields['description'] is None:
+            self.fields['description'] = content
+        elif name == 'robots':
+            self.fields['robots'] = parse_robots(content)
+        elif attrs.get('property', '').startswith('og:'):
+            open_graph = self.fields['open_graph'] or {}
+            open_graph.setdefault(attrs['property'], content)
+            self.fields['open_graph'] = open_graph
+
+    def _start_link(self, attrs: Attributes) -> None:
+        relations = attrs.get('rel', '').lower().split()
+        if 'canonical' in relations and attrs.get('href'):
+            self.fields['canonical'] = urllib.parse.urljoin(self.base_url,
+                                                            attrs['href'])
+
+    def _start_a(self, attrs: Attributes) -> None:
+        href = attrs.get('href')
+        if href is None:
+            return
+        link = urllib.parse.urlsplit(urllib.parse.urljoin(self.base_url,
+                                                          href))
+        if link.scheme and link.scheme not in LINK_SCHEMES:
+            return
+        if _get_site_host(link.netloc) in ('', self.host):
+            self.fields['internal_links'] += 1
+        else:
+            self.fields['external_links'] += 1
+
+    def _start_img(self, attrs: Attributes) -> None:
+        self.fields['images'] += 1
+        if attrs.get('alt', '').strip():
+            self.fields['images_with_alt'] += 1
+
+
+def parse_seo(content: str, base_url: str = '') -> dict[str, t.Any]:
+    """Return the SEO fields of the page, relative links are resolved
+    against `base_url`."""
+    parser = SEOParser(base_url)
+    parser.feed(content)
+    parser.close()
+    return parser.fields
+
+
+def clean_text(text: str) -> str:
+    """Return the text with collapsed whitespace, cut to the column size."""
+    return ' '.join(text.split())[:MAX_TEXT_LENGTH]
+
+
+def parse_robots(content: str) -> int:
+    """Return the bitmask of ROBOTS_FLAGS set by a robots meta tag."""
+    robots = 0
+    for directive in content.lower().replace(' ', '').split(','):
+        robots |= ROBOTS_FLAGS.get(directive, 0)
+    return robots
+
+
+def _get_site_host(url: str) -> str:
+    """Return the host of a URL or netloc without 'www.' and the port."""
+    if '//' in url:
+        url = urllib.parse.urlsplit(url).netloc
+    host = url.rpartition('@')[2].partition(':')[0].lower()
+    return host.removeprefix('www.')
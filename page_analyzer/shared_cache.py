@@ -0,0 +1,279 @@
+"""Cache backend shared by the worker processes of one host.
+
+With CACHE_BACKEND=shared every named cache is a part of one SQLite
+database in CACHE_DIR, which gunicorn.conf.py puts in shared memory
+(/dev/shm) when it is available. All the workers then see the entries and
+the invalidations of the others, and the size limit of a cache is the same
+for the whole host instead of being multiplied by the workers. Entries are
+pickled, the least recently used are evicted once a cache holds more than
+its maxsize, and they expire after the TTL of the cache. A read is a plain
+SELECT that does not wait for the writers: the access time of an entry is
+updated at most once per ACCESS_INTERVAL seconds, so the evicted entries
+are the least recently used ones give or take that interval.
+
+Without CACHE_DIR every process uses a temporary directory of its own. The
+cache is only an accelerator: an SQLite error is logged and counts as a
+miss.
+"""
+from __future__ import annotations
+
+import collections
+import contextlib
+import logging
+import os
+import pathlib
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import typing as t
+
+CACHE_DIR = os.getenv('CACHE_DIR', '')
+
+DATABASE_NAME = 'cache.sqlite'
+BUSY_TIMEOUT = 5.0
+ACCESS_INTERVAL = 1.0
+
+CREATE_ENTRIES = (
+    '''
+    CREATE TABLE IF NOT EXISTS entries (
+        cache TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value BLOB NOT NULL,
+        expires_at REAL,
+        accessed INTEGER NOT NULL,
+        PRIMARY KEY (cache, key)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS entries_accessed_idx
+    ON entries (cache, accessed)
+    ''',
+    # counted by triggers, counting the entries on every set is slow
+    '''
+    CREATE TABLE IF NOT EXISTS sizes (
+        cache TEXT PRIMARY KEY,
+        size INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS entries_insert_size
+    AFTER INSERT ON entries BEGIN
+        INSERT INTO sizes VALUES (new.cache, 1)
+        ON CONFLICT (cache) DO UPDATE SET size = size + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS entries_delete_size
+    AFTER DELETE ON entries BEGIN
+        UPDATE sizes SET size = size - 1 WHERE cache = old.cache;
+    END
+    ''',
+)
+
+GET_QUERY = '''
+SELECT value, expires_at, accessed FROM entries WHERE cache = ? AND key = ?
+'''
+TOUCH_QUERY = '''
+UPDATE entries SET accessed = ? WHERE cache = ? AND key = ?
+'''
+EXPIRE_QUERY = '''
+DELETE FROM entries WHERE cache = ? AND key = ? AND expires_at <= ?
+'''
+SET_QUERY = '''
+INSERT INTO entries (cache, key, value, expires_at, accessed)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (cache, key) DO UPDATE
+SET value = excluded.value,
+    expires_at = excluded.expires_at,
+    accessed = excluded.accessed
+'''
+SIZE_QUERY = 'SELECT size FROM sizes WHERE cache = ?'
+EVICT_QUERY = '''
+DELETE FROM entries
+WHERE cache = ? AND key IN (
+    SELECT key FROM entries WHERE cache = ? ORDER BY accessed LIMIT ?
+)
+'''
+DELETE_QUERY = 'DELETE FROM entries WHERE cache = ? AND key = ?'
+CLEAR_QUERY = 'DELETE FROM entries WHERE cache = ?'
+
+CACHE_ERROR_MESSAGE = 'The shared cache %s failed'
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_default_dir: str | None = None
+_default_dir_lock = threading.Lock()
+
+
+class SharedCache:
+    """LRU cache with an optional TTL stored in an SQLite database.
+
+    The hit, miss and other counters are those of this process, the size
+    is the one of the shared cache.
+    """
+
+    def __init__(self,
+                 name: str,
+                 maxsize: int = 1024,
+                 ttl: float | None = None,
+                 cache_dir: str | None = None,
+                 ) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = pathlib.Path(cache_dir or CACHE_DIR or _get_default_dir(),
+                                 DATABASE_NAME)
+        self._counters: collections.Counter[str] = collections.Counter()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> t.Any | None:
+        """Return the cached value or None if it is missing or expired."""
+        try:
+            data, expired = self._read(_get_connection(self.path), key)
+        except sqlite3.Error:
+            logger.exception(CACHE_ERROR_MESSAGE, self.name)
+            data, expired = None, False
+        self._count('misses' if data is None else 'hits')
+        if expired:
+            self._count('expirations')
+        return None if data is None else pickle.loads(data)
+
+    def set(self, key: str, value: t.Any) -> None:
+        """Store the value, evicting the least recently used entries."""
+        expires_at = None
+        if self.ttl is not None:
+            expires_at = time.time() + self.ttl
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            connection = _get_connection(self.path)
+            with _transaction(connection):
+                connection.execute(SET_QUERY, (self.name, key, data,
+                                               expires_at, time.time_ns()))
+                evicted = self._evict(connection)
+        except sqlite3.Error:
+            logger.exception(CACHE_ERROR_MESSAGE, self.name)
+            return
+        self._count('sets')
+        self._count('evictions', evicted)
+
+    def delete(self, key: str) -> None:
+        """Remove the key from the cache of every process."""
+        try:
+            deleted = _get_connection(self.path).execute(
+                DELETE_QUERY, (self.name, key)).rowcount
+        except sqlite3.Error:
+            logger.exception(CACHE_ERROR_MESSAGE, self.name)
+            return
+        self._count('invalidations', deleted)
+
+    def clear(self) -> None:
+        """Remove all entries of the cache, keeping the counters."""
+        try:
+            _get_connection(self.path).execute(CLEAR_QUERY, (self.name,))
+        except sqlite3.Error:
+            logger.exception(CACHE_ERROR_MESSAGE, self.name)
+
+    def stats(self) -> dict[str, int]:
+        """Return the counters of this process and the shared size."""
+        try:
+            size = _get_size(_get_connection(self.path), self.name)
+        except sqlite3.Error:
+            logger.exception(CACHE_ERROR_MESSAGE, self.name)
+            size = 0
+        with self._lock:
+            counters = {name: self._counters[name]
+                        for name in ('hits', 'misses', 'sets', 'evictions',
+                                     'expirations', 'invalidations')}
+        return counters | {'size': size, 'maxsize': self.maxsize}
+
+    def _read(self,
+              connection: sqlite3.Connection,
+              key: str,
+              ) -> tuple[bytes | None, bool]:
+        """Return the pickled value or None and whether it expired. Only
+        an expired entry or a stale access time is written."""
+        row = connection.execute(GET_QUERY, (self.name, key)).fetchone()
+        if row is None:
+            return None, False
+        data, expires_at, accessed = row
+        now = time.time()
+        if expires_at is not None and expires_at <= now:
+            expired = connection.execute(EXPIRE_QUERY,
+                                         (self.name, key, now)).rowcount
+            return None, expired > 0
+        accessed_at = time.time_ns()
+        if accessed_at - accessed > ACCESS_INTERVAL * 1e9:
+            connection.execute(TOUCH_QUERY, (accessed_at, self.name, key))
+        return data, False
+
+    def _evict(self, connection: sqlite3.Connection) -> int:
+        size = _get_size(connection, self.name)
+        if size <= self.maxsize:
+            return 0
+        return connection.execute(
+            EVICT_QUERY, (self.name, self.name, size - self.maxsize)).rowcount
+
+    def _count(self, name: str, number: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += number
+
+
+def _get_size(connection: sqlite3.Connection, name: str) -> int:
+    row = connection.execute(SIZE_QUERY, (name,)).fetchone()
+    return row[0] if row else 0
+
+
+@contextlib.contextmanager
+def _transaction(connection: sqlite3.Connection) -> t.Iterator[None]:
+    """Hold the write lock of the database from the start, a deferred
+    transaction upgrading its lock fails instead of waiting for it."""
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+def create_shared_backend(name: str,
+                          maxsize: int,
+                          ttl: float | None,
+                          ) -> SharedCache:
+    """Cache factory of the `shared` backend."""
+    return SharedCache(name, maxsize=maxsize, ttl=ttl)
+
+
+def _get_connection(path: pathlib.Path) -> sqlite3.Connection:
+    """Return the connection of this thread to the database, a new one
+    after a fork: SQLite connections must not cross processes."""
+    connections: dict[tuple[int, pathlib.Path], sqlite3.Connection]
+    connections = _local.__dict__.setdefault('connections', {})
+    connection = connections.get((os.getpid(), path))
+    if connection is None:
+        connection = _connect(path)
+        connections[(os.getpid(), path)] = connection
+    return connection
+
+
+def _connect(path: pathlib.Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT,
+                                 isolation_level=None)
+    connection.execute('PRAGMA journal_mode = WAL')
+    # a lost entry is only a miss, nothing waits for the disk
+    connection.execute('PRAGMA synchronous = OFF')
+    for query in CREATE_ENTRIES:
+        connection.execute(query)
+    return connection
+
+
+def _get_default_dir() -> str:
+    global _default_dir
+    with _default_dir_lock:
+        if _default_dir is None:
+            _default_dir = tempfile.mkdtemp(prefix='page_analyzer_cache_')
+        return _default_dir
@@ -0,0 +1,250 @@
+"""Lightweight request tracing.
+
+A sampled request records nested spans of its stages. Finished traces are
+appended to TRACE_EXPORT_FILE as OTLP/JSON lines, the format read by the
+otlpjsonfile receiver of the OpenTelemetry collector. With SERVER_TIMING
+every request records its spans for the Server-Timing response header.
+"""
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+import typing as t
+
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+TRACE_EXPORT_FILE = os.getenv('TRACE_EXPORT_FILE', '')
+SERVER_TIMING = os.getenv('SERVER_TIMING', '').lower() in ('1', 'true')
+
+SERVICE_NAME = 'page-analyzer'
+EXPORT_ERROR_MESSAGE = 'Error when trying to export a trace'
+
+# OTLP span kinds and status codes
+INTERNAL = 1
+SERVER = 2
+CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+F = t.TypeVar('F', bound=t.Callable[..., t.Any])
+
+logger = logging.getLogger(__name__)
+
+_export_lock = threading.Lock()
+
+
+class Span:
+    """A timed stage of a trace."""
+
+    __slots__ = ('name', 'kind', 'span_id', 'parent_id', 'attributes',
+                 'start_ns', 'end_ns', 'error')
+
+    def __init__(self,
+                 name: str,
+                 kind: int = INTERNAL,
+                 parent_id: str | None = None,
+                 attributes: dict[str, t.Any] | None = None,
+                 ) -> None:
+        self.name = name
+        self.kind = kind
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.error: str | None = None
+
+    def set_attribute(self, key: str, value: t.Any) -> None:
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns or time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+
+class Trace:
+    """Spans of one request, the first one is the root."""
+
+    def __init__(self, sampled: bool) -> None:
+        self.trace_id = os.urandom(16).hex()
+        self.sampled = sampled
+        self.spans: list[Span] = []
+
+
+_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar(
+    'trace', default=None)
+_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar(
+    'span', default=None)
+
+
+def start_trace(name: str,
+                kind: int = SERVER,
+                attributes: dict[str, t.Any] | None = None,
+                ) -> Span | None:
+    """Start a trace with its root span if the request is sampled."""
+    sampled = random.random() < TRACE_SAMPLE_RATE
+    if not (sampled or SERVER_TIMING):
+        return None
+
+    trace = Trace(sampled)
+    root = Span(name, kind, attributes=attributes)
+    trace.spans.append(root)
+    _trace.set(trace)
+    _span.set(root)
+    return root
+
+
+def end_trace(error: BaseException | None = None) -> None:
+    """End the current trace and export it if it is sampled."""
+    trace = _trace.get()
+    if trace is None:
+        return
+    _trace.set(None)
+    _span.set(None)
+
+    root = trace.spans[0]
+    if error is not None:
+        root.error = repr(error)
+    root.end()
+    if trace.sampled and TRACE_EXPORT_FILE:
+        export(trace, TRACE_EXPORT_FILE)
+
+
+def get_current_span() -> Span | None:
+    return _span.get()
+
+
+def set_attribute(key: str, value: t.Any) -> None:
+    """Set the attribute on the current span if there is one."""
+    current = _span.get()
+    if current is not None:
+        current.set_attribute(key, value)
+
+
+@contextlib.contextmanager
+def span(name: str,
+         kind: int = INTERNAL,
+         **attributes: t.Any,
+         ) -> t.Iterator[Span | None]:
+    """Record the enclosed block as a child of the current span."""
+    trace = _trace.get()
+    if trace is None:
+        yield None
+        return
+
+    parent = _span.get()
+    current = Span(name, kind, parent.span_id if parent else None,
+                   attributes)
+    trace.spans.append(current)
+    token = _span.set(current)
+    try:
+        yield current
+    except BaseException as error:
+        current.error = repr(error)
+        raise
+    finally:
+        current.end()
+        _span.reset(token)
+
+
+def traced(name: str, kind: int = INTERNAL) -> t.Callable[[F], F]:
+    """Record every call of the decorated function as a span."""
+    def decorator(function: F) -> F:
+        @functools.wraps(function)
+        def wrapper(*args: t.Any, **kwargs: t.Any) -> t.Any:
+            if _trace.get() is None:
+                return function(*args, **kwargs)
+            with span(name, kind):
+                return function(*args, **kwargs)
+
+        return t.cast(F, wrapper)
+
+    return decorator
+
+
+def get_server_timing() -> str | None:
+    """Return the Server-Timing header value of the current trace.
+
+    Durations of spans with the same name are summed, `total` is the time
+    since the start of the root span.
+    """
+    trace = _trace.get()
+    if trace is None:
+        return None
+
+    durations: dict[str, float] = {}
+    for child in trace.spans[1:]:
+        durations.setdefault(child.name, 0.0)
+        durations[child.name] += child.duration_ms
+    durations['total'] = trace.spans[0].duration_ms
+    return ', '.join(f'{name};dur={duration:.2f}'
+                     for name, duration in durations.items())
+
+
+def to_otlp(trace: Trace) -> dict[str, t.Any]:
+    """Return the trace as an OTLP/JSON ExportTraceServiceRequest."""
+    return {'resourceSpans': [{
+        'resource': {'attributes': _to_otlp_attributes(
+            {'service.name': SERVICE_NAME})},
+        'scopeSpans': [{
+            'scope': {'name': __name__},
+            'spans': [_to_otlp_span(trace.trace_id, span)
+                      for span in trace.spans],
+        }],
+    }]}
+
+
+def export(trace: Trace, path: str) -> None:
+    """Append the trace to the file as one OTLP/JSON line."""
+    line = json.dumps(to_otlp(trace), default=str) + '\n'
+    try:
+        with _export_lock, open(path, 'a') as file:
+            file.write(line)
+    except OSError:
+        logger.exception(EXPORT_ERROR_MESSAGE)
+
+
+def _to_otlp_span(trace_id: str, span: Span) -> dict[str, t.Any]:
+    otlp_span = {
+        'traceId': trace_id,
+        'spanId': span.span_id,
+        'name': span.name,
+        'kind': span.kind,
+        'startTimeUnixNano': str(span.start_ns),
+        'endTimeUnixNano': str(span.end_ns or span.start_ns),
+        'attributes': _to_otlp_attributes(span.attributes),
+        'status': {'code': STATUS_OK},
+    }
+    if span.parent_id is not None:
+        otlp_span['parentSpanId'] = span.parent_id
+    if span.error is not None:
+        otlp_span['status'] = {'code': STATUS_ERROR, 'message': span.error}
+    return otlp_span
+
+
+def _to_otlp_attributes(attributes: dict[str, t.Any],
+                        ) -> list[dict[str, t.Any]]:
+    otlp_attributes = []
+    for key, value in attributes.items():
+        otlp_value: dict[str, t.Any]
+        if isinstance(value, bool):
+            otlp_value = {'boolValue': value}
+        elif isinstance(value, int):
+            otlp_value = {'intValue': str(value)}
+        elif isinstance(value, float):
+            otlp_value = {'doubleValue': value}
+        else:
+            otlp_value = {'stringValue': str(value)}
+        otlp_attributes.append({'key': key, 'value': otlp_value})
+    return otlp_attributes
@@ -6,19 +6,47 @@ from page_analyzer.url_db.db_operations import (
 from page_analyzer.url_db.url_db_operations import (
     create_url,
     create_check,
+    create_checks,
+    update_archived_checks,
+    record_failed_check,
     check_url,
     get_urls,
     get_url_checks,
+    get_new_url_checks,
     get_url,
+    get_stats,
+)
+from page_analyzer.url_db.routing import (
+    open_read_connection,
+)
+from page_analyzer.url_db.url_cache import (
+    get_cached_url_id,
+    cache_url_id,
+    invalidate_url_id,
+    get_url_cache_stats,
+)
+from page_analyzer.url_db.content_cache import (
+    get_content_cache_stats,
 )
 
 
 __all__ = ('open_connection',
            'close_connection',
+           'open_read_connection',
            'create_url',
            'create_check',
+           'create_checks',
+           'update_archived_checks',
+           'record_failed_check',
            'check_url',
            'get_urls',
            'get_url_checks',
+           'get_new_url_checks',
            'get_url',
+           'get_stats',
+           'get_cached_url_id',
+           'cache_url_id',
+           'invalidate_url_id',
+           'get_url_cache_stats',
+           'get_content_cache_stats',
            )
@@ -0,0 +1,174 @@
+"""Change feed of the URL and check writes over PostgreSQL LISTEN/NOTIFY.
+
+With CHANGE_FEED=1 the transactions creating URLs and checks notify the
+CHANGE_FEED_CHANNEL channel, PostgreSQL delivers the notifications when
+they commit. Every worker process runs one listener thread on a
+connection of its own, it keeps the URL id cache of the process up to date
+and hands the events to the handlers added by the live pages. An event is
+a dict with the `table` written, the `url_id` and, for URLs, the `name`.
+
+Notifications sent while a listener is reconnecting are lost, the caches
+expire and the live pages catch up from the last check they have seen.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import select
+import threading
+import typing as t
+
+import psycopg2
+from psycopg2 import sql
+
+from page_analyzer.url_db import db_operations
+from page_analyzer.url_db import url_cache
+
+if t.TYPE_CHECKING:
+    from psycopg2.extensions import connection
+
+CHANGE_FEED = os.getenv('CHANGE_FEED', '').lower() in ('1', 'true')
+CHANGE_FEED_CHANNEL = os.getenv('CHANGE_FEED_CHANNEL', 'page_analyzer')
+
+POLL_SECONDS = 1.0
+RECONNECT_SECONDS = 5.0
+
+NOTIFY_QUERY = sql.SQL('''
+SELECT pg_notify(%(channel)s, payload)
+FROM unnest(%(payloads)s::text[]) AS payload;
+''')
+
+LISTEN_ERROR_MESSAGE = 'The change feed listener failed, reconnecting'
+HANDLER_ERROR_MESSAGE = 'A change feed handler failed'
+PAYLOAD_ERROR_MESSAGE = 'A change feed notification is not valid JSON'
+
+logger = logging.getLogger(__name__)
+
+Event = dict[str, t.Any]
+Handler = t.Callable[[Event], None]
+
+_handlers: list[Handler] = []
+_handlers_lock = threading.Lock()
+_listener: ChangeListener | None = None
+_listener_lock = threading.Lock()
+
+
+def notify(connection: connection, events: list[Event]) -> None:
+    """Send the events when the transaction of the connection commits,
+    return None. Does nothing unless CHANGE_FEED is set."""
+    if not CHANGE_FEED or not events:
+        return
+    db_operations.execute_query(
+        connection=connection,
+        query=NOTIFY_QUERY,
+        params={'channel': CHANGE_FEED_CHANNEL,
+                'payloads': [json.dumps(event) for event in events]})
+
+
+def add_handler(handler: Handler) -> None:
+    """Call the handler with every event received by this process."""
+    with _handlers_lock:
+        _handlers.append(handler)
+
+
+def remove_handler(handler: Handler) -> None:
+    with _handlers_lock:
+        _handlers.remove(handler)
+
+
+def dispatch(payload: str) -> None:
+    """Hand the event of a notification to every handler, skip the
+    notification if it is not an event."""
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        logger.exception(PAYLOAD_ERROR_MESSAGE)
+        return
+    with _handlers_lock:
+        handlers = list(_handlers)
+    for handler in handlers:
+        try:
+            handler(event)
+        except Exception:
+            logger.exception(HANDLER_ERROR_MESSAGE)
+
+
+def update_caches(event: Event) -> None:
+    """Remember the id of a URL created by any worker."""
+    if event['table'] == 'urls':
+        url_cache.cache_url_id(event['name'], event['url_id'])
+
+
+class ChangeListener:
+    """Thread listening to the change feed channel of one database."""
+
+    def __init__(self, db_url: str) -> None:
+        self.db_url = db_url
+        self.pid = os.getpid()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run,
+                                        name='change-feed', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._listen()
+            # any error, the thread must not die and leave the caches stale
+            except Exception:
+                logger.exception(LISTEN_ERROR_MESSAGE)
+                self._stopped.wait(RECONNECT_SECONDS)
+
+    def _listen(self) -> None:
+        connection = psycopg2.connect(self.db_url)
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(sql.SQL('LISTEN {channel};').format(
+                    channel=sql.Identifier(CHANGE_FEED_CHANNEL)))
+            while not self._stopped.is_set():
+                self._receive(connection)
+        finally:
+            connection.close()
+
+    def _receive(self, connection: connection) -> None:
+        """Wait for notifications up to POLL_SECONDS and dispatch them."""
+        if select.select([connection], [], [], POLL_SECONDS) == ([], [], []):
+            return
+        connection.poll()
+        while connection.notifies:
+            dispatch(connection.notifies.pop(0).payload)
+
+
+def start_listener(db_url: str) -> None:
+    """Start the listener of this process unless it is running. A forked
+    worker starts its own, threads do not survive a fork."""
+    global _listener
+    listener = _listener
+    if listener is not None and listener.pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener is None or _listener.pid != os.getpid():
+            _listener = ChangeListener(db_url)
+            _listener.start()
+
+
+def stop_listener() -> None:
+    """Stop the listener of this process."""
+    global _listener
+    with _listener_lock:
+        listener, _listener = _listener, None
+    if listener is not None and listener.pid == os.getpid():
+        listener.stop()
+
+
+add_handler(update_caches)
+atexit.register(stop_listener)
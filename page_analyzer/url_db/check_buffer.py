@@ -0,0 +1,208 @@
+"""Group commit of the checks: a write-behind buffer per process.
+
+The check route hands its result to the buffer and waits until the batch
+holding it is committed. A background thread writes the buffered checks
+with one multi-row insert per transaction as soon as CHECK_BUFFER_SIZE
+checks are waiting or the oldest one has waited CHECK_BUFFER_SECONDS, so
+checks completing together share one commit instead of paying one each.
+At most CHECK_BUFFER_MAX_PENDING checks are buffered, adding more waits
+for the next flush. A batch that fails is written again check by check,
+so one bad check does not fail the others. The buffer is flushed when the
+process exits.
+"""
+from __future__ import annotations
+
+import atexit
+import concurrent.futures
+import datetime
+import logging
+import os
+import threading
+import time
+import typing as t
+
+from psycopg2 import sql
+
+from page_analyzer.url_db import db_operations
+from page_analyzer.url_db import url_db_operations
+
+CHECK_BUFFER_SIZE = int(os.getenv('CHECK_BUFFER_SIZE', '0'))
+CHECK_BUFFER_SECONDS = float(os.getenv('CHECK_BUFFER_SECONDS', '0.05'))
+CHECK_BUFFER_MAX_PENDING = int(os.getenv('CHECK_BUFFER_MAX_PENDING', '1000'))
+CHECK_BUFFER_SYNCHRONOUS_COMMIT = os.getenv(
+    'CHECK_BUFFER_SYNCHRONOUS_COMMIT', '1').lower() in ('1', 'true')
+
+ASYNC_COMMIT_QUERY = sql.SQL('SET LOCAL synchronous_commit TO OFF')
+
+BATCH_ERROR_MESSAGE = ('A batch of %s buffered checks was not written, '
+                       'writing them one by one')
+CHECK_ERROR_MESSAGE = 'A buffered check was not written'
+
+logger = logging.getLogger(__name__)
+
+_buffer: CheckBuffer | None = None
+_buffer_lock = threading.Lock()
+
+
+class _Pending(t.NamedTuple):
+    url_id: int
+    data: dict[str, t.Any]
+    checked_at: datetime.datetime
+    added: float
+    future: concurrent.futures.Future[None]
+
+
+class CheckBuffer:
+    """Buffer the checks of one database and write them in batches.
+
+    Without `synchronous_commit` the batches commit without waiting for
+    the WAL flush: a crash of the database server may lose the last
+    committed batches, but never leaves them half written.
+    """
+
+    def __init__(self,
+                 db_url: str,
+                 size: int = CHECK_BUFFER_SIZE,
+                 seconds: float = CHECK_BUFFER_SECONDS,
+                 max_pending: int = CHECK_BUFFER_MAX_PENDING,
+                 synchronous_commit: bool = CHECK_BUFFER_SYNCHRONOUS_COMMIT,
+                 ) -> None:
+        self.db_url = db_url
+        self.size = max(1, size)
+        self.seconds = seconds
+        self.max_pending = max(self.size, max_pending)
+        self.synchronous_commit = synchronous_commit
+        self._pending: list[_Pending] = []
+        self._condition = threading.Condition()
+        self._flushing = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run,
+                                        name='check-buffer', daemon=True)
+        self._thread.start()
+
+    def add(self,
+            url_id: int,
+            data: dict[str, t.Any],
+            ) -> concurrent.futures.Future[None]:
+        """Buffer the check, return a future done when it is committed.
+
+        The future raises psycopg2.Error if the batch was not written.
+        """
+        future: concurrent.futures.Future[None] = concurrent.futures.Future()
+        with self._condition:
+            while len(self._pending) >= self.max_pending and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                raise RuntimeError('The check buffer is closed')
+            self._pending.append(_Pending(url_id, data,
+                                          datetime.datetime.now(),
+                                          time.monotonic(), future))
+            # the first check starts the timer, a full batch is due now
+            if len(self._pending) in (1, self.size):
+                self._condition.notify_all()
+        return future
+
+    def flush(self) -> None:
+        """Write every buffered check now and wait until they are
+        committed or failed."""
+        with self._condition:
+            futures = [pending.future for pending in self._pending]
+            self._flushing = True
+            self._condition.notify_all()
+        concurrent.futures.wait(futures)
+
+    def close(self) -> None:
+        """Write the buffered checks and stop the writer thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            self._write(batch)
+
+    def _take_batch(self) -> list[_Pending] | None:
+        """Wait until a batch is due and take it, return None once the
+        buffer is closed and empty."""
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+            if not self._pending:
+                return None
+            deadline = self._pending[0].added + self.seconds
+            while not self._is_due():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch = self._pending[:self.size]
+            del self._pending[:self.size]
+            self._flushing = self._flushing and bool(self._pending)
+            self._condition.notify_all()
+            return batch
+
+    def _is_due(self) -> bool:
+        if self._flushing or self._closed:
+            return True
+        return len(self._pending) >= self.size
+
+    def _write(self, batch: list[_Pending]) -> None:
+        """Write the batch, or its checks one by one if it fails: only
+        the futures of the checks that cannot be written get the error."""
+        try:
+            self._write_checks(batch)
+        # any error: a dead writer thread would leave every later check
+        # waiting for its future
+        except Exception as error:
+            if len(batch) > 1:
+                logger.warning(BATCH_ERROR_MESSAGE, len(batch))
+                for pending in batch:
+                    self._write([pending])
+                return
+            logger.exception(CHECK_ERROR_MESSAGE)
+            batch[0].future.set_exception(error)
+            return
+        for pending in batch:
+            pending.future.set_result(None)
+
+    def _write_checks(self, batch: list[_Pending]) -> None:
+        connection = db_operations.open_connection(self.db_url)
+        try:
+            if not self.synchronous_commit:
+                db_operations.execute_query(connection=connection,
+                                            query=ASYNC_COMMIT_QUERY)
+            url_db_operations.create_checks(
+                connection,
+                [(pending.url_id, pending.data, pending.checked_at)
+                 for pending in batch])
+        # any error, closing the connection would commit the partial batch
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            db_operations.close_connection(connection)
+
+
+def get_check_buffer(db_url: str) -> CheckBuffer:
+    """Return the check buffer of this process, start it on first use."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = CheckBuffer(db_url)
+        return _buffer
+
+
+def close_check_buffer() -> None:
+    """Write the buffered checks of this process and stop its buffer."""
+    global _buffer
+    with _buffer_lock:
+        check_buffer, _buffer = _buffer, None
+    if check_buffer is not None:
+        check_buffer.close()
+
+
+atexit.register(close_check_buffer)
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import os
+
+from page_analyzer import cache
+
+CONTENT_IDS_CACHE = 'content_ids'
+CONTENT_CACHE_SIZE = int(os.getenv('CONTENT_CACHE_SIZE', '10000'))
+
+
+def _get_content_ids_cache() -> cache.CacheBackend:
+    # stored contents never change or go away, the ids need no expiration
+    return cache.get_cache(CONTENT_IDS_CACHE, maxsize=CONTENT_CACHE_SIZE)
+
+
+def get_cached_content_id(digest: bytes) -> int | None:
+    """Return the id of the content with the digest or None."""
+    content_id: int | None = _get_content_ids_cache().get(digest.hex())
+    return content_id
+
+
+def cache_content_id(digest: bytes, content_id: int) -> None:
+    """Remember the id of a stored content."""
+    _get_content_ids_cache().set(digest.hex(), content_id)
+
+
+def get_content_cache_stats() -> dict[str, int]:
+    """Return the content id cache counters."""
+    return _get_content_ids_cache().stats()
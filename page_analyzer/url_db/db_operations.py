@@ -2,34 +2,68 @@ from __future__ import annotations
 
 import datetime
 import logging
+import os
+import re
+import threading
+import time
 import typing as t
 
 import psycopg2
+from psycopg2 import extensions
 from psycopg2 import sql
 from psycopg2.extras import NamedTupleCursor
+from psycopg2.pool import PoolError
+
+from page_analyzer import tracing
+from page_analyzer.url_db import slow_queries
+from page_analyzer.url_db.pool import ConnectionPool
 
 if t.TYPE_CHECKING:
     from psycopg2.extensions import connection
+    from psycopg2.extensions import cursor
+    from psycopg2.sql import Composable
     from psycopg2.sql import Composed
     from psycopg2.sql import SQL
 
 
-COMPLETE_OPERATION_MESSAGE = 'The {operation} is completed'
-ERROR_OPERATION_MESSAGE = 'Error when trying to {operation}'
+COMPLETE_OPERATION_MESSAGE = 'The %s is completed'
+ERROR_OPERATION_MESSAGE = 'Error when trying to %s'
 CLOSE_CONNECTION_MESSAGE = 'The changes are committed and '\
                            'the connection to the database is close'
 
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '0'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+
+logger = logging.getLogger(__name__)
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+_pooled_connections: dict[int, ConnectionPool] = {}
+_last_error_times: dict[str, float] = {}
+
 
+@tracing.traced('db.open_connection')
 def open_connection(db_url: str) -> connection:
-    """Create a DB connection, return a connection instance."""
+    """Create a DB connection, return a connection instance.
+
+    When DB_POOL_SIZE is set the connection is taken from a per-process
+    pool shared by the worker threads. A pool without a free connection
+    raises PoolError, which does not count as a DB error for readiness.
+    """
     try:
-        conn = psycopg2.connect(db_url, cursor_factory=NamedTupleCursor)
+        if DB_POOL_SIZE > 0:
+            conn = _take_pooled_connection(db_url)
+        else:
+            conn = psycopg2.connect(db_url, cursor_factory=NamedTupleCursor)
+    except PoolError:
+        logger.exception(ERROR_OPERATION_MESSAGE, 'DB connection')
+        raise
     except psycopg2.Error:
-        logging.exception(ERROR_OPERATION_MESSAGE.format(
-            operation='DB connection'))
+        _mark_db_error(db_url)
+        logger.exception(ERROR_OPERATION_MESSAGE, 'DB connection')
         raise
 
-    logging.info(COMPLETE_OPERATION_MESSAGE.format(operation='DB connection'))
+    logger.info(COMPLETE_OPERATION_MESSAGE, 'DB connection')
     return conn
 
 
@@ -38,8 +72,12 @@ def insert_data(connection: connection,
                 fields: list[str],
                 data: dict[str, t.Any],
                 returning: list[str] | None = None,
+                conflict: list[str] | None = None,
                 ) -> list[t.NamedTuple] | None:
-    """Insert data into the DB, return None or inserted data."""
+    """Insert data into the DB, return None or inserted data.
+
+    Rows conflicting with existing ones on the `conflict` fields are skipped.
+    """
     fields = [*fields, 'created_at']
     created_at = datetime.datetime.now()
     data_copy = data.copy()
@@ -52,6 +90,11 @@ def insert_data(connection: connection,
                         data=sql.SQL(', ').join(map(sql.Placeholder, fields)))
     query_end = sql.SQL(';')
 
+    if conflict is not None:
+        conflict_string = sql.SQL(' ON CONFLICT ({fields}) DO NOTHING').format(
+            fields=sql.SQL(',').join(map(sql.Identifier, conflict)))
+        query += conflict_string
+
     if returning is not None:
         returning_string = sql.SQL(' RETURNING {joining_fields}').format(
             joining_fields=sql.SQL(',').join(
@@ -63,15 +106,14 @@ def insert_data(connection: connection,
 
     try:
         with connection.cursor() as cursor:
-            cursor.execute(result_query, data_copy)
+            _execute(cursor, result_query, data_copy)
             if returning is not None:
                 inserted_data = cursor.fetchall()  # type: ignore
     except psycopg2.Error:
-        logging.exception(ERROR_OPERATION_MESSAGE.format(
-            operation='insert data'))
+        logger.exception(ERROR_OPERATION_MESSAGE, 'insert data')
         raise
 
-    logging.info(COMPLETE_OPERATION_MESSAGE.format(operation='insert data'))
+    logger.info(COMPLETE_OPERATION_MESSAGE, 'insert data')
     return inserted_data
 
 
@@ -79,15 +121,25 @@ def select_data(connection: connection,
                 table: str,
                 fields: list[tuple[str, str]],
                 distinct: tuple[str, str] | None = None,
-                filtering: tuple[tuple[str, str], str | int] | None = None,
+                filtering: tuple[tuple[str, str], t.Any] | None = None,
                 sorting: list[tuple[tuple[str, str], str]] | None = None,
+                joining: tuple[tuple[str, str], tuple[str, str]] | None = None,
+                row_type: type[t.NamedTuple] | None = None,
                 ) -> list[t.NamedTuple]:
-    """Select data from the DB, return records list."""
+    """Select data from the DB, return records list.
+
+    The records are instances of `row_type` if it is given, otherwise of
+    a namedtuple made by NamedTupleCursor for the query.
+    """
     query = _generate_selection_string(table=table,
                                        fields=fields,
                                        distinct=distinct)
     query_end = sql.SQL(';')
 
+    if joining is not None:
+        joining_string = _generate_joining_string(joining=joining)
+        query += joining_string
+
     if filtering is not None:
         filtering_string = _generate_filtering_string(filtering=filtering)
         query += filtering_string
@@ -99,23 +151,169 @@ def select_data(connection: connection,
     result_query = query + query_end
 
     try:
-        with connection.cursor() as cursor:
-            cursor.execute(result_query)
-            data: list[t.NamedTuple] = cursor.fetchall()  # type: ignore
+        with _open_cursor(connection, row_type) as cursor:
+            _execute(cursor, result_query)
+            data = _fetch_rows(cursor, row_type)
     except psycopg2.Error:
-        logging.exception(ERROR_OPERATION_MESSAGE.format(
-            operation='select data'))
+        logger.exception(ERROR_OPERATION_MESSAGE, 'select data')
         raise
 
-    logging.info(COMPLETE_OPERATION_MESSAGE.format(operation='select data'))
+    logger.info(COMPLETE_OPERATION_MESSAGE, 'select data')
     return data
 
 
+def execute_query(connection: connection,
+                  query: Composable,
+                  params: dict[str, t.Any] | None = None,
+                  fetch: bool = False,
+                  row_type: type[t.NamedTuple] | None = None,
+                  ) -> list[t.NamedTuple] | None:
+    """Execute a prepared query, return records if `fetch` is set.
+
+    Used for statements that the query builders above do not cover.
+    """
+    result: list[t.NamedTuple] | None = None
+
+    try:
+        with _open_cursor(connection, row_type) as cursor:
+            _execute(cursor, query, params)
+            if fetch:
+                result = _fetch_rows(cursor, row_type)
+    except psycopg2.Error:
+        logger.exception(ERROR_OPERATION_MESSAGE, 'execute query')
+        raise
+
+    logger.info(COMPLETE_OPERATION_MESSAGE, 'execute query')
+    return result
+
+
+@tracing.traced('db.close_connection')
 def close_connection(connection: connection) -> None:
-    """Commit all pending transactions and close the connection."""
-    connection.commit()
-    connection.close()
-    logging.info(CLOSE_CONNECTION_MESSAGE)
+    """Commit all pending transactions and close the connection.
+
+    A pooled connection is returned to its pool instead of being closed.
+    """
+    connection_pool = _pooled_connections.pop(id(connection), None)
+    if connection_pool is None:
+        connection.commit()
+        connection.close()
+        logger.info(CLOSE_CONNECTION_MESSAGE)
+        return
+
+    try:
+        connection.commit()
+    except psycopg2.Error:
+        connection.rollback()
+        raise
+    finally:
+        connection_pool.putconn(connection)
+    logger.info(CLOSE_CONNECTION_MESSAGE)
+
+
+def get_pool_stats() -> dict[str, dict[str, float]]:
+    """Return the usage counters of the connection pools."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {_hide_password(db_url): connection_pool.stats()
+            for db_url, connection_pool in pools.items()}
+
+
+def ping_db(db_url: str) -> bool | None:
+    """Run SELECT 1 on an idle pooled connection, return whether it
+    succeeded or None if no connection is idle. Never opens a connection."""
+    with _pools_lock:
+        connection_pool = _pools.get(db_url)
+    conn = connection_pool.try_getconn() if connection_pool else None
+    if conn is None:
+        return None
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except psycopg2.Error:
+        _mark_db_error(db_url)
+        return False
+    finally:
+        connection_pool.putconn(conn)  # type: ignore
+    return True
+
+
+def get_seconds_since_db_error(db_url: str) -> float | None:
+    """Return the seconds since the last failed connection to the DB."""
+    last_error_time = _last_error_times.get(db_url)
+    if last_error_time is None:
+        return None
+    return time.monotonic() - last_error_time
+
+
+def reset_pools() -> None:
+    """Drop the connection pools, e.g. in a freshly forked worker."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+        _pooled_connections.clear()
+    for connection_pool in pools:
+        connection_pool.closeall()
+
+
+def _mark_db_error(db_url: str) -> None:
+    _last_error_times[db_url] = time.monotonic()
+
+
+def _open_cursor(connection: connection,
+                 row_type: type[t.NamedTuple] | None,
+                 ) -> cursor:
+    """Open a plain tuple cursor for queries with a row type, the default
+    NamedTupleCursor otherwise."""
+    if row_type is None:
+        return connection.cursor()
+    return connection.cursor(cursor_factory=extensions.cursor)
+
+
+def _fetch_rows(cursor: cursor,
+                row_type: type[t.NamedTuple] | None,
+                ) -> list[t.NamedTuple]:
+    """Return the fetched rows, as `row_type` instances if it is given.
+
+    Rows are converted one by one while iterating, no intermediate list of
+    plain tuples is kept.
+    """
+    if row_type is None:
+        return cursor.fetchall()  # type: ignore
+    return list(map(row_type._make, cursor))
+
+
+def _execute(cursor: cursor,
+             query: Composable,
+             params: dict[str, t.Any] | None = None,
+             ) -> None:
+    """Execute the query, record it when it exceeds SLOW_QUERY_MS."""
+    started = time.perf_counter()
+    cursor.execute(query, params)
+    duration = time.perf_counter() - started
+    if duration >= slow_queries.SLOW_QUERY_SECONDS:
+        slow_queries.record_slow_query(cursor.connection, query,
+                                       params, duration)
+
+
+def _take_pooled_connection(db_url: str) -> connection:
+    """Take a connection from the pool of the DB URL."""
+    with _pools_lock:
+        if db_url not in _pools:
+            _pools[db_url] = ConnectionPool(db_url,
+                                            maxconn=DB_POOL_SIZE,
+                                            timeout=DB_POOL_TIMEOUT)
+        connection_pool = _pools[db_url]
+
+    conn = connection_pool.getconn()
+    _pooled_connections[id(conn)] = connection_pool
+    return conn
+
+
+def _hide_password(db_url: str) -> str:
+    """Return the DB URL without the password."""
+    db_url = re.sub(r'(://[^:/@]*):[^@]*@', r'\1@', db_url)
+    return re.sub(r'password=\S*', 'password=***', db_url)
 
 
 def _generate_selection_string(table: str,
@@ -144,6 +342,21 @@ def _generate_selection_string(table: str,
     return query
 
 
+def _generate_joining_string(joining: tuple[tuple[str, str], tuple[str, str]],
+                             ) -> Composed:
+    """Generate SQL LEFT JOIN string with the second table joined."""
+    string_pattern = 'LEFT JOIN {joined_table} ON ' \
+                     '{table}.{field} = {joined_table}.{joined_field}\n'
+    (table, field), (joined_table, joined_field) = joining
+
+    joining_string = sql.SQL(string_pattern).format(
+        table=sql.Identifier(table),
+        field=sql.Identifier(field),
+        joined_table=sql.Identifier(joined_table),
+        joined_field=sql.Identifier(joined_field))
+    return joining_string
+
+
 def _generate_filtering_string(filtering: tuple[tuple[str, str], t.Any],
                                ) -> Composed:
     """Generate SQL filtering string."""
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import threading
+import time
+import typing as t
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.extras import NamedTupleCursor
+from psycopg2.pool import PoolError
+
+if t.TYPE_CHECKING:
+    from psycopg2.extensions import connection
+
+POOL_EXHAUSTED_MESSAGE = 'No free DB connection within {timeout} seconds'
+
+
+class ConnectionPool:
+    """Thread-safe lazy connection pool that waits for a free connection."""
+
+    def __init__(self,
+                 db_url: str,
+                 maxconn: int,
+                 timeout: float = 5.0,
+                 ) -> None:
+        self.db_url = db_url
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._idle: list[connection] = []
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._waiting = 0
+        self._wait_time = 0.0
+
+    def getconn(self) -> connection:
+        """Take a connection, waiting up to the timeout for a free one."""
+        started = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        acquired = self._slots.acquire(timeout=self.timeout)
+        with self._lock:
+            self._waiting -= 1
+            self._wait_time += time.monotonic() - started
+        if not acquired:
+            raise PoolError(
+                POOL_EXHAUSTED_MESSAGE.format(timeout=self.timeout))
+
+        try:
+            conn = self._take_idle()
+            if conn is None:
+                conn = psycopg2.connect(self.db_url,
+                                        cursor_factory=NamedTupleCursor)
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+        return conn
+
+    def try_getconn(self) -> connection | None:
+        """Take an idle connection without waiting or connecting, return
+        None if there is none."""
+        if not self._slots.acquire(blocking=False):
+            return None
+        conn = self._take_idle()
+        if conn is None:
+            self._slots.release()
+            return None
+
+        with self._lock:
+            self._in_use += 1
+        return conn
+
+    def putconn(self, conn: connection) -> None:
+        """Return the connection to the pool in an idle state. A connection
+        that cannot be rolled back is closed, its slot is freed anyway."""
+        try:
+            if not conn.closed:
+                self._reset(conn)
+        finally:
+            with self._lock:
+                if not conn.closed:
+                    self._idle.append(conn)
+                self._in_use -= 1
+            self._slots.release()
+
+    def closeall(self) -> None:
+        """Close every idle connection held by the pool."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self) -> dict[str, float]:
+        """Return the pool usage counters."""
+        with self._lock:
+            return {'maxconn': self.maxconn,
+                    'in_use': self._in_use,
+                    'idle': len(self._idle),
+                    'waiting': self._waiting,
+                    'wait_seconds_total': self._wait_time}
+
+    def _reset(self, conn: connection) -> None:
+        """End the transaction of the connection, close it if it is lost."""
+        status = conn.info.transaction_status
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            conn.close()
+        elif status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except Exception:
+                conn.close()
+                raise
+
+    def _take_idle(self) -> connection | None:
+        """Return an open idle connection or None."""
+        with self._lock:
+            while self._idle:
+                conn = self._idle.pop()
+                if not conn.closed:
+                    return conn
+        return None
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import datetime
+import logging
+import os
+import re
+import typing as t
+
+import psycopg2
+from psycopg2 import sql
+
+from page_analyzer.url_db import db_operations
+
+if t.TYPE_CHECKING:
+    from psycopg2.extensions import connection
+
+CHECKS_RETENTION_DAYS = int(os.getenv('CHECKS_RETENTION_DAYS', '90'))
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '1000'))
+
+PARTITION_NAME_PATTERN = re.compile(r'^url_checks_(\d{4})_(\d{2})$')
+
+ROLL_UP_MESSAGE = '%s checks were rolled up into daily aggregates'
+DROP_PARTITION_MESSAGE = 'The partition %s was rolled up and dropped'
+LOWER_LEVEL_ERROR = 'Error at the lower level'
+
+logger = logging.getLogger(__name__)
+
+# Checks older than the cutoff are removed in bounded batches. The latest
+# check of every URL is kept so that the URL list still shows it.
+EXPIRED_BATCH_QUERY = sql.SQL('''
+    DELETE FROM url_checks
+    WHERE id IN (
+        SELECT checks.id FROM url_checks AS checks
+        WHERE checks.created_at < %(before)s
+          AND EXISTS (SELECT FROM url_checks AS newer
+                      WHERE newer.url_id = checks.url_id
+                        AND newer.created_at > checks.created_at)
+        ORDER BY checks.id
+        LIMIT %(batch_size)s
+        FOR UPDATE SKIP LOCKED)
+    RETURNING url_id, status_code, content_id, created_at
+''')
+
+PARTITION_QUERY = sql.SQL('''
+    SELECT url_id, status_code, content_id, created_at FROM {partition}
+''')
+
+ROLL_UP_QUERY = sql.SQL('''
+WITH expired AS ({expired}),
+per_status AS (
+    SELECT url_id, created_at::date AS day, status_code,
+           count(*) AS checks_count
+    FROM expired
+    GROUP BY url_id, day, status_code
+),
+per_day AS (
+    SELECT url_id, day, sum(checks_count)::int AS checks_count,
+           jsonb_object_agg(status_code::text, checks_count) AS status_counts
+    FROM per_status
+    GROUP BY url_id, day
+),
+last_checks AS (
+    SELECT DISTINCT ON (url_id, created_at::date)
+           url_id, created_at::date AS day, status_code, content_id,
+           created_at
+    FROM expired
+    ORDER BY url_id, created_at::date, created_at DESC
+),
+rolled_up AS (
+    INSERT INTO url_check_daily AS daily (
+        url_id, day, checks_count, status_counts,
+        last_status_code, last_content_id, last_checked_at)
+    SELECT per_day.url_id, per_day.day, per_day.checks_count,
+           per_day.status_counts, last_checks.status_code,
+           last_checks.content_id, last_checks.created_at
+    FROM per_day JOIN last_checks USING (url_id, day)
+    ON CONFLICT (url_id, day) DO UPDATE SET
+        checks_count = daily.checks_count + EXCLUDED.checks_count,
+        status_counts = (
+            SELECT jsonb_object_agg(code, total)
+            FROM (SELECT code, sum(amount::int) AS total
+                  FROM (SELECT * FROM jsonb_each_text(daily.status_counts)
+                        UNION ALL
+                        SELECT * FROM jsonb_each_text(EXCLUDED.status_counts)
+                        ) AS counts (code, amount)
+                  GROUP BY code) AS merged),
+        last_status_code = CASE
+            WHEN EXCLUDED.last_checked_at >= daily.last_checked_at
+            THEN EXCLUDED.last_status_code ELSE daily.last_status_code END,
+        last_content_id = CASE
+            WHEN EXCLUDED.last_checked_at >= daily.last_checked_at
+            THEN EXCLUDED.last_content_id ELSE daily.last_content_id END,
+        last_checked_at = GREATEST(daily.last_checked_at,
+                                   EXCLUDED.last_checked_at)
+    RETURNING 1
+)
+SELECT (SELECT count(*) FROM expired) AS checks,
+       (SELECT count(*) FROM rolled_up) AS days;
+''')
+
+LIST_PARTITIONS_QUERY = sql.SQL('''
+    SELECT child.relname AS name
+    FROM pg_inherits
+    JOIN pg_class AS parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = 'url_checks';
+''')
+
+CREATE_PARTITION_QUERY = sql.SQL('''
+    CREATE TABLE IF NOT EXISTS {partition} PARTITION OF url_checks
+    FOR VALUES FROM (%(start)s) TO (%(end)s);
+''')
+
+DROP_PARTITION_QUERY = sql.SQL('''
+    ALTER TABLE url_checks DETACH PARTITION {partition};
+    DROP TABLE {partition};
+''')
+
+
+def roll_up_expired_checks(connection: connection,
+                           before: datetime.datetime,
+                           batch_size: int = RETENTION_BATCH_SIZE,
+                           ) -> int:
+    """Move one batch of checks older than `before` into daily aggregates,
+    return the number of rolled up checks."""
+    query = ROLL_UP_QUERY.format(expired=EXPIRED_BATCH_QUERY)
+    params = {'before': before, 'batch_size': batch_size}
+
+    try:
+        result = db_operations.execute_query(connection=connection,
+                                             query=query,
+                                             params=params,
+                                             fetch=True)
+    except psycopg2.Error:
+        logger.error(LOWER_LEVEL_ERROR)
+        raise
+
+    count: int = result[0].checks  # type: ignore
+    logger.info(ROLL_UP_MESSAGE, count)
+    return count
+
+
+def apply_retention(connection: connection,
+                    keep_days: int = CHECKS_RETENTION_DAYS,
+                    batch_size: int = RETENTION_BATCH_SIZE,
+                    max_batches: int | None = None,
+                    ) -> int:
+    """Roll up checks older than `keep_days`, committing after each batch
+    so that no lock is held for long. Return the number of rolled up
+    checks."""
+    before = datetime.datetime.now() - datetime.timedelta(days=keep_days)
+    total = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        count = roll_up_expired_checks(connection, before, batch_size)
+        connection.commit()
+        total += count
+        batches += 1
+        if count < batch_size:
+            break
+
+    return total
+
+
+def create_checks_partition(connection: connection,
+                            month: datetime.date,
+                            ) -> str:
+    """Create the monthly partition of a partitioned url_checks table,
+    return its name."""
+    start = month.replace(day=1)
+    end = next_month(start)
+    name = f'url_checks_{start:%Y_%m}'
+    query = CREATE_PARTITION_QUERY.format(partition=sql.Identifier(name))
+
+    db_operations.execute_query(connection=connection,
+                                query=query,
+                                params={'start': start, 'end': end})
+    return name
+
+
+def drop_expired_partitions(connection: connection,
+                            keep_days: int = CHECKS_RETENTION_DAYS,
+                            ) -> list[str]:
+    """Roll up and drop monthly partitions that ended before the retention
+    window, return their names.
+
+    Unlike apply_retention this drops the latest checks of URLs that were
+    not checked within the window, their daily aggregates remain.
+    """
+    before = datetime.date.today() - datetime.timedelta(days=keep_days)
+    partitions = db_operations.execute_query(connection=connection,
+                                             query=LIST_PARTITIONS_QUERY,
+                                             fetch=True) or []
+    dropped = []
+
+    for partition in partitions:
+        start = _get_partition_month(partition.name)  # type: ignore
+        if start is None or next_month(start) > before:
+            continue
+        identifier = sql.Identifier(partition.name)  # type: ignore
+        db_operations.execute_query(
+            connection=connection,
+            query=ROLL_UP_QUERY.format(
+                expired=PARTITION_QUERY.format(partition=identifier)),
+            fetch=True)
+        db_operations.execute_query(
+            connection=connection,
+            query=DROP_PARTITION_QUERY.format(partition=identifier))
+        connection.commit()
+        logger.info(DROP_PARTITION_MESSAGE,
+                    partition.name)  # type: ignore
+        dropped.append(partition.name)  # type: ignore
+
+    return dropped
+
+
+def _get_partition_month(name: str) -> datetime.date | None:
+    """Return the first day of the partition month or None."""
+    match = PARTITION_NAME_PATTERN.match(name)
+    if match is None:
+        return None
+    return datetime.date(int(match[1]), int(match[2]), 1)
+
+
+def next_month(month: datetime.date) -> datetime.date:
+    """Return the first day of the next month."""
+    return (month.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
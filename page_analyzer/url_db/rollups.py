@@ -0,0 +1,253 @@
+"""Rollups of the checks kept up to date by every check.
+
+The dashboard reads only these tables, so its queries do not depend on the
+number of stored URLs and checks. The totals and the daily counters are
+split into ROLLUP_SHARDS rows by URL, concurrent checks rarely wait for the
+same row lock.
+"""
+from __future__ import annotations
+
+import collections
+import datetime
+import logging
+import os
+import typing as t
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import Json
+
+from page_analyzer.url_db import db_operations
+from page_analyzer.url_db import rows
+
+if t.TYPE_CHECKING:
+    from psycopg2.extensions import connection
+
+STATS_DAYS = int(os.getenv('STATS_DAYS', '30'))
+# must match the shards of the backfills in migrations/005_check_rollups.sql
+# and migrations/008_stats_totals.sql
+ROLLUP_SHARDS = 8
+# the status key of checks that got no response
+NO_RESPONSE = 'error'
+
+LOWER_LEVEL_ERROR = 'Error at the lower level'
+
+logger = logging.getLogger(__name__)
+
+RECORD_URL_QUERY = sql.SQL('''
+INSERT INTO stats_totals AS totals (shard, urls, checked_urls, failing_urls,
+                                    checks)
+VALUES (%(shard)s, 1, 0, 0, 0)
+ON CONFLICT (shard) DO UPDATE SET urls = totals.urls + 1;
+''')
+
+# creates the missing rows and locks them all, returns the status before
+# the batch: a new row has no checks yet
+LOCK_STATUS_QUERY = sql.SQL('''
+INSERT INTO url_status AS status (url_id, last_status_code, failing,
+                                  checks_count, last_checked_at)
+SELECT url_id, NULL, false, 0, checked_at
+FROM unnest(%(url_ids)s::bigint[], %(checked_at)s::timestamp[])
+     AS checks (url_id, checked_at)
+ON CONFLICT (url_id) DO UPDATE SET url_id = status.url_id
+RETURNING url_id, failing, checks_count, last_checked_at;
+''')
+
+# one row per day and shard, per shard and per URL, counted in Python
+# beforehand: a statement may not update the same row twice. A batch
+# written after a newer check of the URL still counts its checks, the
+# status stays the newer one.
+RECORD_CHECKS_QUERY = sql.SQL('''
+WITH daily AS (
+    INSERT INTO check_stats_daily AS daily (day, shard, status_counts)
+    SELECT * FROM unnest(%(days)s::date[], %(shards)s::smallint[],
+                         %(status_counts)s::jsonb[])
+    ON CONFLICT (day, shard) DO UPDATE SET
+        status_counts = daily.status_counts || (
+            SELECT jsonb_object_agg(
+                code,
+                coalesce((daily.status_counts ->> code)::bigint, 0)
+                + amount::bigint)
+            FROM jsonb_each_text(EXCLUDED.status_counts)
+                 AS counts (code, amount))
+), totals AS (
+    INSERT INTO stats_totals AS totals (shard, urls, checked_urls,
+                                        failing_urls, checks)
+    SELECT shard, 0, checked_urls, failing_urls, checks
+    FROM unnest(%(total_shards)s::smallint[], %(checked_urls)s::bigint[],
+                %(failing_urls)s::bigint[], %(checks)s::bigint[])
+         AS deltas (shard, checked_urls, failing_urls, checks)
+    ON CONFLICT (shard) DO UPDATE SET
+        checked_urls = totals.checked_urls + EXCLUDED.checked_urls,
+        failing_urls = totals.failing_urls + EXCLUDED.failing_urls,
+        checks = totals.checks + EXCLUDED.checks
+)
+UPDATE url_status AS status SET
+    last_status_code = CASE
+        WHEN checks.checked_at >= status.last_checked_at
+        THEN checks.status_code ELSE status.last_status_code END,
+    failing = CASE
+        WHEN checks.checked_at >= status.last_checked_at
+        THEN checks.failing ELSE status.failing END,
+    checks_count = status.checks_count + checks.checks_count,
+    last_checked_at = GREATEST(status.last_checked_at, checks.checked_at)
+FROM unnest(%(url_ids)s::bigint[], %(status_codes)s::int[],
+            %(failing)s::boolean[], %(checks_counts)s::bigint[],
+            %(checked_at)s::timestamp[])
+     AS checks (url_id, status_code, failing, checks_count, checked_at)
+WHERE status.url_id = checks.url_id;
+''')
+
+TOTALS_QUERY = sql.SQL('''
+SELECT coalesce(sum(urls), 0)::bigint AS urls,
+       coalesce(sum(checked_urls), 0)::bigint AS checked_urls,
+       coalesce(sum(failing_urls), 0)::bigint AS failing_urls,
+       coalesce(sum(checks), 0)::bigint AS checks
+FROM stats_totals;
+''')
+
+DAILY_QUERY = sql.SQL('''
+WITH per_status AS (
+    SELECT day, code, sum(amount::bigint) AS total
+    FROM check_stats_daily,
+         jsonb_each_text(status_counts) AS counts (code, amount)
+    WHERE day > %(since)s
+    GROUP BY day, code
+)
+SELECT day, sum(total)::bigint AS checks,
+       jsonb_object_agg(code, total) AS status_counts
+FROM per_status
+GROUP BY day
+ORDER BY day DESC;
+''')
+
+
+def record_url(connection: connection, url_id: int) -> None:
+    """Count the new URL in the totals."""
+    try:
+        db_operations.execute_query(
+            connection=connection,
+            query=RECORD_URL_QUERY,
+            params={'shard': url_id % ROLLUP_SHARDS})
+    except psycopg2.Error:
+        logger.error(LOWER_LEVEL_ERROR)
+        raise
+
+
+def record_check(connection: connection,
+                 url_id: int,
+                 status_code: int | None,
+                 checked_at: datetime.datetime | None = None,
+                 ) -> None:
+    """Count the check in the rollups, `status_code` is None if the site
+    did not respond."""
+    checked_at = checked_at or datetime.datetime.now()
+    record_checks(connection, [(url_id, status_code, checked_at)])
+
+
+def record_checks(connection: connection,
+                  checks: list[tuple[int, int | None, datetime.datetime]],
+                  ) -> None:
+    """Count the (URL id, status code, check time) checks in the rollups
+    with two statements: the first locks the status of the URLs, the
+    changes of the totals are counted from it."""
+    params = _count_checks(checks)
+    try:
+        previous: list[rows.URLStatus]
+        previous = db_operations.execute_query(  # type: ignore
+            connection=connection,
+            query=LOCK_STATUS_QUERY,
+            params=params,
+            fetch=True,
+            row_type=rows.URLStatus)
+        params |= _count_totals(params, previous)
+        db_operations.execute_query(connection=connection,
+                                    query=RECORD_CHECKS_QUERY,
+                                    params=params)
+    except psycopg2.Error:
+        logger.error(LOWER_LEVEL_ERROR)
+        raise
+
+
+def get_stats(connection: connection,
+              days: int = STATS_DAYS,
+              ) -> dict[str, t.Any]:
+    """Return the totals and the status counts of the last `days` days."""
+    since = datetime.date.today() - datetime.timedelta(days=days)
+
+    try:
+        totals = db_operations.execute_query(connection=connection,
+                                             query=TOTALS_QUERY,
+                                             fetch=True)
+        daily = db_operations.execute_query(connection=connection,
+                                            query=DAILY_QUERY,
+                                            params={'since': since},
+                                            fetch=True)
+    except psycopg2.Error:
+        logger.error(LOWER_LEVEL_ERROR)
+        raise
+
+    stats: dict[str, t.Any] = totals[0]._asdict()  # type: ignore
+    urls = stats['urls']
+    stats['checks_per_url'] = round(stats['checks'] / urls, 2) if urls else 0
+    stats['daily'] = [{'day': row.day.isoformat(),  # type: ignore
+                       'checks': row.checks,  # type: ignore
+                       'status_counts': row.status_counts}  # type: ignore
+                      for row in daily or []]
+    return stats
+
+
+def _count_checks(checks: list[tuple[int, int | None, datetime.datetime]],
+                  ) -> dict[str, list[t.Any]]:
+    """Return the parameters of RECORD_CHECKS_QUERY, the rows in the order
+    of their keys so that concurrent batches lock them in the same order."""
+    daily: dict[tuple[datetime.date, int], collections.Counter[str]] = {}
+    latest: dict[int, tuple[int | None, datetime.datetime, int]] = {}
+    for url_id, status_code, checked_at in sorted(checks,
+                                                  key=lambda check: check[2]):
+        status = NO_RESPONSE if status_code is None else str(status_code)
+        key = (checked_at.date(), url_id % ROLLUP_SHARDS)
+        daily.setdefault(key, collections.Counter())[status] += 1
+        count = latest[url_id][2] + 1 if url_id in latest else 1
+        latest[url_id] = (status_code, checked_at, count)
+
+    days = sorted(daily)
+    url_ids = sorted(latest)
+    return {'days': [day for day, _ in days],
+            'shards': [shard for _, shard in days],
+            'status_counts': [Json(daily[key]) for key in days],
+            'url_ids': url_ids,
+            'status_codes': [latest[url_id][0] for url_id in url_ids],
+            'failing': [is_failing(latest[url_id][0]) for url_id in url_ids],
+            'checks_counts': [latest[url_id][2] for url_id in url_ids],
+            'checked_at': [latest[url_id][1] for url_id in url_ids]}
+
+
+def _count_totals(params: dict[str, list[t.Any]],
+                  previous: list[rows.URLStatus],
+                  ) -> dict[str, list[int]]:
+    """Return the changes of the totals per shard, given the parameters of
+    the checks and the status of their URLs before them."""
+    checks = dict(zip(params['url_ids'], zip(params['failing'],
+                                             params['checks_counts'],
+                                             params['checked_at'])))
+    deltas: dict[int, list[int]] = {}
+    for status in previous:
+        failing, checks_count, checked_at = checks[status.url_id]
+        if checked_at < status.last_checked_at:
+            failing = status.failing
+        delta = deltas.setdefault(status.url_id % ROLLUP_SHARDS, [0, 0, 0])
+        delta[0] += status.checks_count == 0
+        delta[1] += failing - status.failing
+        delta[2] += checks_count
+
+    shards = sorted(deltas)
+    return {'total_shards': shards,
+            'checked_urls': [deltas[shard][0] for shard in shards],
+            'failing_urls': [deltas[shard][1] for shard in shards],
+            'checks': [deltas[shard][2] for shard in shards]}
+
+
+def is_failing(status_code: int | None) -> bool:
+    """Return whether the check means the site is failing."""
+    return status_code is None or status_code >= 400
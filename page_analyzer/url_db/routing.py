@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+import typing as t
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.pool import PoolError
+
+from page_analyzer.url_db import db_operations
+
+if t.TYPE_CHECKING:
+    from psycopg2.extensions import connection
+
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL', '')
+# Also the time a client reads from the primary after its own writes.
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '5'))
+REPLICA_CHECK_INTERVAL = float(os.getenv('REPLICA_CHECK_INTERVAL', '1'))
+REPLICA_RETRY_SECONDS = float(os.getenv('REPLICA_RETRY_SECONDS', '30'))
+
+REPLICA_DOWN_MESSAGE = 'The replica is unavailable, reading from the primary'
+REPLICA_LAG_MESSAGE = 'The replica lags %s seconds, reading from the primary'
+REPLICA_BUSY_MESSAGE = ('No free replica connection, reading this time from '
+                        'the primary')
+
+# A replica that has replayed everything it received is not behind even if
+# the primary has been idle for a while.
+LAG_QUERY = sql.SQL('''
+SELECT CASE
+    WHEN NOT pg_is_in_recovery()
+        OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END AS lag;
+''')
+
+logger = logging.getLogger(__name__)
+
+_state_lock = threading.Lock()
+_lag: float | None = 0.0
+_lag_checked_at = float('-inf')
+_down_until = float('-inf')
+
+
+def open_read_connection(db_url: str,
+                         prefer_primary: bool = False,
+                         ) -> connection:
+    """Open a connection for read-only operations.
+
+    The replica of DATABASE_REPLICA_URL serves them unless the client has
+    just written (`prefer_primary`), the replica lags more than
+    REPLICA_MAX_LAG_SECONDS or it is down; the primary `db_url` does then.
+    A replica pool without a free connection sends only this read to the
+    primary, the replica is not down.
+    """
+    if prefer_primary or not _is_replica_usable():
+        return db_operations.open_connection(db_url)
+
+    try:
+        replica = db_operations.open_connection(DATABASE_REPLICA_URL)
+    except PoolError:
+        logger.warning(REPLICA_BUSY_MESSAGE)
+        return db_operations.open_connection(db_url)
+    except psycopg2.Error:
+        _mark_replica_down()
+        return db_operations.open_connection(db_url)
+
+    if not _check_lag(replica):
+        _discard(replica)
+        return db_operations.open_connection(db_url)
+    return replica
+
+
+def get_replica_state() -> dict[str, t.Any]:
+    """Return the last known lag and availability of the replica."""
+    now = time.monotonic()
+    with _state_lock:
+        return {'configured': bool(DATABASE_REPLICA_URL),
+                'lag_seconds': _lag,
+                'down': _down_until > now}
+
+
+def _is_replica_usable() -> bool:
+    """Return whether the replica is configured, up and not known to lag."""
+    if not DATABASE_REPLICA_URL:
+        return False
+    now = time.monotonic()
+    with _state_lock:
+        if _down_until > now:
+            return False
+        lag_is_known = now - _lag_checked_at < REPLICA_CHECK_INTERVAL
+        return not (lag_is_known and _is_lagging(_lag))
+
+
+def _check_lag(replica: connection) -> bool:
+    """Measure the lag unless it was measured recently, return whether
+    the replica is fresh enough."""
+    global _lag, _lag_checked_at
+    with _state_lock:
+        if time.monotonic() - _lag_checked_at < REPLICA_CHECK_INTERVAL:
+            return not _is_lagging(_lag)
+
+    try:
+        result = db_operations.execute_query(connection=replica,
+                                             query=LAG_QUERY,
+                                             fetch=True)
+    except psycopg2.Error:
+        _mark_replica_down()
+        return False
+
+    lag = result[0].lag  # type: ignore
+    lag = float(lag) if lag is not None else None
+    with _state_lock:
+        _lag = lag
+        _lag_checked_at = time.monotonic()
+    if _is_lagging(lag):
+        logger.warning(REPLICA_LAG_MESSAGE, lag)
+        return False
+    return True
+
+
+def _discard(replica: connection) -> None:
+    """Release the replica connection, it may already be broken."""
+    try:
+        db_operations.close_connection(replica)
+    except psycopg2.Error:
+        logger.exception(REPLICA_DOWN_MESSAGE)
+
+
+def _is_lagging(lag: float | None) -> bool:
+    return lag is None or lag > REPLICA_MAX_LAG_SECONDS
+
+
+def _mark_replica_down() -> None:
+    """Read from the primary for REPLICA_RETRY_SECONDS."""
+    global _down_until
+    logger.warning(REPLICA_DOWN_MESSAGE)
+    with _state_lock:
+        _down_until = time.monotonic() + REPLICA_RETRY_SECONDS
@@ -0,0 +1,59 @@
+"""Row types of the url_db queries.
+
+The classes are created once and reused by every call. Instances are
+tuples with named fields and no per-instance dict, the columns of a query
+must be selected in the order of the fields of its row type.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+import typing as t
+
+
+class Id(t.NamedTuple):
+    id: int
+
+
+class ContentId(t.NamedTuple):
+    id: int
+    uncommitted: bool
+
+
+class URL(t.NamedTuple):
+    id: int
+    name: str
+    created_at: datetime
+
+
+class URLName(t.NamedTuple):
+    id: int
+    name: str
+
+
+class LatestCheck(t.NamedTuple):
+    created_at: datetime
+    status_code: int
+    url_id: int
+
+
+class URLListItem(t.NamedTuple):
+    id: int
+    name: str
+    created_at: datetime | None = None
+    status_code: int | None = None
+
+
+class URLCheck(t.NamedTuple):
+    id: int
+    status_code: int
+    h1: str | None
+    title: str | None
+    description: str | None
+    created_at: datetime
+
+
+class URLStatus(t.NamedTuple):
+    url_id: int
+    failing: bool
+    checks_count: int
+    last_checked_at: datetime
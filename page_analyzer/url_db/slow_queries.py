@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import datetime
+import json
+import logging
+import os
+import random
+import re
+import threading
+import typing as t
+
+import psycopg2
+from psycopg2 import sql
+
+if t.TYPE_CHECKING:
+    from psycopg2.extensions import connection
+    from psycopg2.sql import Composable
+
+SLOW_QUERY_SECONDS = float(os.getenv('SLOW_QUERY_MS', '500')) / 1000
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', '')
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv('SLOW_QUERY_EXPLAIN_RATE', '0'))
+
+SLOW_QUERY_MESSAGE = 'Slow query (%s ms): %s'
+EXPLAIN_ERROR_MESSAGE = 'Error when trying to explain a slow query'
+LOG_ERROR_MESSAGE = 'Error when trying to write the slow query log'
+MAX_PARAM_LENGTH = 200
+
+EXPLAIN_PREFIX = sql.SQL('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ')
+# writes are only planned: running them again would use sequence values
+# and send notifications even in a rolled back savepoint
+PLAN_PREFIX = sql.SQL('EXPLAIN (FORMAT JSON) ')
+LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+logger = logging.getLogger(__name__)
+
+_log_lock = threading.Lock()
+
+
+def record_slow_query(connection: connection,
+                      query: Composable | str,
+                      params: t.Any,
+                      duration: float,
+                      ) -> dict[str, t.Any]:
+    """Log a statement slower than the threshold, return the record.
+
+    A share of the statements set by SLOW_QUERY_EXPLAIN_RATE is explained
+    inside a savepoint that is rolled back and released, with ANALYZE for
+    SELECT statements only.
+    """
+    statement = _get_statement(connection, query)
+    entry: dict[str, t.Any] = {
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'duration_ms': round(duration * 1000, 2),
+        'fingerprint': get_fingerprint(statement),
+        'statement': statement,
+        'params': _shorten_params(params),
+    }
+    if random.random() < SLOW_QUERY_EXPLAIN_RATE:
+        entry['plan'] = explain(connection, query, params)
+
+    logger.warning(SLOW_QUERY_MESSAGE, entry['duration_ms'], statement)
+    if SLOW_QUERY_LOG:
+        _write_entry(SLOW_QUERY_LOG, entry)
+    return entry
+
+
+def explain(connection: connection,
+            query: Composable | str,
+            params: t.Any,
+            ) -> t.Any:
+    """Return the JSON plan of the query, None when it cannot be explained.
+    Only a SELECT statement is run, other statements are planned."""
+    analyze = _get_statement(connection, query).lstrip().upper() \
+        .startswith('SELECT')
+    prefix = EXPLAIN_PREFIX if analyze else PLAN_PREFIX
+    if isinstance(query, str):
+        query = sql.SQL(query)
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SAVEPOINT slow_query_explain')
+            try:
+                cursor.execute(prefix + query, params)
+                plan = cursor.fetchone()[0]  # type: ignore
+            finally:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+    except psycopg2.Error:
+        logger.exception(EXPLAIN_ERROR_MESSAGE)
+        return None
+    return plan
+
+
+def get_fingerprint(statement: str) -> str:
+    """Return the statement with literals replaced by placeholders."""
+    statement = LITERAL_PATTERN.sub('?', statement)
+    return ' '.join(statement.split())
+
+
+def summarize(path: str, top: int = 10) -> list[dict[str, t.Any]]:
+    """Return the slowest statements of the log by total time."""
+    groups: dict[str, dict[str, t.Any]] = {}
+    with open(path) as file:
+        for line in file:
+            entry = json.loads(line)
+            group = groups.setdefault(entry['fingerprint'], {
+                'fingerprint': entry['fingerprint'],
+                'calls': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'explained': 0,
+            })
+            group['calls'] += 1
+            group['total_ms'] += entry['duration_ms']
+            group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+            group['explained'] += entry.get('plan') is not None
+
+    offenders = sorted(groups.values(),
+                       key=lambda group: group['total_ms'],
+                       reverse=True)[:top]
+    for group in offenders:
+        group['mean_ms'] = round(group['total_ms'] / group['calls'], 2)
+        group['total_ms'] = round(group['total_ms'], 2)
+    return offenders
+
+
+def _write_entry(path: str, entry: dict[str, t.Any]) -> None:
+    """Append the entry to the JSON lines log."""
+    try:
+        with _log_lock, open(path, 'a') as file:
+            file.write(json.dumps(entry, default=str) + '\n')
+    except OSError:
+        logger.exception(LOG_ERROR_MESSAGE)
+
+
+def _get_statement(connection: connection, query: Composable | str) -> str:
+    """Return the statement text without the bound parameters."""
+    if isinstance(query, str):
+        return query
+    return query.as_string(connection)
+
+
+def _shorten_params(params: t.Any) -> t.Any:
+    """Return the parameters with long values cut for the log."""
+    if not isinstance(params, dict):
+        return params
+    return {name: (value[:MAX_PARAM_LENGTH]
+                   if isinstance(value, str) else value)
+            for name, value in params.items()}
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import logging
+import os
+
+from page_analyzer import cache
+
+URL_IDS_CACHE = 'url_ids'
+URL_CACHE_SIZE = int(os.getenv('URL_CACHE_SIZE', '10000'))
+URL_CACHE_TTL = float(os.getenv('URL_CACHE_TTL', '3600'))
+
+CACHE_HIT_MESSAGE = 'The URL id was obtained from the cache'
+
+logger = logging.getLogger(__name__)
+
+
+def _get_url_ids_cache() -> cache.CacheBackend:
+    return cache.get_cache(URL_IDS_CACHE,
+                           maxsize=URL_CACHE_SIZE,
+                           ttl=URL_CACHE_TTL or None)
+
+
+def get_cached_url_id(url: str) -> int | None:
+    """Return the id of the normalized URL or None if it is not cached."""
+    url_id: int | None = _get_url_ids_cache().get(url)
+    if url_id is not None:
+        logger.info(CACHE_HIT_MESSAGE)
+    return url_id
+
+
+def cache_url_id(url: str, url_id: int) -> None:
+    """Remember the id of a committed URL record."""
+    _get_url_ids_cache().set(url, url_id)
+
+
+def invalidate_url_id(url: str) -> None:
+    """Forget the cached id of the URL."""
+    _get_url_ids_cache().delete(url)
+
+
+def get_url_cache_stats() -> dict[str, int]:
+    """Return the URL id cache counters."""
+    return _get_url_ids_cache().stats()
@@ -1,92 +1,306 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import logging
 import typing as t
 
 import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import Json
 
+from page_analyzer import metrics
+from page_analyzer import tracing
+from page_analyzer.url_db import change_feed
+from page_analyzer.url_db import content_cache
 from page_analyzer.url_db import db_operations
+from page_analyzer.url_db import rollups
+from page_analyzer.url_db import rows
 
 if t.TYPE_CHECKING:
-    from datetime import datetime
+    import datetime
 
     from psycopg2.extensions import connection
 
 URLS_TABLE = 'urls'
 URL_CHECKS_TABLE = 'url_checks'
-
-CREATION_MESSAGE = 'The {entity} information has been added to the database'
-RECEIPT_MESSAGE = 'The {entity} information was obtained from the database'
+CHECK_CONTENTS_TABLE = 'check_contents'
+CONTENT_FIELDS = ('h1', 'title', 'description')
+# Stored only by the extended parse, see migrations/003_check_contents_seo.sql
+SEO_FIELDS = ('lang', 'canonical', 'robots', 'h1_count', 'h2_count',
+              'internal_links', 'external_links', 'images',
+              'images_with_alt', 'open_graph')
+
+CREATE_CHECKS_QUERY = sql.SQL('''
+INSERT INTO url_checks (url_id, status_code, content_id, final_url,
+                        redirects, archive_key, created_at)
+SELECT * FROM unnest(%(url_ids)s::bigint[], %(status_codes)s::int[],
+                     %(content_ids)s::bigint[], %(final_urls)s::text[],
+                     %(redirects)s::jsonb[], %(archive_keys)s::bytea[],
+                     %(created_at)s::timestamp[]);
+''')
+
+# xmin of a row inserted by the running transaction is its xid, the low
+# 32 bits of the txid
+FIND_CONTENT_QUERY = sql.SQL('''
+SELECT id,
+       coalesce(xmin::text::bigint
+                = txid_current_if_assigned() %% 4294967296, false)
+           AS uncommitted
+FROM check_contents
+WHERE digest = %(digest)s;
+''')
+
+# in the order of rows.URLCheck
+NEW_CHECKS_QUERY = sql.SQL('''
+SELECT url_checks.id, url_checks.status_code, check_contents.h1,
+       check_contents.title, check_contents.description,
+       url_checks.created_at
+FROM url_checks
+LEFT JOIN check_contents ON url_checks.content_id = check_contents.id
+WHERE url_checks.url_id = %(url_id)s AND url_checks.id > %(after)s
+ORDER BY url_checks.id;
+''')
+
+UPDATE_ARCHIVED_CHECKS_QUERY = sql.SQL('''
+WITH updated AS (
+    UPDATE url_checks SET content_id = updates.content_id
+    FROM unnest(%(keys)s::bytea[], %(content_ids)s::bigint[])
+         AS updates (archive_key, content_id)
+    WHERE url_checks.archive_key = updates.archive_key
+    RETURNING 1
+)
+SELECT count(*) AS count FROM updated;
+''')
+
+CREATION_MESSAGE = 'The %s information has been added to the database'
+RECEIPT_MESSAGE = 'The %s information was obtained from the database'
 LOWER_LEVEL_ERROR = 'Error at the lower level'
 
+logger = logging.getLogger(__name__)
+
 
+@tracing.traced('db.create_url')
+@metrics.track_db_operation
 def create_url(connection: connection, url: str) -> int:
-    """Create a record URL in db, return record id."""
+    """Create a record URL in db, return record id.
+
+    The URL is counted in the rollup totals in the same transaction, and
+    the change feed announces it when the transaction commits.
+    """
     try:
         returning = db_operations.insert_data(connection=connection,
                                               table=URLS_TABLE,
                                               fields=['name'],
                                               data={'name': url},
                                               returning=['id'])
+        url_id: int = returning[0].id  # type: ignore
+        rollups.record_url(connection, url_id)
+        change_feed.notify(connection, [{'table': URLS_TABLE,
+                                         'url_id': url_id,
+                                         'name': url}])
     except psycopg2.Error:
-        logging.error(LOWER_LEVEL_ERROR)
+        logger.error(LOWER_LEVEL_ERROR)
         raise
 
-    url_id: int = returning[0].id  # type: ignore
-    logging.info(CREATION_MESSAGE.format(entity='URL'))
+    logger.info(CREATION_MESSAGE, 'URL')
     return url_id
 
 
+@tracing.traced('db.create_check')
+@metrics.track_db_operation
 def create_check(connection: connection,
                  url_id: int,
                  data: dict[str, t.Any],
                  ) -> None:
-    """Create a record URL check in db, return None."""
+    """Create a record URL check in db, return None.
+
+    The parsed content is stored once per distinct value and the check
+    references it, so repeated checks of an unchanged page add no text.
+    The redirect chain and the final URL are stored if there were
+    redirects, the archive key if the response was archived. The dashboard
+    rollups count the check in the same transaction, and the change feed
+    announces it when the transaction commits.
+    """
     try:
+        content_id = _get_content_id(connection, data)
+        chain = data.get('redirects')
+        redirects = Json(chain) if chain else None
         db_operations.insert_data(connection=connection,
                                   table=URL_CHECKS_TABLE,
                                   fields=['url_id',
                                           'status_code',
-                                          'h1',
-                                          'title',
-                                          'description'],
-                                  data=data | {'url_id': url_id})
+                                          'content_id',
+                                          'final_url',
+                                          'redirects',
+                                          'archive_key'],
+                                  data={'url_id': url_id,
+                                        'status_code': data['status_code'],
+                                        'content_id': content_id,
+                                        'final_url': data.get('final_url'),
+                                        'redirects': redirects,
+                                        'archive_key': data.get(
+                                            'archive_key')})
+        rollups.record_check(connection, url_id, data['status_code'])
+        change_feed.notify(connection, [{'table': URL_CHECKS_TABLE,
+                                         'url_id': url_id}])
     except psycopg2.Error:
-        logging.error(LOWER_LEVEL_ERROR)
+        logger.error(LOWER_LEVEL_ERROR)
         raise
 
-    logging.info(CREATION_MESSAGE.format(entity='URL check'))
+    logger.info(CREATION_MESSAGE, 'URL check')
+
+
+@tracing.traced('db.create_checks')
+@metrics.track_db_operation
+def create_checks(connection: connection,
+                  checks: list[tuple[int, dict[str, t.Any],
+                                     datetime.datetime]],
+                  ) -> None:
+    """Create the (URL id, parsed data, check time) checks with one
+    multi-row insert, return None.
+
+    Stores the same fields as create_check, counts the checks in the
+    rollups with one more statement and announces every checked URL once.
+    """
+    try:
+        content_ids = [_get_content_id(connection, data)
+                       for _, data, _ in checks]
+        db_operations.execute_query(
+            connection=connection,
+            query=CREATE_CHECKS_QUERY,
+            params={'url_ids': [url_id for url_id, _, _ in checks],
+                    'status_codes': [data['status_code']
+                                     for _, data, _ in checks],
+                    'content_ids': content_ids,
+                    'final_urls': [data.get('final_url')
+                                   for _, data, _ in checks],
+                    'redirects': [Json(data['redirects'])
+                                  if data.get('redirects') else None
+                                  for _, data, _ in checks],
+                    'archive_keys': [data.get('archive_key')
+                                     for _, data, _ in checks],
+                    'created_at': [checked_at for _, _, checked_at in checks]})
+        rollups.record_checks(connection,
+                              [(url_id, data['status_code'], checked_at)
+                               for url_id, data, checked_at in checks])
+        change_feed.notify(connection,
+                           [{'table': URL_CHECKS_TABLE, 'url_id': url_id}
+                            for url_id in dict.fromkeys(
+                                url_id for url_id, _, _ in checks)])
+    except psycopg2.Error:
+        logger.error(LOWER_LEVEL_ERROR)
+        raise
+
+    logger.info(CREATION_MESSAGE, f'{len(checks)} URL checks')
+
 
+@tracing.traced('db.update_archived_checks')
+@metrics.track_db_operation
+def update_archived_checks(connection: connection,
+                           results: list[tuple[bytes, dict[str, t.Any]]],
+                           ) -> int:
+    """Point the checks of the archived responses to their content parsed
+    again, return the number of updated checks.
+
+    `results` are pairs of an archive key and the parsed data.
+    """
+    try:
+        content_ids = [_get_content_id(connection, data)
+                       for _, data in results]
+        updated = db_operations.execute_query(
+            connection=connection,
+            query=UPDATE_ARCHIVED_CHECKS_QUERY,
+            params={'keys': [key for key, _ in results],
+                    'content_ids': content_ids},
+            fetch=True)
+    except psycopg2.Error:
+        logger.error(LOWER_LEVEL_ERROR)
+        raise
+
+    logger.info(CREATION_MESSAGE, 'parsed archive')
+    return updated[0].count if updated else 0  # type: ignore
+
+
+@tracing.traced('db.record_failed_check')
+@metrics.track_db_operation
+def record_failed_check(connection: connection,
+                        url_id: int,
+                        status_code: int | None,
+                        ) -> None:
+    """Count a check that got an error status or no response in the
+    rollups, no check record is created."""
+    try:
+        rollups.record_check(connection, url_id, status_code)
+    except psycopg2.Error:
+        logger.error(LOWER_LEVEL_ERROR)
+        raise
 
+    logger.info(CREATION_MESSAGE, 'failed URL check')
+
+
+@tracing.traced('db.get_stats')
+@metrics.track_db_operation
+def get_stats(connection: connection) -> dict[str, t.Any]:
+    """Return the dashboard statistics computed from the rollups."""
+    try:
+        stats = rollups.get_stats(connection)
+    except psycopg2.Error:
+        logger.error(LOWER_LEVEL_ERROR)
+        raise
+
+    logger.info(RECEIPT_MESSAGE, 'statistics')
+    return stats
+
+
+def get_content_digest(data: dict[str, t.Any]) -> bytes:
+    """Return the SHA-256 digest of the parsed content fields.
+
+    The digest matches sha256(convert_to(json_build_array(h1, title,
+    description)::text, 'UTF8')) computed by the migrations. The SEO
+    fields of the extended parse are appended only if they are present,
+    so the digests of the basic parse do not change.
+    """
+    values: list[t.Any] = [data.get(field) for field in CONTENT_FIELDS]
+    if 'canonical' in data:
+        values.append({field: data.get(field) for field in SEO_FIELDS})
+    content = json.dumps(values, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(content.encode()).digest()
+
+
+@tracing.traced('db.check_url')
+@metrics.track_db_operation
 def check_url(connection: connection, url: str) -> int | None:
     """Check for a URLs, return id or None if no record."""
     try:
         urls = db_operations.select_data(connection=connection,
                                          table=URLS_TABLE,
                                          fields=[('urls', 'id')],
-                                         filtering=(('urls', 'name'), url))
+                                         filtering=(('urls', 'name'), url),
+                                         row_type=rows.Id)
     except psycopg2.Error:
-        logging.error(LOWER_LEVEL_ERROR)
+        logger.error(LOWER_LEVEL_ERROR)
         raise
 
     if not urls:
-        logging.info(RECEIPT_MESSAGE.format(entity='URL'))
+        logger.info(RECEIPT_MESSAGE, 'URL')
         return None
 
     url_id: int = urls[0].id  # type: ignore
-    logging.info(RECEIPT_MESSAGE.format(entity='URL'))
+    logger.info(RECEIPT_MESSAGE, 'URL')
     return url_id
 
 
+@tracing.traced('db.get_urls')
+@metrics.track_db_operation
 def get_urls(connection: connection) -> t.Sequence[t.NamedTuple]:
     """Return a list of URL records."""
-    urls_fields = [('urls', 'id'), ('urls', 'name')]
+    urls_fields = [('urls', field) for field in rows.URLName._fields]
     urls_sorting: list[tuple[tuple[str, str], str]]
     urls_sorting = [(('urls', 'created_at'), 'DESC')]
 
-    checks_fields = [('url_checks', 'created_at'),
-                     ('url_checks', 'status_code'),
-                     ('url_checks', 'url_id')]
+    checks_fields = [('url_checks', field)
+                     for field in rows.LatestCheck._fields]
     checks_distinct = ('url_checks', 'url_id')
     checks_sorting = [(('url_checks', 'url_id'), 'ASC'),
                       (('url_checks', 'created_at'), 'DESC')]
@@ -95,31 +309,37 @@ def get_urls(connection: connection) -> t.Sequence[t.NamedTuple]:
         urls = db_operations.select_data(connection=connection,
                                          table=URLS_TABLE,
                                          fields=urls_fields,
-                                         sorting=urls_sorting)
+                                         sorting=urls_sorting,
+                                         row_type=rows.URLName)
         url_checks = db_operations.select_data(connection=connection,
                                                table=URL_CHECKS_TABLE,
                                                fields=checks_fields,
                                                distinct=checks_distinct,
-                                               sorting=checks_sorting)
+                                               sorting=checks_sorting,
+                                               row_type=rows.LatestCheck)
     except psycopg2.Error:
-        logging.error(LOWER_LEVEL_ERROR)
+        logger.error(LOWER_LEVEL_ERROR)
         raise
 
     merged_data = _merge_urls_checks(urls, url_checks)
-    logging.info(RECEIPT_MESSAGE.format(entity='URLs'))
+    logger.info(RECEIPT_MESSAGE, 'URLs')
     return merged_data
 
 
+@tracing.traced('db.get_url_checks')
+@metrics.track_db_operation
 def get_url_checks(connection: connection,
                    url_id: int,
                    ) -> list[t.NamedTuple]:
     """Returns a list of URL checks."""
+    # in the order of rows.URLCheck
     fields = [('url_checks', 'id'),
               ('url_checks', 'status_code'),
-              ('url_checks', 'h1'),
-              ('url_checks', 'title'),
-              ('url_checks', 'description'),
+              ('check_contents', 'h1'),
+              ('check_contents', 'title'),
+              ('check_contents', 'description'),
               ('url_checks', 'created_at')]
+    joining = (('url_checks', 'content_id'), ('check_contents', 'id'))
     condition = (('url_checks', 'url_id'), url_id)
     sorting: list[tuple[tuple[str, str], str]]
     sorting = [(('url_checks', 'created_at'), 'DESC')]
@@ -128,56 +348,135 @@ def get_url_checks(connection: connection,
         url_checks = db_operations.select_data(connection=connection,
                                                table=URL_CHECKS_TABLE,
                                                fields=fields,
+                                               joining=joining,
                                                filtering=condition,
-                                               sorting=sorting)
+                                               sorting=sorting,
+                                               row_type=rows.URLCheck)
     except psycopg2.Error:
-        logging.error(LOWER_LEVEL_ERROR)
+        logger.error(LOWER_LEVEL_ERROR)
         raise
 
-    logging.info(RECEIPT_MESSAGE.format(entity='URLs checks and URL'))
+    logger.info(RECEIPT_MESSAGE, 'URLs checks and URL')
     return url_checks
 
 
+@tracing.traced('db.get_new_url_checks')
+@metrics.track_db_operation
+def get_new_url_checks(connection: connection,
+                       url_id: int,
+                       after: int,
+                       ) -> list[t.NamedTuple]:
+    """Return the URL checks with an id above `after`, oldest first."""
+    try:
+        url_checks = db_operations.execute_query(connection=connection,
+                                                 query=NEW_CHECKS_QUERY,
+                                                 params={'url_id': url_id,
+                                                         'after': after},
+                                                 fetch=True,
+                                                 row_type=rows.URLCheck)
+    except psycopg2.Error:
+        logger.error(LOWER_LEVEL_ERROR)
+        raise
+
+    logger.info(RECEIPT_MESSAGE, 'new URL checks')
+    return url_checks or []
+
+
+@tracing.traced('db.get_url')
+@metrics.track_db_operation
 def get_url(connection: connection, url_id: int) -> t.NamedTuple | None:
     """Returns the URL record or None if no record."""
     try:
         urls = db_operations.select_data(connection=connection,
                                          table=URLS_TABLE,
-                                         fields=[('urls', 'id'),
-                                                 ('urls', 'name'),
-                                                 ('urls', 'created_at')],
-                                         filtering=(('urls', 'id'), url_id))
+                                         fields=[('urls', field)
+                                                 for field in rows.URL._fields],
+                                         filtering=(('urls', 'id'), url_id),
+                                         row_type=rows.URL)
     except psycopg2.Error:
-        logging.error(LOWER_LEVEL_ERROR)
+        logger.error(LOWER_LEVEL_ERROR)
         raise
 
     if not urls:
-        logging.info(RECEIPT_MESSAGE.format(entity='URL'))
+        logger.info(RECEIPT_MESSAGE, 'URL')
         return None
 
     return urls[0]
 
 
+def _get_content_id(connection: connection, data: dict[str, t.Any]) -> int:
+    """Return the id of the stored content, storing it if it is new.
+
+    Only ids of committed contents are cached. A content stored by this
+    transaction, also by an earlier check of the same batch, may still
+    roll back.
+    """
+    digest = get_content_digest(data)
+    content_id = content_cache.get_cached_content_id(digest)
+    if content_id is not None:
+        return content_id
+
+    content = _find_content_id(connection, digest)
+    if content is None:
+        content_id = _store_content(connection, digest, data)
+        if content_id is not None:
+            return content_id
+        # a concurrent check has stored the same content
+        content = _find_content_id(connection, digest)
+    content = t.cast(rows.ContentId, content)
+    if not content.uncommitted:
+        content_cache.cache_content_id(digest, content.id)
+    return content.id
+
+
+def _find_content_id(connection: connection,
+                     digest: bytes,
+                     ) -> rows.ContentId | None:
+    contents = db_operations.execute_query(connection=connection,
+                                           query=FIND_CONTENT_QUERY,
+                                           params={'digest': digest},
+                                           fetch=True,
+                                           row_type=rows.ContentId)
+    return contents[0] if contents else None  # type: ignore
+
+
+def _store_content(connection: connection,
+                   digest: bytes,
+                   data: dict[str, t.Any],
+                   ) -> int | None:
+    """Insert the content, return its id or None if it already exists."""
+    content_fields = [*CONTENT_FIELDS]
+    if 'canonical' in data:
+        content_fields.extend(SEO_FIELDS)
+    content = {field: data.get(field) for field in content_fields}
+    if content.get('open_graph') is not None:
+        content['open_graph'] = Json(content['open_graph'])
+    contents = db_operations.insert_data(connection=connection,
+                                         table=CHECK_CONTENTS_TABLE,
+                                         fields=['digest', *content_fields],
+                                         data=content | {'digest': digest},
+                                         returning=['id'],
+                                         conflict=['digest'])
+    return contents[0].id if contents else None  # type: ignore
+
+
 def _merge_urls_checks(urls: t.Sequence[t.NamedTuple],
                        url_checks: t.Sequence[t.NamedTuple],
                        ) -> t.Sequence[t.NamedTuple]:
     '''Return the merged list of URLs and their checks.'''
-    class Record(t.NamedTuple):
-        id: int
-        name: str
-        created_at: datetime | None = None
-        status_code: int | None = None
-
+    # the first check of a URL in url_checks is its latest one
+    latest_checks: dict[int, t.NamedTuple] = {}
+    for check in url_checks:
+        latest_checks.setdefault(check.url_id, check)  # type: ignore
     result = []
     for url in urls:
-        for check in url_checks:
-            if check.url_id == url.id:  # type: ignore
-                record = Record(url.id,  # type: ignore
-                                url.name,  # type: ignore
-                                check.created_at,  # type: ignore
-                                check.status_code)  # type: ignore
-                break
+        check = latest_checks.get(url.id)  # type: ignore
+        if check is None:
+            record = rows.URLListItem(url.id, url.name)  # type: ignore
         else:
-            record = Record(url.id, url.name)  # type: ignore
+            record = rows.URLListItem(url.id,  # type: ignore
+                                      url.name,  # type: ignore
+                                      check.created_at,  # type: ignore
+                                      check.status_code)  # type: ignore
         result.append(record)
     return result
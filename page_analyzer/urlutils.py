@@ -1,17 +1,38 @@
+from __future__ import annotations
+
+import functools
+import os
+import typing as t
 import urllib.parse
 
-import validators
+URL_MEMO_SIZE = int(os.getenv('URL_MEMO_SIZE', '4096'))
+
+EMPTY_URL_ERROR = 'URL обязателен'
+TOO_LONG_URL_ERROR = 'URL превышает 255 символов'
+BAD_URL_ERROR = 'Некорректный URL'
+
+
+class URLReport(t.NamedTuple):
+    url: str
+    errors: tuple[str, ...]
+    normalized_url: str | None
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.errors
 
 
 def validate_url(url: str) -> list[str]:
     """Validate URL address, return error if any."""
+    import validators
+
     error = []
     if not url:
-        error.append('URL обязателен')
+        error.append(EMPTY_URL_ERROR)
     elif len(url) > 255:
-        error.append('URL превышает 255 символов')
+        error.append(TOO_LONG_URL_ERROR)
     elif not validators.url(url):
-        error.append('Некорректный URL')
+        error.append(BAD_URL_ERROR)
     return error
 
 
@@ -19,3 +40,49 @@ def normalize_url(source_url: str) -> str:
     """Return URL in normal form."""
     url = urllib.parse.urlparse(source_url)
     return f'{url.scheme}://{url.hostname}'
+
+
+@functools.lru_cache(maxsize=URL_MEMO_SIZE)
+def analyze_url(url: str) -> URLReport:
+    """Validate and normalize URL with a single parse, memoize the report.
+
+    The normalized URL is None when the address is not valid.
+    """
+    try:
+        parsed = urllib.parse.urlsplit(url)
+    except ValueError:
+        return URLReport(url, (BAD_URL_ERROR,), None)
+    errors = _get_errors(url, parsed)
+    if errors:
+        return URLReport(url, errors, None)
+    return URLReport(url, errors, f'{parsed.scheme}://{parsed.hostname}')
+
+
+def validate_urls(urls: t.Iterable[str]) -> list[URLReport]:
+    """Return a validation report for every URL."""
+    return [analyze_url(url) for url in urls]
+
+
+def normalize_urls(urls: t.Iterable[str]) -> list[str | None]:
+    """Return URLs in normal form, None for those that are not valid."""
+    return [analyze_url(url).normalized_url for url in urls]
+
+
+def _get_errors(url: str,
+                parsed: urllib.parse.SplitResult,
+                ) -> tuple[str, ...]:
+    """Validate the already parsed URL, return errors if any."""
+    # imported here, validators is slow to import and is only needed for
+    # submitted addresses
+    import validators
+
+    if not url:
+        return (EMPTY_URL_ERROR,)
+    if len(url) > 255:
+        return (TOO_LONG_URL_ERROR,)
+    # validators.url rejects such addresses too, skip its regex
+    if not parsed.scheme or parsed.hostname is None:
+        return (BAD_URL_ERROR,)
+    if not validators.url(url):
+        return (BAD_URL_ERROR,)
+    return ()
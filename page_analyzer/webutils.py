@@ -1,35 +1,167 @@
+"""Requests to the checked sites and parsing of their responses.
+
+bs4 and requests are imported on the first check rather than at startup,
+most requests to the application never fetch or parse a page.
+"""
+from __future__ import annotations
+
 import logging
+import os
+import threading
+import time
 import typing as t
 
-import bs4
-import requests
+from page_analyzer import metrics
+from page_analyzer import redirects
+from page_analyzer import seo
+from page_analyzer import tracing
+
+if t.TYPE_CHECKING:
+    import bs4
+    import requests
+
+# Also store canonical, robots, Open Graph and the link and image counts,
+# needs migrations/003_check_contents_seo.sql.
+EXTENDED_PARSE = os.getenv('EXTENDED_PARSE', '').lower() in ('1', 'true')
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return the HTTP session of the current thread.
+
+    Sessions are not shared between threads, so threaded workers reuse
+    keep-alive connections without locking. Only the connections are
+    reused: the cookies are cleared after every request.
+    """
+    import requests
+
+    session: requests.Session | None = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        _local.session = session
+    return session
 
 
+def get_in_flight_requests() -> int:
+    """Return the number of requests to sites waiting for a response."""
+    return _in_flight
+
+
+@tracing.traced('fetch', tracing.CLIENT)
 def get_site_response(url: str) -> requests.Response:
-    """Execute a request to the site, return a response."""
+    """Execute a request to the site, return a response.
+
+    Cached permanent redirects of the URL are not followed again, the
+    response history still lists them. A cached target that fails is
+    forgotten, the chain is followed from the start again only if the
+    target could not be reached: an error status is the result.
+    """
+    import requests
+
+    tracing.set_attribute('http.url', url)
+    redirect = redirects.get_cached_redirect(url)
+    if redirect is not None:
+        target, chain = redirect
+        try:
+            response = _request_site(target)
+        except (requests.ConnectionError, requests.TooManyRedirects):
+            # the target may have moved, follow the chain from the start
+            redirects.invalidate_redirect(url)
+        except requests.RequestException:
+            redirects.invalidate_redirect(url)
+            raise
+        else:
+            redirects.restore_chain(response, chain)
+            return response
+
+    response = _request_site(url)
+    redirects.cache_redirect(url, response)
+    return response
+
+
+def _request_site(url: str) -> requests.Response:
+    import requests
+
+    started = time.perf_counter()
+    session = get_session()
+    _count_in_flight(1)
+    try:
+        response = session.get(url, timeout=1)
+    except requests.RequestException:
+        metrics.observe_fetch('error', time.perf_counter() - started)
+        logger.exception('Error when requesting the site')
+        raise
+    finally:
+        _count_in_flight(-1)
+        # a site must not see the cookies of the sites checked before it
+        session.cookies.clear()
+
+    tracing.set_attribute('http.status_code', response.status_code)
+    metrics.observe_fetch(response.status_code,
+                          time.perf_counter() - started,
+                          len(response.content))
     try:
-        response = requests.get(url, timeout=1)
         response.raise_for_status()
     except requests.RequestException:
-        logging.exception('Error when requesting the site')
+        logger.exception('Error when requesting the site')
         raise
 
-    logging.info('The response from the site was received')
+    logger.info('The response from the site was received')
     return response
 
 
-def parse_html_response(response: requests.Response) -> dict[str, t.Any]:
-    """Parse the site's response, return the dict with the response data."""
-    content = response.text
-    status_code = response.status_code
-    data: dict[str, t.Any] = {'status_code': status_code}
+@tracing.traced('parse')
+def parse_html_response(response: requests.Response,
+                        extended: bool | None = None,
+                        ) -> dict[str, t.Any]:
+    """Parse the site's response, return the dict with the response data.
+
+    The data includes the redirects followed before the response.
+
+    The extended parse (EXTENDED_PARSE by default) adds the SEO fields of
+    page_analyzer.seo, it reads the page once without building a tree.
+    """
+    if extended is None:
+        extended = EXTENDED_PARSE
+
+    started = time.perf_counter()
+    data: dict[str, t.Any] = {'status_code': response.status_code}
+    data.update(_get_redirects(response))
+    if extended:
+        data.update(seo.parse_seo(response.text,
+                                  getattr(response, 'url', '')))
+    else:
+        data.update(_parse_basic(response.text))
+
+    metrics.observe_parse(time.perf_counter() - started)
+    return data
+
 
+def _get_redirects(response: requests.Response) -> dict[str, t.Any]:
+    """Return the redirect chain and the final URL, None without
+    redirects."""
+    chain = redirects.get_redirect_chain(response)
+    if not chain:
+        return {'redirects': None, 'final_url': None}
+    return {'redirects': chain, 'final_url': response.url}
+
+
+def _parse_basic(content: str) -> dict[str, t.Any]:
+    """Return h1, title and description of the page."""
+    import bs4
+
+    data: dict[str, t.Any] = {}
     html_tree = bs4.BeautifulSoup(content, 'html.parser')
 
     tag_desc = html_tree.find('meta', attrs={'name': 'description'})
 
     if html_tree.h1 is not None:
-        data.update(h1=str(html_tree.h1.string))
+        data.update(h1=_get_heading_text(html_tree.h1))
     else:
         data.update(h1=None)
     if html_tree.title is not None:
@@ -40,5 +172,27 @@ def parse_html_response(response: requests.Response) -> dict[str, t.Any]:
         data.update(description=str(tag_desc.get('content')))  # type: ignore
     else:
         data.update(description=None)
-
     return data
+
+
+def _get_heading_text(heading: bs4.Tag) -> str:
+    """Return the text of the heading. A heading holding more than one
+    string, such as an unclosed one, ends at its first block-level tag,
+    where page_analyzer.seo ends it too."""
+    import bs4
+
+    if heading.string is not None:
+        return str(heading.string)
+    parts = []
+    for node in heading.descendants:
+        if isinstance(node, bs4.Tag) and node.name in seo.BLOCK_TAGS:
+            break
+        if type(node) is bs4.NavigableString:
+            parts.append(str(node))
+    return seo.clean_text(''.join(parts))
+
+
+def _count_in_flight(change: int) -> None:
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight += change
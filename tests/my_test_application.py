@@ -9,6 +9,10 @@ import pytest
 import requests
 
 import page_analyzer
+from page_analyzer.url_db import check_buffer
+from page_analyzer.url_db import db_operations
+
+DATABASE_URL = os.getenv('DATABASE_URL', '')
 
 
 def get_fixture_path(name):
@@ -42,6 +46,7 @@ def client():
 @pytest.fixture()
 def mock_url_db(monkeypatch):
     mock = MagicMock()
+    mock.get_cached_url_id.return_value = None
     monkeypatch.setattr('page_analyzer.application.url_db', mock)
     return mock
 
@@ -79,6 +84,18 @@ class TestPostUrls:
         assert response.status_code == 302
         assert response.headers['Location'] == '/urls/1'
         assert message == ('success', 'Страница успешно добавлена')
+        mock_url_db.cache_url_id.assert_called_with('http://example.com', 1)
+
+    def test_post_urls_cached_url(self, client, mock_url_db):
+        mock_url_db.get_cached_url_id.return_value = 1
+        with client:
+            response = client.post(self.url, data=self.form)
+            message, *_ = get_flashed_messages(with_categories=True)
+
+        assert not mock_url_db.open_connection.called
+        assert response.status_code == 302
+        assert response.headers['Location'] == '/urls/1'
+        assert message == ('info', 'Страница уже существует')
 
     def test_post_urls_empty_url(self, client):
         response = client.post(self.url, data={'url': ''})
@@ -139,6 +156,7 @@ class TestPostUrls:
         response = client.post(self.url, data=self.form)
 
         assert mock_url_db.close_connection.called
+        assert not mock_url_db.cache_url_id.called
         assert response.status_code == 500
 
 
@@ -157,7 +175,7 @@ class TestGetURLs:
 
         urls = get_fixture_html('urls.html')
 
-        assert mock_url_db.open_connection.called
+        assert mock_url_db.open_read_connection.called
         assert mock_url_db.close_connection.called
         assert urls in response.text
 
@@ -170,7 +188,7 @@ class TestGetURLs:
         assert empty_urls in response.text
 
     def test_get_urls_connection_error(self, client, mock_url_db):
-        mock_url_db.open_connection.side_effect = psycopg2.Error
+        mock_url_db.open_read_connection.side_effect = psycopg2.Error
         with pytest.raises(psycopg2.Error):
             client.get(self.url)
 
@@ -201,12 +219,12 @@ class TestGetURL:
 
         url_page = get_fixture_html('url_page.html')
 
-        assert mock_url_db.open_connection.called
+        assert mock_url_db.open_read_connection.called
         assert mock_url_db.close_connection.called
         assert url_page in response.text
 
     def test_get_url_connection_error(self, client, mock_url_db):
-        mock_url_db.open_connection.side_effect = psycopg2.Error
+        mock_url_db.open_read_connection.side_effect = psycopg2.Error
         with pytest.raises(psycopg2.Error):
             client.get(self.url)
 
@@ -285,6 +303,20 @@ class TestPostChecks:
         assert response.status_code == 302
         assert response.headers['Location'] == '/urls/1'
         assert message == ('info', 'Произошла ошибка при проверке')
+        assert mock_url_db.record_failed_check.call_args.args[1:] == (1, None)
+
+    def test_post_checks_error_status(self,
+                                      client,
+                                      mock_url_db,
+                                      mock_webutils):
+        error_response = requests.Response()
+        error_response.status_code = 503
+        mock_webutils.get_site_response.side_effect = requests.HTTPError(
+            response=error_response)
+        response = client.post(self.url)
+
+        assert response.status_code == 302
+        assert mock_url_db.record_failed_check.call_args.args[1:] == (1, 503)
 
     def test_post_checks_create_check_error(self,
                                             client,
@@ -296,6 +328,82 @@ class TestPostChecks:
         assert mock_url_db.close_connection.called
         assert response.status_code == 500
 
+    def test_post_checks_buffered(self,
+                                  client,
+                                  monkeypatch,
+                                  mock_url_db,
+                                  mock_webutils):
+        mock_buffer = MagicMock()
+        mock_buffer.add.return_value.result.side_effect = psycopg2.Error
+        monkeypatch.setattr(check_buffer, 'CHECK_BUFFER_SIZE', 10)
+        monkeypatch.setattr(check_buffer, 'get_check_buffer',
+                            lambda db_url: mock_buffer)
+        mock_webutils.parse_html_response.return_value = {'status_code': 200}
+        response = client.post(self.url)
+
+        assert mock_buffer.add.call_args.args[0] == 1
+        assert not mock_url_db.create_check.called
+        assert response.status_code == 500
+
+    def test_post_checks_buffered_full_pool(self,
+                                            client,
+                                            monkeypatch,
+                                            mock_webutils):
+        # one pooled connection: the writer of the buffer needs it while
+        # the request waits for its check
+        monkeypatch.setattr(db_operations, 'DB_POOL_SIZE', 1)
+        monkeypatch.setattr(db_operations, 'DB_POOL_TIMEOUT', 0.5)
+        monkeypatch.setattr('page_analyzer.url_db.get_url',
+                            MagicMock(return_value=self.Url(
+                                1, 'http://example.com', datetime.now())))
+        mock_url_db_operations = MagicMock()
+        monkeypatch.setattr(
+            'page_analyzer.url_db.check_buffer.url_db_operations',
+            mock_url_db_operations)
+        buffer = check_buffer.CheckBuffer(DATABASE_URL, size=1)
+        monkeypatch.setattr(check_buffer, 'CHECK_BUFFER_SIZE', 1)
+        monkeypatch.setattr(check_buffer, 'get_check_buffer',
+                            lambda db_url: buffer)
+        mock_webutils.parse_html_response.return_value = {'status_code': 200}
+        try:
+            response = client.post(self.url)
+        finally:
+            buffer.close()
+            db_operations.reset_pools()
+
+        assert response.status_code == 302
+        assert mock_url_db_operations.create_checks.call_count == 1
+
+
+class TestGetStats:
+    stats = {'urls': 3, 'checked_urls': 2, 'failing_urls': 1, 'checks': 5,
+             'checks_per_url': 1.67,
+             'daily': [{'day': '2024-01-02', 'checks': 5,
+                        'status_counts': {'200': 4, 'error': 1}}]}
+
+    def test_get_stats_success(self, client, mock_url_db):
+        mock_url_db.get_stats.return_value = self.stats
+        response = client.get('/stats')
+
+        assert response.status_code == 200
+        assert '2024-01-02' in response.text
+        assert '200: 4,' in response.text
+        assert mock_url_db.close_connection.called
+
+    def test_get_stats_data_success(self, client, mock_url_db):
+        mock_url_db.get_stats.return_value = self.stats
+        response = client.get('/api/stats')
+
+        assert response.status_code == 200
+        assert response.json == self.stats
+
+    def test_get_stats_error(self, client, mock_url_db):
+        mock_url_db.get_stats.side_effect = psycopg2.Error
+        response = client.get('/api/stats')
+
+        assert response.status_code == 500
+        assert mock_url_db.close_connection.called
+
 
 def test_page_not_found_succes(client):
     response = client.get('/u')
@@ -312,3 +420,121 @@ def test_internal_server_error_success(client, mock_url_db):
     error = get_fixture_html('errors/500.html')
 
     assert error in response.text
+
+
+def test_get_metrics(client):
+    client.get('/')
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert b'page_analyzer_request_duration_seconds_count{' \
+           b'method="GET",route="/",status="200"}' in response.data
+
+
+def test_request_id(client):
+    generated = client.get('/')
+    forwarded = client.get('/', headers={'X-Request-ID': 'abc-1'})
+    invalid = client.get('/', headers={'X-Request-ID': 'a b'})
+
+    assert len(generated.headers['X-Request-ID']) == 32
+    assert forwarded.headers['X-Request-ID'] == 'abc-1'
+    assert invalid.headers['X-Request-ID'] != 'a b'
+
+
+def test_server_timing(client, mock_url_db, monkeypatch):
+    monkeypatch.setattr('page_analyzer.tracing.SERVER_TIMING', True)
+    mock_url_db.get_urls.return_value = []
+
+    response = client.get('/urls')
+
+    assert response.headers['Server-Timing'].startswith('total;dur=')
+
+
+def test_healthz(client):
+    response = client.get('/healthz')
+
+    assert response.status_code == 200
+    assert response.json['status'] == 'ok'
+
+
+def test_readyz(client, monkeypatch):
+    mock = MagicMock()
+    mock.check_readiness.return_value = (False, {'status': 'unavailable'})
+    monkeypatch.setattr('page_analyzer.application.health', mock)
+
+    response = client.get('/readyz')
+
+    assert response.status_code == 503
+    assert response.json == {'status': 'unavailable'}
+
+
+def test_reads_follow_own_writes(client, mock_url_db, monkeypatch):
+    monkeypatch.setattr('page_analyzer.url_db.routing.DATABASE_REPLICA_URL',
+                        'replica')
+    mock_url_db.check_url.return_value = None
+    mock_url_db.create_url.return_value = 1
+    mock_url_db.get_urls.return_value = []
+
+    client.get('/urls')
+    client.post('/urls', data={'url': 'https://example.com'})
+    client.get('/urls')
+
+    calls = mock_url_db.open_read_connection.call_args_list
+    assert [call.args[1] for call in calls] == [False, True]
+
+
+class TestGetURLEvents:
+    url = '/urls/1/events'
+
+    @pytest.fixture()
+    def mock_live_updates(self, monkeypatch):
+        monkeypatch.setattr('page_analyzer.url_db.change_feed.CHANGE_FEED',
+                            True)
+        monkeypatch.setattr(
+            'page_analyzer.url_db.change_feed.start_listener', MagicMock())
+        mock = MagicMock()
+        mock.stream_checks.return_value = iter(['retry: 3000\n\n'])
+        monkeypatch.setattr('page_analyzer.application.live_updates', mock)
+        return mock
+
+    def test_get_url_events_disabled(self, client):
+        response = client.get(self.url)
+
+        assert response.status_code == 404
+
+    def test_get_url_events_success(self, client, mock_live_updates):
+        response = client.get(self.url, query_string={'after': 5})
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        assert response.text == 'retry: 3000\n\n'
+        mock_live_updates.stream_checks.assert_called_once_with(
+            page_analyzer.application.DATABASE_URL, 1, 5)
+        response.close()
+        assert mock_live_updates.release_stream.called
+
+    def test_get_url_events_last_event_id(self, client, mock_live_updates):
+        client.get(self.url, query_string={'after': 5},
+                   headers={'Last-Event-ID': '7'})
+
+        assert mock_live_updates.stream_checks.call_args.args[2] == 7
+
+    def test_get_url_events_no_free_stream(self, client, mock_live_updates):
+        mock_live_updates.acquire_stream.return_value = False
+
+        response = client.get(self.url)
+
+        assert response.status_code == 503
+        assert not mock_live_updates.stream_checks.called
+
+    def test_get_url_live_updates(self, client, mock_url_db,
+                                  mock_live_updates):
+        mock_url_db.get_url.return_value = TestGetURL.url_data
+        mock_url_db.get_url_checks.return_value = [
+            TestGetURL.Check(2, 200, 'h1', 'title', 'description',
+                             datetime(2000, 2, 2, 2, 2, 2))]
+
+        response = client.get('/urls/1')
+
+        assert 'data-events="/urls/1/events?after=2"' in response.text
+        assert 'EventSource' in response.text
@@ -0,0 +1,77 @@
+import requests
+
+from page_analyzer import archive
+
+
+def make_response(url, body, encoding='utf-8'):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.encoding = encoding
+    response.headers['Content-Type'] = 'text/html'
+    response._content = body
+    return response
+
+
+def read_archive(archive_dir):
+    return [record
+            for path in archive.list_segments(str(archive_dir))
+            for record in archive.read_segment(path)]
+
+
+def test_store_response(tmp_path):
+    response = make_response('https://example.com/', b'<h1>One</h1>')
+
+    key = archive.store_response(response, str(tmp_path))
+
+    [record] = read_archive(tmp_path)
+    assert key == archive.get_archive_key('https://example.com/', 'utf-8',
+                                          b'<h1>One</h1>')
+    assert record.key == key
+    assert record.url == 'https://example.com/'
+    assert record.status_code == 200
+    assert record.headers == {'Content-Type': 'text/html'}
+    assert record.body == b'<h1>One</h1>'
+
+
+def test_store_response_once_per_content(tmp_path):
+    first = make_response('https://example.com/', b'<h1>One</h1>')
+    second = make_response('https://example.com/', b'<h1>Two</h1>')
+    other_site = make_response('https://example.org/', b'<h1>One</h1>')
+
+    keys = [archive.store_response(response, str(tmp_path))
+            for response in (first, second, first, other_site)]
+
+    assert keys[0] == keys[2]
+    assert len(set(keys)) == 3
+    assert [record.key for record in read_archive(tmp_path)] == [
+        keys[0], keys[1], keys[3]]
+
+
+def test_store_response_new_segment(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, 'ARCHIVE_SEGMENT_MB', 2 / 2**20)
+
+    for number in range(3):
+        archive.store_response(make_response('https://example.com/',
+                                             f'<p>{number}</p>'.encode()),
+                               str(tmp_path))
+
+    assert [path.name for path in archive.list_segments(str(tmp_path))] == [
+        'segment-000001.gz', 'segment-000002.gz', 'segment-000003.gz']
+    assert len(read_archive(tmp_path)) == 3
+
+
+def test_store_response_disabled(monkeypatch):
+    monkeypatch.setattr(archive, 'ARCHIVE_DIR', '')
+
+    assert archive.store_response(make_response('https://a.test/', b'')) \
+        is None
+
+
+def test_store_response_error(tmp_path):
+    not_a_directory = tmp_path / 'file'
+    not_a_directory.write_text('')
+
+    response = make_response('https://example.com/', b'<h1>One</h1>')
+
+    assert archive.store_response(response, str(not_a_directory)) is None
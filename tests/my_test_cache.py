@@ -0,0 +1,79 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from page_analyzer import cache
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    mock = MagicMock(return_value=100.0)
+    monkeypatch.setattr('page_analyzer.cache.time.monotonic', mock)
+    return mock
+
+
+class TestLRUCache:
+
+    def test_get_set_success(self):
+        lru = cache.LRUCache(maxsize=2)
+        lru.set('a', 1)
+
+        assert lru.get('a') == 1
+        assert lru.get('b') is None
+        assert lru.stats()['hits'] == 1
+        assert lru.stats()['misses'] == 1
+
+    def test_eviction_least_recently_used(self):
+        lru = cache.LRUCache(maxsize=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+
+        assert lru.get('b') is None
+        assert lru.get('a') == 1
+        assert lru.get('c') == 3
+        assert lru.stats()['evictions'] == 1
+        assert lru.stats()['size'] == 2
+
+    def test_expiration(self, clock):
+        lru = cache.LRUCache(ttl=10)
+        lru.set('a', 1)
+        clock.return_value = 111.0
+
+        assert lru.get('a') is None
+        assert lru.stats()['expirations'] == 1
+
+    def test_delete_and_clear(self):
+        lru = cache.LRUCache()
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.delete('a')
+        lru.delete('missing')
+
+        assert lru.get('a') is None
+        assert lru.stats()['invalidations'] == 1
+
+        lru.clear()
+
+        assert lru.get('b') is None
+
+
+def test_get_cache_returns_same_instance(monkeypatch):
+    monkeypatch.setattr('page_analyzer.cache._caches', {})
+
+    first = cache.get_cache('test', maxsize=5)
+    second = cache.get_cache('test')
+
+    assert first is second
+    assert 'test' in cache.get_stats()
+
+
+def test_get_cache_registered_backend(monkeypatch):
+    backend = MagicMock()
+    monkeypatch.setattr('page_analyzer.cache._caches', {})
+    monkeypatch.setattr('page_analyzer.cache._backends', {})
+    monkeypatch.setenv('CACHE_BACKEND', 'fake')
+    cache.register_backend('fake', MagicMock(return_value=backend))
+
+    assert cache.get_cache('test') is backend
@@ -0,0 +1,78 @@
+import queue
+import types
+from unittest.mock import MagicMock
+
+import pytest
+
+from page_analyzer import health
+
+
+@pytest.fixture()
+def mock_db_operations(monkeypatch):
+    mock = MagicMock()
+    mock.ping_db.return_value = True
+    mock.get_seconds_since_db_error.return_value = None
+    mock.get_pool_stats.return_value = {'db': {'waiting': 0}}
+    monkeypatch.setattr('page_analyzer.health.db_operations', mock)
+    return mock
+
+
+@pytest.fixture()
+def mock_webutils(monkeypatch):
+    mock = MagicMock()
+    mock.get_in_flight_requests.return_value = 0
+    monkeypatch.setattr('page_analyzer.health.webutils', mock)
+    return mock
+
+
+@pytest.fixture()
+def worker(monkeypatch):
+    work_queue = queue.SimpleQueue()
+    worker = types.SimpleNamespace(
+        tpool=types.SimpleNamespace(_work_queue=work_queue))
+    monkeypatch.setattr(health, '_worker', worker)
+    return work_queue
+
+
+def test_check_liveness():
+    result = health.check_liveness()
+
+    assert result['status'] == 'ok'
+
+
+def test_check_readiness_ready(mock_db_operations, mock_webutils, worker):
+    ready, report = health.check_readiness('db')
+
+    assert ready
+    assert report['queue_depth'] == 0
+    assert report['problems'] == []
+
+
+@pytest.mark.parametrize('ping, error_age, expected', [
+    (False, None, False),
+    (None, 1, False),
+    (None, 60, True),
+    (True, 1, True),
+])
+def test_check_readiness_db(mock_db_operations, mock_webutils,
+                            ping, error_age, expected):
+    mock_db_operations.ping_db.return_value = ping
+    mock_db_operations.get_seconds_since_db_error.return_value = error_age
+
+    ready, _ = health.check_readiness('db')
+
+    assert ready is expected
+
+
+def test_check_readiness_saturated(mock_db_operations, mock_webutils,
+                                   worker):
+    mock_db_operations.get_pool_stats.return_value = {'db': {'waiting': 10}}
+    mock_webutils.get_in_flight_requests.return_value = 100
+    for _ in range(health.READY_MAX_QUEUE_DEPTH + 1):
+        worker.put(None)
+
+    ready, report = health.check_readiness('db')
+
+    assert not ready
+    assert report['status'] == 'unavailable'
+    assert len(report['problems']) == 3
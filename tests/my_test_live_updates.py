@@ -0,0 +1,78 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from page_analyzer import live_updates
+from page_analyzer.url_db import change_feed
+from page_analyzer.url_db import rows
+
+
+@pytest.fixture()
+def mock_url_db(monkeypatch):
+    mock = MagicMock()
+    monkeypatch.setattr('page_analyzer.live_updates.url_db', mock)
+    return mock
+
+
+def get_check(check_id):
+    return rows.URLCheck(check_id, 200, 'h1', None, 'description',
+                         datetime(2000, 1, check_id, 1, 1, 1))
+
+
+def test_format_check():
+    assert live_updates.format_check(get_check(2)) == (
+        'event: check\nid: 2\n'
+        'data: {"id": 2, "status_code": 200, "h1": "h1", "title": null, '
+        '"description": "description", "created_at": "2000-01-02"}\n\n')
+
+
+def test_stream_checks(mock_url_db, monkeypatch):
+    monkeypatch.setattr('page_analyzer.live_updates.KEEPALIVE_SECONDS', 0.01)
+    monkeypatch.setattr(
+        'page_analyzer.live_updates.CHANGE_FEED_STREAM_SECONDS', 0.05)
+    mock_url_db.get_new_url_checks.return_value = [get_check(2),
+                                                   get_check(3)]
+    stream = live_updates.stream_checks('db', 1, after=1)
+
+    assert next(stream) == 'retry: 3000\n\n'
+    assert next(stream).startswith('event: check\nid: 2\n')
+    assert next(stream).startswith('event: check\nid: 3\n')
+    mock_url_db.get_new_url_checks.assert_called_with(
+        mock_url_db.open_read_connection.return_value, 1, 1)
+
+    mock_url_db.get_new_url_checks.return_value = [get_check(4)]
+    change_feed.dispatch('{"table": "url_checks", "url_id": 2}')
+    change_feed.dispatch('{"table": "url_checks", "url_id": 1}')
+    change_feed.dispatch('{"table": "url_checks", "url_id": 1}')
+
+    assert next(stream).startswith('event: check\nid: 4\n')
+    assert set(stream) == {': keepalive\n\n'}
+    assert mock_url_db.get_new_url_checks.call_count == 2
+    mock_url_db.get_new_url_checks.assert_called_with(
+        mock_url_db.open_read_connection.return_value, 1, 3)
+    mock_url_db.open_read_connection.assert_called_with('db', True)
+    assert mock_url_db.close_connection.call_count == 2
+
+
+def test_stream_checks_removes_handler(mock_url_db, monkeypatch):
+    handlers = []
+    monkeypatch.setattr('page_analyzer.url_db.change_feed._handlers',
+                        handlers)
+    mock_url_db.get_new_url_checks.return_value = []
+    stream = live_updates.stream_checks('db', 1, after=0)
+    next(stream)
+
+    assert len(handlers) == 1
+    stream.close()
+    assert handlers == []
+
+
+def test_acquire_stream(monkeypatch):
+    monkeypatch.setattr('page_analyzer.live_updates._streams',
+                        live_updates.threading.BoundedSemaphore(1))
+
+    assert live_updates.acquire_stream()
+    assert not live_updates.acquire_stream()
+    live_updates.release_stream()
+    assert live_updates.acquire_stream()
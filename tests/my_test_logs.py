@@ -0,0 +1,65 @@
+import io
+import json
+import logging
+
+import pytest
+
+from page_analyzer import logs
+
+
+@pytest.fixture()
+def stream():
+    stream = io.StringIO()
+    yield stream
+    logs.setup_logging()
+
+
+def make_record(name='page_analyzer.url_db', level=logging.INFO):
+    return logging.LogRecord(name, level, __file__, 1,
+                             'The %s is completed', ('select data',), None)
+
+
+def test_json_formatter():
+    record = make_record()
+    record.request_id = 'abc'
+
+    result = json.loads(logs.JSONFormatter().format(record))
+
+    assert result['message'] == 'The select data is completed'
+    assert result['level'] == 'INFO'
+    assert result['logger'] == 'page_analyzer.url_db'
+    assert result['request_id'] == 'abc'
+
+
+def test_parse_sampling():
+    result = logs.parse_sampling('page_analyzer.url_db=0.1, root=1')
+
+    assert result == {'page_analyzer.url_db': 0.1, 'root': 1.0}
+
+
+def test_sampling_filter():
+    sampling = logs.SamplingFilter({'page_analyzer.url_db': 0,
+                                    'page_analyzer': 1})
+
+    assert not sampling.filter(make_record('page_analyzer.url_db.pool'))
+    assert sampling.filter(make_record('page_analyzer.url_db.pool',
+                                       logging.ERROR))
+    assert sampling.filter(make_record('page_analyzer.webutils'))
+    assert sampling.filter(make_record('other'))
+
+
+def test_setup_logging(stream):
+    logs.setup_logging(sampling='sampled=0', stream=stream)
+    token = logs.request_id.set('abc')
+    try:
+        logging.getLogger('kept').info('The %s is completed', 'check')
+        logging.getLogger('sampled').info('Dropped')
+    finally:
+        logs.request_id.reset(token)
+    logs.stop_logging()
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    assert [entry['message'] for entry in entries] == \
+        ['The check is completed']
+    assert entries[0]['request_id'] == 'abc'
@@ -0,0 +1,55 @@
+import prometheus_client
+import pytest
+
+from page_analyzer import metrics
+
+
+def get_sample(name, labels=None):
+    return prometheus_client.REGISTRY.get_sample_value(name, labels or {})
+
+
+def test_track_db_operation_success():
+    @metrics.track_db_operation
+    def tracked_success():
+        return 42
+
+    assert tracked_success() == 42
+    assert tracked_success.__name__ == 'tracked_success'
+    assert get_sample('page_analyzer_db_operation_duration_seconds_count',
+                      {'operation': 'tracked_success'}) == 1
+
+
+def test_track_db_operation_error():
+    @metrics.track_db_operation
+    def tracked_error():
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        tracked_error()
+
+    assert get_sample('page_analyzer_db_operation_errors_total',
+                      {'operation': 'tracked_error'}) == 1
+    assert get_sample('page_analyzer_db_operation_duration_seconds_count',
+                      {'operation': 'tracked_error'}) == 1
+
+
+def test_observe_fetch():
+    name = 'page_analyzer_fetch_duration_seconds_count'
+    before = get_sample(name, {'status': '418'}) or 0
+    size_before = get_sample('page_analyzer_fetch_response_bytes_sum') or 0
+
+    metrics.observe_fetch(418, 0.1, 1000)
+
+    assert get_sample(name, {'status': '418'}) == before + 1
+    assert get_sample('page_analyzer_fetch_response_bytes_sum') == \
+        size_before + 1000
+
+
+def test_render(monkeypatch):
+    monkeypatch.delenv(metrics.MULTIPROCESS_DIR_VARIABLE, raising=False)
+    metrics.observe_parse(0.01)
+
+    data, content_type = metrics.render()
+
+    assert b'page_analyzer_parse_duration_seconds_count' in data
+    assert content_type.startswith('text/plain')
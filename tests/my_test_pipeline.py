@@ -0,0 +1,137 @@
+from unittest.mock import MagicMock
+
+import psycopg2
+import pytest
+import requests
+
+from page_analyzer import cache
+from page_analyzer import pipeline
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    cache.clear_caches()
+    yield
+    cache.clear_caches()
+
+
+@pytest.fixture()
+def mock_url_db(monkeypatch):
+    mock = MagicMock()
+    monkeypatch.setattr('page_analyzer.pipeline.url_db', mock)
+    return mock
+
+
+def make_response(url, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = url
+    response.encoding = 'utf-8'
+    response._content = f'<title>{url}</title>'.encode()
+    return response
+
+
+@pytest.fixture()
+def sites(monkeypatch):
+    def get(session, url, **kwargs):
+        if 'down' in url:
+            raise requests.ConnectionError
+        return make_response(url, 404 if 'missing' in url else 200)
+
+    monkeypatch.setattr('requests.Session.get', get)
+
+
+def test_parse_page():
+    page = pipeline.Page(url_id=1,
+                         content='<h1>Привет</h1>'.encode('cp1251'),
+                         encoding='cp1251',
+                         status_code=200,
+                         url='https://www.example.com/',
+                         redirects=[(301, 'http://example.com/')])
+
+    result = pipeline.parse_page(page)
+
+    assert result.url_id == 1
+    assert result.data['h1'] == 'Привет'
+    assert result.data['final_url'] == 'https://www.example.com/'
+    assert 'archive_key' not in result.data
+
+
+def test_parse_page_archived():
+    page = pipeline.Page(url_id=1, content=b'', encoding=None,
+                         status_code=200, url='https://example.com/',
+                         redirects=[], archive_key=b'key')
+
+    assert pipeline.parse_page(page).data['archive_key'] == b'key'
+
+
+def test_check_urls(sites, mock_url_db):
+    urls = [(1, 'http://one.test'), (2, 'http://down.test'),
+            (3, 'http://missing.test')]
+
+    stats = pipeline.check_urls('db', urls, fetch_workers=2,
+                                parse_workers=1, queue_size=1, batch_size=2)
+
+    [(url_id, data, _)] = mock_url_db.create_checks.call_args.args[1]
+    failed = {call.args[1:]
+              for call in mock_url_db.record_failed_check.call_args_list}
+
+    assert (stats.checked, stats.failed, stats.not_written) == (1, 2, 0)
+    assert url_id == 1
+    assert data['title'] == 'http://one.test'
+    assert failed == {(2, None), (3, 404)}
+    assert mock_url_db.open_connection.call_count == 2
+
+
+def test_check_urls_write_error(sites, mock_url_db):
+    mock_url_db.record_failed_check.side_effect = psycopg2.Error
+
+    stats = pipeline.check_urls('db', [(2, 'http://down.test')],
+                                parse_workers=1)
+
+    assert stats.not_written == 1
+    assert mock_url_db.close_connection.called
+
+
+def test_check_urls_write_unexpected_error(sites, mock_url_db):
+    mock_url_db.record_failed_check.side_effect = KeyError
+
+    stats = pipeline.check_urls('db', [(1, 'http://one.test'),
+                                       (2, 'http://down.test')],
+                                parse_workers=1)
+
+    assert stats.not_written == 2
+    assert mock_url_db.open_connection.return_value.rollback.called
+    assert mock_url_db.close_connection.called
+
+
+def test_check_urls_unexpected_error(sites, mock_url_db, monkeypatch, caplog):
+    def store_response(response):
+        if 'broken' in response.url:
+            raise OSError
+        return None
+
+    monkeypatch.setattr('page_analyzer.pipeline.archive.store_response',
+                        store_response)
+    urls = [(1, 'http://one.test'), (2, 'http://broken.test')]
+
+    stats = pipeline.check_urls('db', urls, parse_workers=1)
+
+    failed = [call.args[1:]
+              for call in mock_url_db.record_failed_check.call_args_list]
+    assert (stats.checked, stats.failed) == (1, 1)
+    assert failed == [(2, None)]
+    assert pipeline.CHECK_ERROR_MESSAGE % 'http://broken.test' in caplog.text
+
+
+def test_check_urls_interrupted_writes_finished(sites, mock_url_db):
+    def urls():
+        yield 1, 'http://one.test'
+        yield 2, 'http://two.test'
+        raise KeyError
+
+    with pytest.raises(KeyError):
+        pipeline.check_urls('db', urls(), parse_workers=1, queue_size=1)
+
+    [(url_id, _, _)] = mock_url_db.create_checks.call_args.args[1]
+    assert url_id == 1
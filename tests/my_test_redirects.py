@@ -0,0 +1,61 @@
+import pytest
+import requests
+
+from page_analyzer import cache
+from page_analyzer import redirects
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    cache.clear_caches()
+    yield
+    cache.clear_caches()
+
+
+def make_response(url, chain):
+    response = requests.Response()
+    response.url = url
+    response.history = []
+    for status_code, hop_url in chain:
+        hop = requests.Response()
+        hop.status_code = status_code
+        hop.url = hop_url
+        response.history.append(hop)
+    return response
+
+
+def test_cache_redirect_permanent_prefix():
+    chain = [(301, 'http://example.com/'),
+             (308, 'https://example.com/'),
+             (302, 'https://www.example.com/'),
+             (301, 'https://www.example.com/en')]
+    response = make_response('https://www.example.com/en/', chain)
+
+    redirects.cache_redirect('http://example.com', response)
+
+    assert redirects.get_cached_redirect('http://example.com') == (
+        'https://www.example.com/', chain[:2])
+
+
+def test_cache_redirect_temporary():
+    redirects.cache_redirect(
+        'http://example.com',
+        make_response('https://example.com/', [(301, 'http://example.com/')]))
+
+    redirects.cache_redirect(
+        'http://example.com',
+        make_response('https://example.com/a', [(302, 'http://example.com/')]))
+
+    assert redirects.get_cached_redirect('http://example.com') is None
+    assert redirects.get_redirect_cache_stats()['invalidations'] == 1
+
+
+def test_restore_chain():
+    chain = [(301, 'http://example.com/')]
+    response = make_response('https://example.com/',
+                             [(302, 'https://example.com/')])
+
+    redirects.restore_chain(response, chain)
+
+    assert redirects.get_redirect_chain(response) == [
+        (301, 'http://example.com/'), (302, 'https://example.com/')]
@@ -0,0 +1,53 @@
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+
+from page_analyzer import archive
+from page_analyzer import reparse
+
+
+@pytest.fixture()
+def mock_url_db(monkeypatch):
+    mock = MagicMock()
+    mock.update_archived_checks.side_effect = lambda connection, batch: len(
+        batch)
+    monkeypatch.setattr('page_analyzer.reparse.url_db', mock)
+    return mock
+
+
+def store_page(archive_dir, url, body, encoding='utf-8'):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.encoding = encoding
+    response._content = body
+    return archive.store_response(response, str(archive_dir))
+
+
+def test_parse_segment(tmp_path):
+    key = store_page(tmp_path, 'https://example.com/',
+                     '<h1>Привет</h1>'.encode('cp1251'), 'cp1251')
+
+    [(parsed_key, data)] = reparse.parse_segment(
+        archive.list_segments(str(tmp_path))[0])
+
+    assert parsed_key == key
+    assert data['h1'] == 'Привет'
+
+
+def test_reparse_archive(tmp_path, monkeypatch, mock_url_db):
+    monkeypatch.setattr(archive, 'ARCHIVE_SEGMENT_MB', 2 / 2**20)
+    keys = [store_page(tmp_path, f'https://site{number}.test/',
+                       f'<title>{number}</title>'.encode())
+            for number in range(3)]
+
+    stats = reparse.reparse_archive('db', str(tmp_path), parse_workers=1,
+                                    batch_size=2)
+
+    written = [(key, data['title'])
+               for call in mock_url_db.update_archived_checks.call_args_list
+               for key, data in call.args[1]]
+    assert (stats.segments, stats.records, stats.updated_checks) == (3, 3, 3)
+    assert written == [(key, str(number)) for number, key in enumerate(keys)]
+    assert mock_url_db.close_connection.called
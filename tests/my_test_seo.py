@@ -0,0 +1,97 @@
+import pytest
+
+from page_analyzer import seo
+from page_analyzer import webutils
+
+PAGE = '''<!DOCTYPE html>
+<html lang="ru">
+<head>
+    <title> Example
+        page </title>
+    <meta name="Description" content="About">
+    <meta name="robots" content="NoIndex, nofollow">
+    <meta property="og:title" content="OG title">
+    <meta property="og:image" content="/og.png">
+    <link rel="canonical" href="/page">
+</head>
+<body>
+    <h1>Main <b>title</b></h1>
+    <h1>Second</h1>
+    <h2>Section</h2>
+    <a href="/about">About</a>
+    <a href="#top">Top</a>
+    <a href="https://example.com/">Home</a>
+    <a href="https://other.org/">Other</a>
+    <a href="mailto:mail@example.com">Mail</a>
+    <a>No link</a>
+    <img src="/a.png" alt="A">
+    <img src="/b.png" alt=" ">
+    <img src="/c.png">
+</body>
+</html>'''
+
+
+def test_parse_seo():
+    result = seo.parse_seo(PAGE, 'https://www.example.com/page?q=1')
+
+    assert result == {'h1': 'Main title',
+                      'title': 'Example page',
+                      'description': 'About',
+                      'lang': 'ru',
+                      'canonical': 'https://www.example.com/page',
+                      'robots': 3,
+                      'h1_count': 2,
+                      'h2_count': 1,
+                      'internal_links': 3,
+                      'external_links': 1,
+                      'images': 3,
+                      'images_with_alt': 1,
+                      'open_graph': {'og:title': 'OG title',
+                                     'og:image': '/og.png'}}
+
+
+def test_parse_seo_empty_page():
+    result = seo.parse_seo('')
+
+    assert result['h1'] is None
+    assert result['robots'] is None
+    assert result['internal_links'] == 0
+
+
+@pytest.mark.parametrize('content', [
+    '<h1>Title<p>Body</p></body></html>',
+    '<h1>\n  Title\n<div>Body</div>',
+    '<html><body><h1>Title</body></html>',
+    '<h1>Title',
+    '<h1>A <b>B</b><h2>C</h2>',
+])
+def test_parse_seo_unclosed_h1_matches_basic_parse(content):
+    result = seo.parse_seo(content)
+
+    assert result['h1'] == webutils._parse_basic(content)['h1']
+    assert result['h1'] in ('Title', 'A B')
+
+
+def test_parse_seo_oversized_values():
+    headings = '<h1>a</h1>' * 33000
+    result = seo.parse_seo(f'<html lang="{"a" * 50}">{headings}<h2></h2>')
+
+    assert result['lang'] == 'a' * seo.MAX_LANG_LENGTH
+    assert result['h1_count'] == seo.MAX_HEADING_COUNT
+    assert result['h2_count'] == 1
+
+
+def test_parse_seo_long_title():
+    result = seo.parse_seo(f'<title>{"a" * 300}</title>')
+
+    assert len(result['title']) == seo.MAX_TEXT_LENGTH
+
+
+@pytest.mark.parametrize('content, robots', [
+    ('index, follow', 0),
+    ('noindex', 1),
+    ('none', 3),
+    ('noarchive,nosnippet,noimageindex', 28),
+])
+def test_parse_robots(content, robots):
+    assert seo.parse_robots(content) == robots
@@ -0,0 +1,125 @@
+import multiprocessing
+import sqlite3
+from unittest.mock import MagicMock
+
+import pytest
+
+from page_analyzer import cache
+from page_analyzer import shared_cache
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    mock = MagicMock(return_value=100.0)
+    monkeypatch.setattr('page_analyzer.shared_cache.time.time', mock)
+    return mock
+
+
+def set_in_child(cache_dir):
+    shared_cache.SharedCache('test', cache_dir=cache_dir).set('a', [1, 'b'])
+
+
+def test_get_set_success(tmp_path):
+    shared = shared_cache.SharedCache('test', maxsize=2,
+                                      cache_dir=str(tmp_path))
+    shared.set('a', (1, [(301, 'https://a.com')]))
+
+    assert shared.get('a') == (1, [(301, 'https://a.com')])
+    assert shared.get('b') is None
+    assert shared.stats()['hits'] == 1
+    assert shared.stats()['misses'] == 1
+    assert shared.stats()['size'] == 1
+
+
+def test_eviction_least_recently_used(tmp_path, monkeypatch):
+    clock_ns = MagicMock(return_value=1_000_000_000)
+    monkeypatch.setattr('page_analyzer.shared_cache.time.time_ns', clock_ns)
+    shared = shared_cache.SharedCache('test', maxsize=2,
+                                      cache_dir=str(tmp_path))
+    shared.set('a', 1)
+    clock_ns.return_value += 1
+    shared.set('b', 2)
+    clock_ns.return_value += 2_000_000_000
+    shared.get('a')
+    clock_ns.return_value += 1
+    shared.set('c', 3)
+
+    assert shared.get('b') is None
+    assert shared.get('a') == 1
+    assert shared.get('c') == 3
+    assert shared.stats()['evictions'] == 1
+    assert shared.stats()['size'] == 2
+
+
+def test_get_writes_access_time_lazily(tmp_path):
+    shared = shared_cache.SharedCache('test', cache_dir=str(tmp_path))
+    shared.set('a', 1)
+    connection = shared_cache._get_connection(shared.path)
+    changes = connection.total_changes
+
+    assert shared.get('a') == 1
+    assert connection.total_changes == changes
+
+
+def test_expiration(tmp_path, clock):
+    shared = shared_cache.SharedCache('test', ttl=10,
+                                      cache_dir=str(tmp_path))
+    shared.set('a', 1)
+    clock.return_value = 111.0
+
+    assert shared.get('a') is None
+    assert shared.stats()['expirations'] == 1
+    assert shared.stats()['size'] == 0
+
+
+def test_delete_and_clear(tmp_path):
+    shared = shared_cache.SharedCache('test', cache_dir=str(tmp_path))
+    other = shared_cache.SharedCache('other', cache_dir=str(tmp_path))
+    shared.set('a', 1)
+    shared.set('b', 2)
+    other.set('b', 3)
+    shared.delete('a')
+    shared.delete('missing')
+
+    assert shared.get('a') is None
+    assert shared.stats()['invalidations'] == 1
+
+    shared.clear()
+
+    assert shared.get('b') is None
+    assert other.get('b') == 3
+
+
+def test_shared_between_processes(tmp_path):
+    process = multiprocessing.get_context('fork').Process(
+        target=set_in_child, args=(str(tmp_path),))
+    process.start()
+    process.join()
+
+    shared = shared_cache.SharedCache('test', cache_dir=str(tmp_path))
+    assert shared.get('a') == [1, 'b']
+
+
+def test_error_is_a_miss(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr('page_analyzer.shared_cache._get_connection',
+                        MagicMock(side_effect=sqlite3.OperationalError))
+    shared = shared_cache.SharedCache('test', cache_dir=str(tmp_path))
+    shared.set('a', 1)
+
+    assert shared.get('a') is None
+    assert shared.stats()['misses'] == 1
+    assert shared.stats()['sets'] == 0
+    assert 'The shared cache test failed' in caplog.text
+
+
+def test_get_cache_shared_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr('page_analyzer.cache._caches', {})
+    monkeypatch.setattr('page_analyzer.shared_cache.CACHE_DIR',
+                        str(tmp_path))
+    monkeypatch.setenv('CACHE_BACKEND', 'shared')
+
+    backend = cache.get_cache('test', maxsize=5, ttl=60)
+
+    assert isinstance(backend, shared_cache.SharedCache)
+    assert backend.path == tmp_path / shared_cache.DATABASE_NAME
+    assert (backend.maxsize, backend.ttl) == (5, 60)
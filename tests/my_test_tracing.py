@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from page_analyzer import tracing
+
+
+@pytest.fixture()
+def sampled(monkeypatch, tmp_path):
+    path = tmp_path / 'traces.jsonl'
+    monkeypatch.setattr(tracing, 'TRACE_SAMPLE_RATE', 1)
+    monkeypatch.setattr(tracing, 'TRACE_EXPORT_FILE', str(path))
+    return path
+
+
+@tracing.traced('stage')
+def stage(fail=False):
+    with tracing.span('nested', tracing.CLIENT, size=3):
+        if fail:
+            raise ValueError('failed')
+
+
+def test_not_sampled(monkeypatch):
+    monkeypatch.setattr(tracing, 'TRACE_SAMPLE_RATE', 0)
+    monkeypatch.setattr(tracing, 'SERVER_TIMING', False)
+
+    root = tracing.start_trace('GET /')
+    stage()
+
+    assert root is None
+    assert tracing.get_current_span() is None
+    assert tracing.get_server_timing() is None
+
+
+def test_nested_spans_export(sampled):
+    root = tracing.start_trace('POST /urls/<int:id>/checks',
+                               attributes={'http.method': 'POST'})
+    stage()
+    with pytest.raises(ValueError):
+        stage(fail=True)
+    server_timing = tracing.get_server_timing()
+    tracing.end_trace()
+
+    request, = [json.loads(line) for line in sampled.read_text().splitlines()]
+    spans = request['resourceSpans'][0]['scopeSpans'][0]['spans']
+    by_name = {}
+    for span in spans:
+        by_name.setdefault(span['name'], []).append(span)
+
+    assert [span['name'] for span in spans] == \
+        ['POST /urls/<int:id>/checks', 'stage', 'nested', 'stage', 'nested']
+    assert spans[0]['spanId'] == root.span_id
+    assert 'parentSpanId' not in spans[0]
+    assert by_name['stage'][0]['parentSpanId'] == root.span_id
+    assert by_name['nested'][0]['parentSpanId'] == \
+        by_name['stage'][0]['spanId']
+    assert by_name['nested'][0]['kind'] == tracing.CLIENT
+    assert by_name['nested'][0]['attributes'] == \
+        [{'key': 'size', 'value': {'intValue': '3'}}]
+    assert by_name['stage'][1]['status']['code'] == tracing.STATUS_ERROR
+    assert len({span['traceId'] for span in spans}) == 1
+    assert server_timing.startswith('stage;dur=')
+    assert 'nested;dur=' in server_timing
+    assert 'total;dur=' in server_timing
+    assert tracing.get_current_span() is None
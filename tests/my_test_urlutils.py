@@ -1,3 +1,5 @@
+import pytest
+
 from page_analyzer import urlutils
 
 
@@ -24,3 +26,50 @@ def test_normalize_url_success():
     normalized_url = 'https://www.example.com'
 
     assert normalized_url == urlutils.normalize_url(non_normalized_url)
+
+
+def test_validate_urls_success():
+    urls = ['https://www.example.com/', '', 'www.example.com', 'http://[::1']
+
+    reports = urlutils.validate_urls(urls)
+
+    assert [report.url for report in reports] == urls
+    assert reports[0].is_valid
+    assert reports[0].normalized_url == 'https://www.example.com'
+    assert reports[1].errors == ('URL обязателен',)
+    assert reports[2].errors == ('Некорректный URL',)
+    assert reports[3].errors == ('Некорректный URL',)
+    assert reports[3].normalized_url is None
+
+
+def test_validate_urls_matches_validate_url():
+    urls = ['https://www.example.com/', 'http://localhost', 'ftp://host.com',
+            'http://' + (255 * 'a') + '.com', 'http://', 'example']
+
+    reports = urlutils.validate_urls(urls)
+
+    assert [list(report.errors) for report in reports] == \
+        [urlutils.validate_url(url) for url in urls]
+
+
+def test_normalize_urls_success():
+    urls = ['hTTps://WwW.eXAmple.Com/example', 'http://example.com:8000/a']
+
+    assert urlutils.normalize_urls(urls) == \
+        [urlutils.normalize_url(url) for url in urls]
+
+
+@pytest.mark.parametrize('url', ['not a url', '', 'http://', 'example'])
+def test_analyze_url_invalid_not_normalized(url):
+    report = urlutils.analyze_url(url)
+
+    assert not report.is_valid
+    assert report.normalized_url is None
+
+
+def test_analyze_url_memoized():
+    urlutils.analyze_url.cache_clear()
+
+    urlutils.validate_urls(['https://example.com'] * 3)
+
+    assert urlutils.analyze_url.cache_info().hits == 2
@@ -1,8 +1,10 @@
+import threading
 from unittest.mock import MagicMock
 
 import pytest
 import requests
 
+from page_analyzer import cache
 from page_analyzer import webutils
 
 
@@ -11,6 +13,7 @@ class FakeResponse:
         with open('tests/fixtures/sample.html') as file:
             html = file.read()
         self.text = html
+        self.content = html.encode()
         self.status_code = 200
         self.bad = bad
 
@@ -25,7 +28,7 @@ class FakeResponse:
 def client(monkeypatch):
     mock = MagicMock()
     mock.return_value = FakeResponse()
-    monkeypatch.setattr('page_analyzer.webutils.requests.get', mock)
+    monkeypatch.setattr('requests.Session.get', mock)
     return mock
 
 
@@ -33,7 +36,7 @@ def client(monkeypatch):
 def bad_client(monkeypatch):
     mock = MagicMock()
     mock.return_value = FakeResponse(bad=True)
-    monkeypatch.setattr('page_analyzer.webutils.requests.get', mock)
+    monkeypatch.setattr('requests.Session.get', mock)
     return mock
 
 
@@ -57,13 +60,130 @@ class TestGetSiteResponse:
             webutils.get_site_response(self.url)
 
 
+def test_get_session_per_thread():
+    sessions = []
+    thread = threading.Thread(
+        target=lambda: sessions.append(webutils.get_session()))
+    thread.start()
+    thread.join()
+
+    assert webutils.get_session() is webutils.get_session()
+    assert sessions[0] is not webutils.get_session()
+
+
+def test_get_site_response_drops_cookies(monkeypatch):
+    def get(session, url, **kwargs):
+        session.cookies.set('visited', url)
+        return FakeResponse()
+
+    monkeypatch.setattr('requests.Session.get', get)
+
+    webutils.get_site_response('http://example.com')
+
+    assert not webutils.get_session().cookies
+
+
 def test_parse_html_response_success(fakeresponse):
     response = fakeresponse
     result_data = {'status_code': 200,
                    'h1': 'Example - simple html',
                    'title': 'Example',
-                   'description': 'Example — just html to check'}
+                   'description': 'Example — just html to check',
+                   'redirects': None,
+                   'final_url': None}
 
     result = webutils.parse_html_response(response)
 
     assert result_data == result
+
+
+def test_parse_html_response_extended(fakeresponse):
+    fakeresponse.url = 'https://example.com/'
+
+    result = webutils.parse_html_response(fakeresponse, extended=True)
+
+    assert result['h1'] == 'Example - simple html'
+    assert result['title'] == 'Example'
+    assert result['description'] == 'Example — just html to check'
+    assert result['lang'] == 'en'
+    assert result['h1_count'] == 1
+    assert result['open_graph'] is None
+
+
+def test_parse_html_response_extended_setting(monkeypatch, fakeresponse):
+    monkeypatch.setattr(webutils, 'EXTENDED_PARSE', True)
+
+    result = webutils.parse_html_response(fakeresponse)
+
+    assert 'canonical' in result
+    assert 'canonical' not in webutils.parse_html_response(fakeresponse,
+                                                           extended=False)
+
+
+def make_redirected_response(url, chain, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = url
+    response._content = b'<h1>Moved</h1>'
+    response.history = []
+    for hop_status, hop_url in chain:
+        hop = requests.Response()
+        hop.status_code = hop_status
+        hop.url = hop_url
+        response.history.append(hop)
+    return response
+
+
+class TestRedirects:
+    url = 'http://example.com'
+    final_url = 'https://www.example.com/'
+    chain = [(301, 'http://example.com/'), (308, 'https://example.com/')]
+
+    @pytest.fixture(autouse=True)
+    def clear_caches(self):
+        cache.clear_caches()
+        yield
+        cache.clear_caches()
+
+    def test_cached_redirect_skips_chain(self, monkeypatch):
+        mock = MagicMock(side_effect=[
+            make_redirected_response(self.final_url, self.chain),
+            make_redirected_response(self.final_url, [])])
+        monkeypatch.setattr('requests.Session.get', mock)
+
+        webutils.get_site_response(self.url)
+        response = webutils.get_site_response(self.url)
+        result = webutils.parse_html_response(response)
+
+        assert mock.call_args.args == (self.final_url,)
+        assert result['redirects'] == self.chain
+        assert result['final_url'] == self.final_url
+
+    def test_unreachable_target_follows_chain(self, monkeypatch):
+        mock = MagicMock(side_effect=[
+            make_redirected_response(self.final_url, self.chain),
+            requests.ConnectionError,
+            make_redirected_response(self.final_url, self.chain)])
+        monkeypatch.setattr('requests.Session.get', mock)
+
+        webutils.get_site_response(self.url)
+        response = webutils.get_site_response(self.url)
+
+        assert mock.call_args.args == (self.url,)
+        assert response.history[0].url == 'http://example.com/'
+
+    def test_target_error_status_is_not_fetched_again(self, monkeypatch):
+        mock = MagicMock(side_effect=[
+            make_redirected_response(self.final_url, self.chain),
+            make_redirected_response(self.final_url, [], status_code=404),
+            make_redirected_response(self.final_url, self.chain)])
+        monkeypatch.setattr('requests.Session.get', mock)
+
+        webutils.get_site_response(self.url)
+        with pytest.raises(requests.HTTPError):
+            webutils.get_site_response(self.url)
+
+        assert mock.call_count == 2
+        assert mock.call_args.args == (self.final_url,)
+        webutils.get_site_response(self.url)
+        assert mock.call_args.args == (self.url,)
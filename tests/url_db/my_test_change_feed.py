@@ -0,0 +1,151 @@
+import json
+import os
+import queue
+from unittest.mock import MagicMock
+
+import dotenv
+import pytest
+
+from page_analyzer import cache
+from page_analyzer.url_db import change_feed
+from page_analyzer.url_db import db_operations
+from page_analyzer.url_db import url_cache
+
+dotenv.load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL', '')
+
+
+@pytest.fixture()
+def enabled(monkeypatch):
+    monkeypatch.setattr('page_analyzer.url_db.change_feed.CHANGE_FEED', True)
+    monkeypatch.setattr('page_analyzer.url_db.change_feed.CHANGE_FEED_CHANNEL',
+                        'page_analyzer_test')
+
+
+@pytest.fixture()
+def events():
+    received = queue.Queue()
+    change_feed.add_handler(received.put)
+    yield received
+    change_feed.remove_handler(received.put)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    cache.clear_caches()
+    yield
+    cache.clear_caches()
+
+
+def test_notify_disabled(monkeypatch):
+    mock = MagicMock()
+    monkeypatch.setattr('page_analyzer.url_db.change_feed.db_operations',
+                        mock)
+    monkeypatch.setattr('page_analyzer.url_db.change_feed.CHANGE_FEED', False)
+
+    change_feed.notify(MagicMock(), [{'table': 'urls', 'url_id': 1}])
+
+    assert not mock.execute_query.called
+
+
+def test_notify(monkeypatch, enabled):
+    mock = MagicMock()
+    monkeypatch.setattr('page_analyzer.url_db.change_feed.db_operations',
+                        mock)
+
+    change_feed.notify(MagicMock(), [{'table': 'url_checks', 'url_id': 1},
+                                     {'table': 'url_checks', 'url_id': 2}])
+
+    params = mock.execute_query.call_args.kwargs['params']
+    assert params['channel'] == 'page_analyzer_test'
+    assert [json.loads(payload) for payload in params['payloads']] == [
+        {'table': 'url_checks', 'url_id': 1},
+        {'table': 'url_checks', 'url_id': 2}]
+
+
+def test_dispatch_survives_handler_error(events, caplog):
+    failing = MagicMock(side_effect=KeyError)
+    change_feed.add_handler(failing)
+    try:
+        change_feed.dispatch('{"table": "url_checks", "url_id": 1}')
+    finally:
+        change_feed.remove_handler(failing)
+
+    assert events.get_nowait() == {'table': 'url_checks', 'url_id': 1}
+    assert change_feed.HANDLER_ERROR_MESSAGE in caplog.text
+
+
+def test_dispatch_skips_malformed_payload(events, caplog):
+    change_feed.dispatch('{"table": ')
+
+    assert events.empty()
+    assert change_feed.PAYLOAD_ERROR_MESSAGE in caplog.text
+
+
+def test_listener_survives_any_error(monkeypatch, caplog):
+    monkeypatch.setattr('page_analyzer.url_db.change_feed.RECONNECT_SECONDS',
+                        0)
+    listener = change_feed.ChangeListener(DATABASE_URL)
+    calls = []
+
+    def listen():
+        calls.append(listen)
+        if len(calls) == 1:
+            raise ValueError
+        listener._stopped.set()
+
+    monkeypatch.setattr(listener, '_listen', listen)
+    listener._run()
+
+    assert len(calls) == 2
+    assert change_feed.LISTEN_ERROR_MESSAGE in caplog.text
+
+
+def test_update_caches():
+    change_feed.update_caches({'table': 'url_checks', 'url_id': 1})
+    change_feed.update_caches({'table': 'urls', 'url_id': 2,
+                               'name': 'https://feed.test'})
+
+    assert url_cache.get_cached_url_id('https://feed.test') == 2
+
+
+def test_listener_receives_committed_events(enabled, events):
+    listener = change_feed.ChangeListener(DATABASE_URL)
+    listener.start()
+    connection = db_operations.open_connection(DATABASE_URL)
+    try:
+        # the listener may not listen yet, repeat until it gets one
+        for _ in range(50):
+            change_feed.notify(connection, [{'table': 'urls', 'url_id': 3,
+                                             'name': 'https://feed.test'}])
+            connection.commit()
+            try:
+                event = events.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+    finally:
+        connection.close()
+        listener.stop()
+
+    assert event == {'table': 'urls', 'url_id': 3,
+                     'name': 'https://feed.test'}
+    assert url_cache.get_cached_url_id('https://feed.test') == 3
+
+
+def test_start_listener_once_per_process(monkeypatch):
+    listener_class = MagicMock()
+    monkeypatch.setattr('page_analyzer.url_db.change_feed.ChangeListener',
+                        listener_class)
+    monkeypatch.setattr('page_analyzer.url_db.change_feed._listener', None)
+    listener_class.return_value.pid = os.getpid()
+
+    change_feed.start_listener('db')
+    change_feed.start_listener('db')
+    assert listener_class.call_count == 1
+
+    listener_class.return_value.pid = -1
+    change_feed.start_listener('db')
+    assert listener_class.call_count == 2
+    assert listener_class.return_value.start.call_count == 2
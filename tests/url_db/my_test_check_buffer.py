@@ -0,0 +1,163 @@
+import threading
+from unittest.mock import MagicMock
+
+import psycopg2
+import pytest
+
+from page_analyzer.url_db import check_buffer
+
+
+@pytest.fixture()
+def mock_db_operations(monkeypatch):
+    mock = MagicMock()
+    monkeypatch.setattr('page_analyzer.url_db.check_buffer.db_operations',
+                        mock)
+    return mock
+
+
+@pytest.fixture()
+def mock_url_db_operations(monkeypatch):
+    mock = MagicMock()
+    monkeypatch.setattr(
+        'page_analyzer.url_db.check_buffer.url_db_operations', mock)
+    return mock
+
+
+def get_written_url_ids(mock_url_db_operations):
+    return [[url_id for url_id, _, _ in call.args[1]]
+            for call in mock_url_db_operations.create_checks.call_args_list]
+
+
+def test_flush_by_size(mock_db_operations, mock_url_db_operations):
+    buffer = check_buffer.CheckBuffer('db', size=2, seconds=60)
+
+    futures = [buffer.add(url_id, {'status_code': 200})
+               for url_id in (1, 2, 3)]
+    futures[1].result(timeout=5)
+
+    assert get_written_url_ids(mock_url_db_operations) == [[1, 2]]
+    assert not futures[2].done()
+    buffer.close()
+    assert get_written_url_ids(mock_url_db_operations) == [[1, 2], [3]]
+    assert mock_db_operations.close_connection.call_count == 2
+
+
+def test_flush_by_time(mock_db_operations, mock_url_db_operations):
+    buffer = check_buffer.CheckBuffer('db', size=100, seconds=0.01)
+
+    buffer.add(1, {'status_code': 200}).result(timeout=5)
+
+    assert get_written_url_ids(mock_url_db_operations) == [[1]]
+    buffer.close()
+
+
+def test_flush(mock_db_operations, mock_url_db_operations):
+    buffer = check_buffer.CheckBuffer('db', size=2, seconds=60)
+    futures = [buffer.add(url_id, {'status_code': 200})
+               for url_id in (1, 2, 3)]
+
+    buffer.flush()
+
+    assert all(future.done() for future in futures)
+    assert get_written_url_ids(mock_url_db_operations) == [[1, 2], [3]]
+    buffer.close()
+
+
+def test_add_waits_for_room(mock_db_operations, mock_url_db_operations):
+    written = threading.Event()
+    mock_url_db_operations.create_checks.side_effect = (
+        lambda connection, checks: written.wait(5))
+    buffer = check_buffer.CheckBuffer('db', size=1, seconds=60,
+                                      max_pending=1)
+    buffer.add(1, {'status_code': 200})
+    buffer.add(2, {'status_code': 200})
+    added = threading.Event()
+    threading.Thread(target=lambda: (buffer.add(3, {'status_code': 200}),
+                                     added.set())).start()
+
+    assert not added.wait(0.1)
+    written.set()
+    assert added.wait(5)
+    buffer.close()
+
+
+def test_write_error(mock_db_operations, mock_url_db_operations):
+    mock_url_db_operations.create_checks.side_effect = psycopg2.Error
+    buffer = check_buffer.CheckBuffer('db', size=1)
+
+    future = buffer.add(1, {'status_code': 200})
+
+    with pytest.raises(psycopg2.Error):
+        future.result(timeout=5)
+    buffer.close()
+    assert mock_db_operations.open_connection.return_value.rollback.called
+
+
+def test_write_error_fails_only_bad_check(mock_db_operations,
+                                          mock_url_db_operations):
+    def create_checks(connection, checks):
+        if any(url_id == 2 for url_id, _, _ in checks):
+            raise psycopg2.Error
+
+    mock_url_db_operations.create_checks.side_effect = create_checks
+    buffer = check_buffer.CheckBuffer('db', size=3, seconds=60)
+
+    futures = [buffer.add(url_id, {'status_code': 200})
+               for url_id in (1, 2, 3)]
+
+    futures[0].result(timeout=5)
+    futures[2].result(timeout=5)
+    with pytest.raises(psycopg2.Error):
+        futures[1].result(timeout=5)
+    buffer.close()
+    assert get_written_url_ids(mock_url_db_operations) == [
+        [1, 2, 3], [1], [2], [3]]
+
+
+def test_write_error_rolls_back(mock_db_operations, mock_url_db_operations):
+    def create_checks(connection, checks):
+        if any(url_id == 2 for url_id, _, _ in checks):
+            raise KeyError('status_code')
+
+    mock_url_db_operations.create_checks.side_effect = create_checks
+    buffer = check_buffer.CheckBuffer('db', size=2, seconds=60)
+
+    futures = [buffer.add(url_id, {'status_code': 200}) for url_id in (1, 2)]
+
+    with pytest.raises(KeyError):
+        futures[1].result(timeout=5)
+    buffer.close()
+    connection = mock_db_operations.open_connection.return_value
+    # the batch and the retry of the bad check
+    assert connection.rollback.call_count == 2
+    assert mock_db_operations.close_connection.call_count == 3
+
+
+def test_asynchronous_commit(mock_db_operations, mock_url_db_operations):
+    buffer = check_buffer.CheckBuffer('db', size=1,
+                                      synchronous_commit=False)
+
+    buffer.add(1, {'status_code': 200}).result(timeout=5)
+    buffer.close()
+
+    query = mock_db_operations.execute_query.call_args.kwargs['query']
+    assert query is check_buffer.ASYNC_COMMIT_QUERY
+
+
+def test_closed_buffer(mock_db_operations, mock_url_db_operations):
+    buffer = check_buffer.CheckBuffer('db')
+    buffer.close()
+
+    with pytest.raises(RuntimeError):
+        buffer.add(1, {'status_code': 200})
+
+
+def test_close_check_buffer(mock_db_operations, mock_url_db_operations):
+    buffer = check_buffer.get_check_buffer('db')
+    future = buffer.add(1, {'status_code': 200})
+
+    check_buffer.close_check_buffer()
+
+    assert future.done()
+    assert check_buffer.get_check_buffer('db') is not buffer
+    check_buffer.close_check_buffer()
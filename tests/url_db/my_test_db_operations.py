@@ -1,4 +1,5 @@
 import os
+import typing as t
 
 import dotenv
 import psycopg2
@@ -36,6 +37,18 @@ def test_generate_selection_string_success(connection):
     assert result.as_string(connection) == expected_string
 
 
+def test_generate_joining_string_success(connection):
+    joining = (('url_checks', 'content_id'), ('check_contents', 'id'))
+
+    expected = sql.SQL('LEFT JOIN "check_contents" ON '
+                       '"url_checks"."content_id" = "check_contents"."id"\n')
+    expected_string = expected.as_string(connection)
+
+    result = db_operations._generate_joining_string(joining=joining)
+
+    assert result.as_string(connection) == expected_string
+
+
 def test_generate_filtering_string_success(connection):
     condition = (('urls', 'id'), 1)
 
@@ -99,6 +112,27 @@ class TestInsertData:
 
         assert data['name'] in returning[0].name  # type: ignore
 
+    def test_insert_data_conflict(self, connection):
+        table = 'check_contents'
+        fields = ['digest']
+        data = {'digest': b'digest'}
+
+        first = db_operations.insert_data(connection=connection,
+                                          table=table,
+                                          fields=fields,
+                                          data=data,
+                                          returning=['id'],
+                                          conflict=['digest'])
+        second = db_operations.insert_data(connection=connection,
+                                           table=table,
+                                           fields=fields,
+                                           data=data,
+                                           returning=['id'],
+                                           conflict=['digest'])
+
+        assert len(first) == 1  # type: ignore
+        assert second == []
+
     def test_insert_error(self, connection):
         false_table = 'url'
         fields = ['name']
@@ -144,6 +178,21 @@ class TestSelectData:
 
         assert data['name'] in result_2[0].name  # type: ignore
 
+    def test_select_data_row_type(self, connection):
+        Name = t.NamedTuple('Name', name=str)
+        db_operations.insert_data(connection=connection,
+                                  table='urls',
+                                  fields=['name'],
+                                  data={'name': 'https://rows.example.com'})
+
+        result = db_operations.select_data(connection=connection,
+                                           table='urls',
+                                           fields=[('urls', 'name')],
+                                           row_type=Name)
+
+        assert result == [Name('https://rows.example.com')]
+        assert type(result[0]) is Name
+
     def test_select_data_error(self, connection):
         false_table = 'url'
         selection_fields: list[tuple[str, str]]
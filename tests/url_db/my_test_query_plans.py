@@ -0,0 +1,155 @@
+import os
+
+import dotenv
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import NamedTupleCursor
+import pytest
+
+from benchmarks import synthetic_db
+from page_analyzer.url_db import db_operations
+from page_analyzer.url_db import rollups
+from page_analyzer.url_db import url_db_operations
+
+dotenv.load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL', '')
+DATABASE_SQL = os.path.join(os.path.dirname(__file__), '..', '..',
+                            'database.sql')
+SCHEMA = 'query_plans_test'
+SPEC = synthetic_db.Spec(urls=20_000, checks=200_000, contents=2_000,
+                         days=90)
+
+# synthetic_db caps the checks of a URL at one per hour
+MAX_URL_CHECKS = SPEC.days * 24
+
+# statement: (expected index or None, estimated rows, table rows read),
+# timings depend on the machine, try them at scale with `make synthetic-db`
+BUDGETS = {
+    'check_url': ('urls_name_idx', 1, 1),
+    'get_url': ('urls_pkey', 1, 1),
+    'find_content_id': ('check_contents_digest_key', 1, 1),
+    # checks of the busiest URL, estimated from the column statistics, and
+    # the contents hashed for the join
+    'get_url_checks': ('url_checks_url_id_created_at_idx',
+                       2 * MAX_URL_CHECKS, MAX_URL_CHECKS + SPEC.contents),
+    # every check of the busiest URL, the live page asks for a few
+    'get_new_url_checks': (None, 2 * MAX_URL_CHECKS,
+                           MAX_URL_CHECKS + SPEC.contents),
+    'get_urls.urls': (None, SPEC.urls, SPEC.urls),
+    # reads every check, the budget grows with SPEC.checks
+    'get_urls.url_checks': ('url_checks_url_id_created_at_idx',
+                            SPEC.urls, SPEC.checks),
+    # sums the ROLLUP_SHARDS rows of stats_totals
+    'get_stats.totals': (None, 1, rollups.ROLLUP_SHARDS),
+    # the groups of jsonb_each_text rows get the planner's default of 200,
+    # the days older than STATS_DAYS are filtered out of a sequential scan
+    'get_stats.daily': (None, 200, (SPEC.days + 1) * rollups.ROLLUP_SHARDS),
+}
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    connection = psycopg2.connect(DATABASE_URL,
+                                  cursor_factory=NamedTupleCursor)
+    connection.autocommit = True
+    cursor = connection.cursor()
+    schema = sql.Identifier(SCHEMA)
+    cursor.execute(sql.SQL('DROP SCHEMA IF EXISTS {} CASCADE; '
+                           'CREATE SCHEMA {};').format(schema, schema))
+    cursor.execute(sql.SQL('SET search_path TO {}').format(schema))
+    with open(DATABASE_SQL) as database_sql:
+        cursor.execute(database_sql.read())
+    synthetic_db.generate(connection, SPEC)
+    cursor.execute('SELECT url_id FROM url_status '
+                   'ORDER BY checks_count DESC LIMIT 1')
+    busiest_url_id = cursor.fetchone()[0]
+
+    yield connection, busiest_url_id
+
+    cursor.execute(sql.SQL('DROP SCHEMA {} CASCADE').format(schema))
+    connection.close()
+
+
+@pytest.fixture()
+def capture(monkeypatch):
+    """Record the statements executed by url_db_operations."""
+    statements = []
+    execute = db_operations._execute
+
+    def record(cursor, query, params=None):
+        statements.append(cursor.mogrify(query, params))
+        execute(cursor, query, params)
+
+    monkeypatch.setattr(db_operations, '_execute', record)
+    return statements
+
+
+def run_operations(connection, url_id):
+    """Call every reading operation, return the names of their
+    statements in the order they are executed."""
+    url_db_operations.check_url(connection, 'https://site7.example.com')
+    url_db_operations.get_url(connection, url_id)
+    url_db_operations._find_content_id(connection, bytes(32))
+    url_db_operations.get_url_checks(connection, url_id)
+    url_db_operations.get_new_url_checks(connection, url_id, 0)
+    url_db_operations.get_urls(connection)
+    url_db_operations.get_stats(connection)
+    return ['check_url', 'get_url', 'find_content_id', 'get_url_checks',
+            'get_new_url_checks', 'get_urls.urls', 'get_urls.url_checks',
+            'get_stats.totals', 'get_stats.daily']
+
+
+def explain(connection, statement):
+    cursor = connection.cursor()
+    cursor.execute(b'EXPLAIN (ANALYZE, FORMAT JSON) ' + statement)
+    return cursor.fetchone()[0][0]
+
+
+def get_index_names(node):
+    names = {node['Index Name']} if 'Index Name' in node else set()
+    for child in node.get('Plans', []):
+        names |= get_index_names(child)
+    return names
+
+
+def get_rows_read(node):
+    """Return the table rows the scans of the plan read, the ones their
+    filters removed included."""
+    rows = 0
+    if 'Relation Name' in node:
+        removed = node.get('Rows Removed by Filter', 0) + \
+            node.get('Rows Removed by Index Recheck', 0)
+        rows = (node['Actual Rows'] + removed) * node['Actual Loops']
+    return rows + sum(get_rows_read(child)
+                      for child in node.get('Plans', []))
+
+
+def get_plans(dataset, capture):
+    connection, url_id = dataset
+    names = run_operations(connection, url_id)
+    assert len(names) == len(capture)
+    return {name: explain(connection, statement)
+            for name, statement in zip(names, capture)}
+
+
+def test_query_plans_use_expected_indexes(dataset, capture):
+    plans = get_plans(dataset, capture)
+
+    for name, (index, _, _) in BUDGETS.items():
+        if index is not None:
+            assert index in get_index_names(plans[name]['Plan']), name
+
+
+def test_query_plans_stay_within_row_estimates(dataset, capture):
+    plans = get_plans(dataset, capture)
+
+    for name, (_, rows, _) in BUDGETS.items():
+        assert plans[name]['Plan']['Plan Rows'] <= rows, name
+
+
+def test_query_plans_stay_within_read_budgets(dataset, capture):
+    plans = get_plans(dataset, capture)
+
+    for name, (_, _, rows) in BUDGETS.items():
+        assert get_rows_read(plans[name]['Plan']) <= rows, name
@@ -0,0 +1,99 @@
+import datetime
+import typing as t
+from unittest.mock import MagicMock
+
+import psycopg2
+import pytest
+
+from page_analyzer.url_db import retention
+
+
+@pytest.fixture()
+def mock_db_operations(monkeypatch):
+    mock = MagicMock()
+    monkeypatch.setattr('page_analyzer.url_db.retention.db_operations', mock)
+    return mock
+
+
+@pytest.fixture()
+def mock_connection():
+    return MagicMock()
+
+
+Result = t.NamedTuple('Result', checks=int, days=int)
+Partition = t.NamedTuple('Partition', name=str)
+
+
+def test_roll_up_expired_checks_success(mock_db_operations, mock_connection):
+    mock_db_operations.execute_query.return_value = [Result(10, 3)]
+    before = datetime.datetime(2000, 1, 1)
+
+    result = retention.roll_up_expired_checks(mock_connection, before, 10)
+
+    call_kwargs = mock_db_operations.execute_query.call_args.kwargs
+
+    assert result == 10
+    assert call_kwargs['params'] == {'before': before, 'batch_size': 10}
+    assert call_kwargs['fetch']
+
+
+def test_roll_up_expired_checks_error(mock_db_operations, mock_connection):
+    mock_db_operations.execute_query.side_effect = psycopg2.Error
+
+    with pytest.raises(psycopg2.Error):
+        retention.roll_up_expired_checks(mock_connection,
+                                         datetime.datetime(2000, 1, 1))
+
+
+def test_apply_retention_batches(mock_db_operations, mock_connection):
+    mock_db_operations.execute_query.side_effect = (
+        [Result(2, 1)], [Result(2, 1)], [Result(1, 1)])
+
+    result = retention.apply_retention(mock_connection, batch_size=2)
+
+    assert result == 5
+    assert mock_connection.commit.call_count == 3
+
+
+def test_apply_retention_max_batches(mock_db_operations, mock_connection):
+    mock_db_operations.execute_query.return_value = [Result(2, 1)]
+
+    result = retention.apply_retention(mock_connection,
+                                       batch_size=2,
+                                       max_batches=2)
+
+    assert result == 4
+    assert mock_db_operations.execute_query.call_count == 2
+
+
+def test_drop_expired_partitions(mock_db_operations, mock_connection):
+    mock_db_operations.execute_query.side_effect = (
+        [Partition('url_checks_2000_01'),
+         Partition('url_checks_default'),
+         Partition(f'url_checks_{datetime.date.today():%Y_%m}')],
+        [Result(5, 2)],
+        None)
+
+    result = retention.drop_expired_partitions(mock_connection, keep_days=30)
+
+    assert result == ['url_checks_2000_01']
+    assert mock_db_operations.execute_query.call_count == 3
+    assert mock_connection.commit.called
+
+
+def test_create_checks_partition(mock_db_operations, mock_connection):
+    result = retention.create_checks_partition(mock_connection,
+                                               datetime.date(2000, 12, 15))
+
+    params = mock_db_operations.execute_query.call_args.kwargs['params']
+
+    assert result == 'url_checks_2000_12'
+    assert params == {'start': datetime.date(2000, 12, 1),
+                      'end': datetime.date(2001, 1, 1)}
+
+
+def test_next_month():
+    assert retention.next_month(datetime.date(2000, 1, 31)) == \
+        datetime.date(2000, 2, 1)
+    assert retention.next_month(datetime.date(2000, 12, 1)) == \
+        datetime.date(2001, 1, 1)
@@ -0,0 +1,123 @@
+import datetime
+import os
+
+import dotenv
+import pytest
+
+from page_analyzer.url_db import db_operations
+from page_analyzer.url_db import rollups
+from page_analyzer.url_db import url_db_operations
+
+dotenv.load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL', '')
+
+
+@pytest.fixture()
+def connection():
+    connect = db_operations.open_connection(DATABASE_URL)
+
+    yield connect
+
+    connect.rollback()
+    connect.close()
+
+
+def test_record_check_updates_rollups(connection):
+    before = rollups.get_stats(connection)
+    url_id = url_db_operations.create_url(connection, 'https://rollups.test')
+    today = datetime.datetime.now()
+
+    rollups.record_check(connection, url_id, 200, today)
+    rollups.record_check(connection, url_id, 200, today)
+    rollups.record_check(connection, url_id, None, today)
+
+    stats = rollups.get_stats(connection)
+    day = stats['daily'][0]
+    before_day = before['daily'][0] if before['daily'] else {
+        'day': None, 'status_counts': {}}
+    if before_day['day'] != day['day']:
+        before_day['status_counts'] = {}
+
+    assert stats['urls'] == before['urls'] + 1
+    assert stats['checks'] == before['checks'] + 3
+    assert stats['failing_urls'] == before['failing_urls'] + 1
+    assert day['day'] == today.date().isoformat()
+    assert day['status_counts']['200'] == (
+        before_day['status_counts'].get('200', 0) + 2)
+    assert day['status_counts']['error'] == (
+        before_day['status_counts'].get('error', 0) + 1)
+
+
+def test_recovered_url_is_not_failing(connection):
+    url_id = url_db_operations.create_url(connection, 'https://recover.test')
+
+    rollups.record_check(connection, url_id, 503)
+    failing = rollups.get_stats(connection)['failing_urls']
+    rollups.record_check(connection, url_id, 200)
+
+    assert rollups.get_stats(connection)['failing_urls'] == failing - 1
+
+
+def test_get_stats_days(connection):
+    url_id = url_db_operations.create_url(connection, 'https://old.test')
+    old = datetime.datetime.now() - datetime.timedelta(days=40)
+
+    rollups.record_check(connection, url_id, 200, old)
+
+    days = [day['day'] for day in rollups.get_stats(connection, 30)['daily']]
+    assert old.date().isoformat() not in days
+
+
+@pytest.mark.parametrize('status_code, failing', [
+    (200, False), (301, False), (404, True), (500, True), (None, True)])
+def test_is_failing(status_code, failing):
+    assert rollups.is_failing(status_code) is failing
+
+
+def test_record_checks_in_one_statement(connection):
+    before = rollups.get_stats(connection)
+    first = url_db_operations.create_url(connection, 'https://batch1.test')
+    second = url_db_operations.create_url(connection, 'https://batch2.test')
+    today = datetime.datetime.now()
+    earlier = today - datetime.timedelta(minutes=1)
+
+    rollups.record_checks(connection, [(first, 200, today),
+                                       (second, 200, today),
+                                       (first, 500, earlier)])
+
+    stats = rollups.get_stats(connection)
+    assert stats['checks'] == before['checks'] + 3
+    assert stats['checked_urls'] == before['checked_urls'] + 2
+    # the latest check of the first URL succeeded
+    assert stats['failing_urls'] == before['failing_urls']
+
+
+def test_older_check_keeps_latest_status(connection):
+    url_id = url_db_operations.create_url(connection, 'https://late.test')
+    today = datetime.datetime.now()
+    earlier = today - datetime.timedelta(minutes=1)
+
+    rollups.record_check(connection, url_id, 200, today)
+    before = rollups.get_stats(connection)
+    rollups.record_check(connection, url_id, 500, earlier)
+
+    stats = rollups.get_stats(connection)
+    assert stats['checks'] == before['checks'] + 1
+    assert stats['failing_urls'] == before['failing_urls']
+
+
+def test_totals_count_new_urls_and_checked_urls(connection):
+    before = rollups.get_stats(connection)
+    url_id = url_db_operations.create_url(connection, 'https://totals.test')
+    created = rollups.get_stats(connection)
+
+    rollups.record_check(connection, url_id, 404)
+    rollups.record_check(connection, url_id, 404)
+
+    stats = rollups.get_stats(connection)
+    assert created['urls'] == before['urls'] + 1
+    assert created['checked_urls'] == before['checked_urls']
+    assert stats['checked_urls'] == before['checked_urls'] + 1
+    assert stats['failing_urls'] == before['failing_urls'] + 1
+    assert stats['checks'] == before['checks'] + 2
@@ -0,0 +1,115 @@
+import os
+import typing as t
+from unittest.mock import MagicMock
+
+import dotenv
+import psycopg2
+from psycopg2 import sql
+from psycopg2.pool import PoolError
+import pytest
+
+from page_analyzer.url_db import db_operations
+from page_analyzer.url_db import routing
+
+dotenv.load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL', '')
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL', '')
+
+Lag = t.NamedTuple('Lag', lag=float)
+
+
+@pytest.fixture(autouse=True)
+def replica_state(monkeypatch):
+    monkeypatch.setattr(routing, 'DATABASE_REPLICA_URL', 'replica')
+    monkeypatch.setattr(routing, '_lag', 0.0)
+    monkeypatch.setattr(routing, '_lag_checked_at', float('-inf'))
+    monkeypatch.setattr(routing, '_down_until', float('-inf'))
+
+
+@pytest.fixture()
+def mock_db_operations(monkeypatch):
+    mock = MagicMock()
+    mock.open_connection.side_effect = lambda db_url: db_url
+    mock.execute_query.return_value = [Lag(0.5)]
+    monkeypatch.setattr('page_analyzer.url_db.routing.db_operations', mock)
+    return mock
+
+
+def test_reads_from_replica(mock_db_operations):
+    first = routing.open_read_connection('primary')
+    second = routing.open_read_connection('primary')
+
+    assert first == second == 'replica'
+    assert mock_db_operations.execute_query.call_count == 1
+    assert routing.get_replica_state()['lag_seconds'] == 0.5
+
+
+def test_reads_own_writes_from_primary(mock_db_operations):
+    result = routing.open_read_connection('primary', prefer_primary=True)
+
+    assert result == 'primary'
+
+
+def test_no_replica(mock_db_operations, monkeypatch):
+    monkeypatch.setattr(routing, 'DATABASE_REPLICA_URL', '')
+
+    result = routing.open_read_connection('primary')
+
+    assert result == 'primary'
+
+
+def test_lagging_replica(mock_db_operations):
+    mock_db_operations.execute_query.return_value = [Lag(60)]
+
+    first = routing.open_read_connection('primary')
+    second = routing.open_read_connection('primary')
+
+    assert first == second == 'primary'
+    mock_db_operations.close_connection.assert_called_once_with('replica')
+    assert mock_db_operations.open_connection.call_count == 3
+
+
+def test_replica_down(mock_db_operations):
+    def open_connection(db_url):
+        if db_url == 'replica':
+            raise psycopg2.OperationalError
+        return db_url
+
+    mock_db_operations.open_connection.side_effect = open_connection
+
+    first = routing.open_read_connection('primary')
+    second = routing.open_read_connection('primary')
+
+    assert first == second == 'primary'
+    assert routing.get_replica_state()['down']
+    assert mock_db_operations.open_connection.call_count == 3
+
+
+def test_replica_pool_busy(mock_db_operations):
+    def open_connection(db_url):
+        if db_url == 'replica':
+            raise PoolError
+        return db_url
+
+    mock_db_operations.open_connection.side_effect = open_connection
+
+    assert routing.open_read_connection('primary') == 'primary'
+    assert not routing.get_replica_state()['down']
+
+
+@pytest.mark.skipif(not DATABASE_REPLICA_URL,
+                    reason='DATABASE_REPLICA_URL is not set')
+def test_streaming_replica(monkeypatch):
+    monkeypatch.setattr(routing, 'DATABASE_REPLICA_URL', DATABASE_REPLICA_URL)
+
+    connection = routing.open_read_connection(DATABASE_URL)
+    try:
+        in_recovery = db_operations.execute_query(
+            connection, sql.SQL('SELECT pg_is_in_recovery() AS r'),
+            fetch=True)
+    finally:
+        db_operations.close_connection(connection)
+
+    assert in_recovery[0].r  # type: ignore
+    assert routing.get_replica_state()['lag_seconds'] == 0
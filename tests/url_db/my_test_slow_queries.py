@@ -0,0 +1,122 @@
+import json
+import os
+
+import dotenv
+from psycopg2 import errors
+import pytest
+
+from page_analyzer.url_db import db_operations
+from page_analyzer.url_db import slow_queries
+
+dotenv.load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL', '')
+
+
+@pytest.fixture()
+def connection():
+    connect = db_operations.open_connection(DATABASE_URL)
+
+    yield connect
+
+    connect.close()
+
+
+@pytest.fixture()
+def slow_query_log(monkeypatch, tmp_path):
+    path = tmp_path / 'slow_queries.jsonl'
+    monkeypatch.setattr(slow_queries, 'SLOW_QUERY_SECONDS', 0)
+    monkeypatch.setattr(slow_queries, 'SLOW_QUERY_EXPLAIN_RATE', 1)
+    monkeypatch.setattr(slow_queries, 'SLOW_QUERY_LOG', str(path))
+    return path
+
+
+def read_entries(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_slow_select_is_explained(connection, slow_query_log):
+    db_operations.select_data(connection=connection,
+                              table='urls',
+                              fields=[('urls', 'name')],
+                              filtering=(('urls', 'id'), 1))
+
+    entry, = read_entries(slow_query_log)
+
+    assert entry['fingerprint'] == \
+        'SELECT "urls"."name" FROM "urls" WHERE "urls"."id" = ? ;'
+    assert entry['plan'][0]['Plan']['Node Type']
+    assert 'Shared Hit Blocks' in entry['plan'][0]['Plan']
+
+
+def test_slow_insert_is_not_repeated(connection, slow_query_log):
+    db_operations.insert_data(connection=connection,
+                              table='urls',
+                              fields=['name'],
+                              data={'name': 'https://slow.example.com'})
+    result = db_operations.select_data(
+        connection=connection,
+        table='urls',
+        fields=[('urls', 'id')],
+        filtering=(('urls', 'name'), 'https://slow.example.com'))
+
+    entries = read_entries(slow_query_log)
+
+    assert len(result) == 1
+    assert entries[0]['params']['name'] == 'https://slow.example.com'
+    assert entries[0]['plan'][0]['Plan']['Node Type'] == 'ModifyTable'
+    assert 'Actual Rows' not in entries[0]['plan'][0]['Plan']
+
+
+def test_explain_does_not_run_insert(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(pg_get_serial_sequence('urls', 'id'))")
+        before, = cursor.fetchone()
+        slow_queries.explain(connection,
+                             'INSERT INTO urls (name) VALUES (%(name)s)',
+                             {'name': 'https://plan.example.com'})
+        cursor.execute("SELECT nextval(pg_get_serial_sequence('urls', 'id'))")
+        after, = cursor.fetchone()
+    connection.rollback()
+
+    assert after == before + 1
+
+
+def test_explain_releases_savepoint(connection):
+    slow_queries.explain(connection, 'SELECT 1', None)
+
+    with pytest.raises(errors.InvalidSavepointSpecification):
+        with connection.cursor() as cursor:
+            cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+    connection.rollback()
+
+
+def test_fast_query_is_not_recorded(connection, slow_query_log, monkeypatch):
+    monkeypatch.setattr(slow_queries, 'SLOW_QUERY_SECONDS', 60)
+
+    db_operations.select_data(connection=connection,
+                              table='urls',
+                              fields=[('urls', 'name')])
+
+    assert not slow_query_log.exists()
+
+
+def test_get_fingerprint():
+    statement = "SELECT * FROM \"t1\"\nWHERE id = 10 AND name = 'it''s'"
+
+    result = slow_queries.get_fingerprint(statement)
+
+    assert result == 'SELECT * FROM "t1" WHERE id = ? AND name = ?'
+
+
+def test_summarize(tmp_path):
+    path = tmp_path / 'slow_queries.jsonl'
+    entries = [{'fingerprint': 'a', 'duration_ms': 10},
+               {'fingerprint': 'b', 'duration_ms': 50, 'plan': [{}]},
+               {'fingerprint': 'a', 'duration_ms': 30}]
+    path.write_text(''.join(json.dumps(entry) + '\n' for entry in entries))
+
+    result = slow_queries.summarize(str(path), top=1)
+
+    assert result == [{'fingerprint': 'b', 'calls': 1, 'total_ms': 50,
+                       'max_ms': 50, 'explained': 1, 'mean_ms': 50}]
@@ -1,12 +1,22 @@
 from datetime import datetime
+import os
 import typing as t
 from unittest.mock import MagicMock
 
+import dotenv
 import psycopg2
 import pytest
 
+from page_analyzer import cache
+from page_analyzer.url_db import content_cache
+from page_analyzer.url_db import db_operations
+from page_analyzer.url_db import rows
 from page_analyzer.url_db import url_db_operations
 
+dotenv.load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL', '')
+
 
 @pytest.fixture()
 def mock_db_operations(monkeypatch):
@@ -22,6 +32,21 @@ def mock_connection():
     return MagicMock()
 
 
+@pytest.fixture(autouse=True)
+def mock_rollups(monkeypatch):
+    mock = MagicMock()
+    monkeypatch.setattr('page_analyzer.url_db.url_db_operations.rollups',
+                        mock)
+    return mock
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    cache.clear_caches()
+    yield
+    cache.clear_caches()
+
+
 class TestMergeURLsChecks:
     Url = t.NamedTuple('Url', id=int, name=str)
     Check = t.NamedTuple('Check', url_id=int,
@@ -50,6 +75,14 @@ class TestMergeURLsChecks:
 
         assert result == []
 
+    def test_merge_urls_checks_first_check_wins(self):
+        older = self.Check(1, datetime(2000, 1, 1, 1, 1, 1), 500)
+
+        result = url_db_operations._merge_urls_checks(
+            self.urls, [*self.url_checks, older])
+
+        assert result[1].status_code == 200
+
     def test_get_urls_second_select_empty(self):
         correct_result = [
             self.Result(2, 'http://example2.com', None, None),
@@ -101,14 +134,25 @@ class TestCreateURLCheck:
         'description': 'Example description',
     }
     url_id = 1
+    Content = t.NamedTuple('Content', id=int)
 
-    def test_create_check_success(self, mock_db_operations, mock_connection):
+    def test_create_check_success(self,
+                                  mock_db_operations,
+                                  mock_connection,
+                                  mock_rollups):
+        mock_db_operations.execute_query.return_value = [
+            rows.ContentId(3, False)]
         mock_db_operations.insert_data.return_value = None
 
         table = 'url_checks'
-        fields = ['url_id', 'status_code', 'h1',
-                  'title', 'description']
-        result_data = self.check_data | {'url_id': self.url_id}
+        fields = ['url_id', 'status_code', 'content_id', 'final_url',
+                  'redirects', 'archive_key']
+        result_data = {'url_id': self.url_id,
+                       'status_code': 200,
+                       'content_id': 3,
+                       'final_url': None,
+                       'redirects': None,
+                       'archive_key': None}
 
         url_db_operations.create_check(connection=mock_connection,
                                        url_id=self.url_id,
@@ -117,11 +161,139 @@ class TestCreateURLCheck:
         insert_call_args = mock_db_operations.insert_data.call_args
         insert_kwargs = insert_call_args.kwargs.values()
 
-        assert mock_db_operations.insert_data.called
+        assert mock_db_operations.insert_data.call_count == 1
+        assert mock_rollups.record_check.call_args.args[1:] == (
+            self.url_id, 200)
         assert table in insert_kwargs
         assert fields in insert_kwargs
         assert result_data in insert_kwargs
 
+    def test_create_check_new_content(self,
+                                      mock_db_operations,
+                                      mock_connection):
+        mock_db_operations.execute_query.return_value = []
+        mock_db_operations.insert_data.side_effect = ([self.Content(4)], None)
+
+        table = 'check_contents'
+        fields = ['digest', 'h1', 'title', 'description']
+        digest = url_db_operations.get_content_digest(self.check_data)
+
+        url_db_operations.create_check(connection=mock_connection,
+                                       url_id=self.url_id,
+                                       data=self.check_data)
+
+        content_call, check_call = \
+            mock_db_operations.insert_data.call_args_list
+        content_kwargs = content_call.kwargs
+
+        assert table in content_kwargs.values()
+        assert fields in content_kwargs.values()
+        assert content_kwargs['data']['digest'] == digest
+        assert content_kwargs['conflict'] == ['digest']
+        assert check_call.kwargs['data']['content_id'] == 4
+
+    def test_create_check_extended_content(self,
+                                           mock_db_operations,
+                                           mock_connection):
+        mock_db_operations.execute_query.return_value = []
+        mock_db_operations.insert_data.side_effect = ([self.Content(6)], None)
+        check_data = self.check_data | {
+            'lang': 'en', 'canonical': 'https://example.com/', 'robots': 1,
+            'h1_count': 1, 'h2_count': 0, 'internal_links': 2,
+            'external_links': 1, 'images': 1, 'images_with_alt': 0,
+            'open_graph': {'og:title': 'Example'}}
+
+        url_db_operations.create_check(connection=mock_connection,
+                                       url_id=self.url_id,
+                                       data=check_data)
+
+        content_kwargs = mock_db_operations.insert_data.call_args_list[0].kwargs
+
+        assert content_kwargs['fields'] == ['digest', 'h1', 'title',
+                                            'description',
+                                            *url_db_operations.SEO_FIELDS]
+        assert content_kwargs['data']['robots'] == 1
+        assert content_kwargs['data']['open_graph'].adapted == {
+            'og:title': 'Example'}
+
+    def test_create_check_redirects(self, mock_db_operations, mock_connection):
+        mock_db_operations.execute_query.return_value = [
+            rows.ContentId(3, False)]
+        check_data = self.check_data | {
+            'final_url': 'https://www.example.com/',
+            'redirects': [(301, 'http://example.com/')]}
+
+        url_db_operations.create_check(connection=mock_connection,
+                                       url_id=self.url_id,
+                                       data=check_data)
+
+        check_kwargs = mock_db_operations.insert_data.call_args.kwargs
+
+        assert check_kwargs['data']['final_url'] == 'https://www.example.com/'
+        assert check_kwargs['data']['redirects'].adapted == [
+            (301, 'http://example.com/')]
+
+    def test_create_check_concurrent_content(self,
+                                             mock_db_operations,
+                                             mock_connection):
+        mock_db_operations.execute_query.side_effect = (
+            [], [rows.ContentId(5, False)])
+        mock_db_operations.insert_data.side_effect = ([], None)
+
+        url_db_operations.create_check(connection=mock_connection,
+                                       url_id=self.url_id,
+                                       data=self.check_data)
+
+        check_call = mock_db_operations.insert_data.call_args
+
+        assert mock_db_operations.execute_query.call_count == 2
+        assert check_call.kwargs['data']['content_id'] == 5
+        digest = url_db_operations.get_content_digest(self.check_data)
+        assert content_cache.get_cached_content_id(digest) == 5
+
+    def test_create_check_cached_content(self,
+                                         mock_db_operations,
+                                         mock_connection):
+        mock_db_operations.execute_query.return_value = [
+            rows.ContentId(3, False)]
+        hits = content_cache.get_content_cache_stats()['hits']
+
+        for _ in range(2):
+            url_db_operations.create_check(connection=mock_connection,
+                                           url_id=self.url_id,
+                                           data=self.check_data)
+
+        assert mock_db_operations.execute_query.call_count == 1
+        assert mock_db_operations.insert_data.call_count == 2
+        assert content_cache.get_content_cache_stats()['hits'] == hits + 1
+
+    def test_create_check_new_content_not_cached(self,
+                                                 mock_db_operations,
+                                                 mock_connection):
+        mock_db_operations.execute_query.return_value = []
+        mock_db_operations.insert_data.side_effect = ([self.Content(4)], None)
+
+        url_db_operations.create_check(connection=mock_connection,
+                                       url_id=self.url_id,
+                                       data=self.check_data)
+
+        digest = url_db_operations.get_content_digest(self.check_data)
+        assert content_cache.get_cached_content_id(digest) is None
+
+    def test_create_check_uncommitted_content_not_cached(
+            self, mock_db_operations, mock_connection):
+        mock_db_operations.execute_query.return_value = [
+            rows.ContentId(4, True)]
+
+        url_db_operations.create_check(connection=mock_connection,
+                                       url_id=self.url_id,
+                                       data=self.check_data)
+
+        digest = url_db_operations.get_content_digest(self.check_data)
+        assert mock_db_operations.insert_data.call_args.kwargs['data'][
+            'content_id'] == 4
+        assert content_cache.get_cached_content_id(digest) is None
+
     def test_create_check_insert_error(self,
                                        mock_db_operations,
                                        mock_connection):
@@ -133,6 +305,107 @@ class TestCreateURLCheck:
                                            data=self.check_data)
 
 
+def test_record_failed_check(mock_connection, mock_rollups):
+    url_db_operations.record_failed_check(mock_connection, 1, None)
+
+    assert mock_rollups.record_check.call_args.args == (mock_connection, 1,
+                                                        None)
+
+
+def test_create_checks(mock_db_operations, mock_connection, mock_rollups):
+    mock_db_operations.execute_query.side_effect = (
+        [rows.ContentId(3, False)], [rows.ContentId(4, False)], None)
+    checked_at = datetime(2024, 1, 2)
+    checks = [(1, {'status_code': 200, 'h1': 'One'}, checked_at),
+              (2, {'status_code': 301, 'h1': 'Two', 'archive_key': b'k',
+                   'redirects': [(301, 'http://two.test/')],
+                   'final_url': 'https://two.test/'}, checked_at)]
+
+    url_db_operations.create_checks(mock_connection, checks)
+
+    params = mock_db_operations.execute_query.call_args.kwargs['params']
+    assert mock_db_operations.execute_query.call_count == 3
+    assert params['url_ids'] == [1, 2]
+    assert params['status_codes'] == [200, 301]
+    assert params['content_ids'] == [3, 4]
+    assert params['final_urls'] == [None, 'https://two.test/']
+    assert params['redirects'][0] is None
+    assert params['redirects'][1].adapted == [(301, 'http://two.test/')]
+    assert params['archive_keys'] == [None, b'k']
+    assert params['created_at'] == [checked_at, checked_at]
+    assert mock_rollups.record_checks.call_args.args[1] == [
+        (1, 200, checked_at), (2, 301, checked_at)]
+
+
+def test_create_checks_notifies_every_url_once(mock_db_operations,
+                                               mock_connection,
+                                               monkeypatch):
+    mock_change_feed = MagicMock()
+    monkeypatch.setattr(
+        'page_analyzer.url_db.url_db_operations.change_feed', mock_change_feed)
+    mock_db_operations.execute_query.return_value = [rows.ContentId(3, False)]
+    checked_at = datetime(2024, 1, 2)
+
+    url_db_operations.create_checks(
+        mock_connection, [(2, {'status_code': 200}, checked_at),
+                          (1, {'status_code': 200}, checked_at),
+                          (2, {'status_code': 500}, checked_at)])
+
+    mock_change_feed.notify.assert_called_once_with(
+        mock_connection, [{'table': 'url_checks', 'url_id': 2},
+                          {'table': 'url_checks', 'url_id': 1}])
+
+
+def test_update_archived_checks(mock_db_operations, mock_connection):
+    Count = t.NamedTuple('Count', count=int)
+    mock_db_operations.execute_query.side_effect = (
+        [rows.ContentId(3, False)], [rows.ContentId(4, False)], [Count(5)])
+    results = [(b'a', {'h1': 'One'}), (b'b', {'h1': 'Two'})]
+
+    updated = url_db_operations.update_archived_checks(mock_connection,
+                                                       results)
+
+    params = mock_db_operations.execute_query.call_args.kwargs['params']
+    assert updated == 5
+    assert params == {'keys': [b'a', b'b'], 'content_ids': [3, 4]}
+
+
+def test_update_archived_checks_error(mock_db_operations, mock_connection):
+    mock_db_operations.execute_query.side_effect = psycopg2.Error
+
+    with pytest.raises(psycopg2.Error):
+        url_db_operations.update_archived_checks(mock_connection,
+                                                 [(b'a', {'h1': 'One'})])
+
+
+def test_get_stats_error(mock_connection, mock_rollups):
+    mock_rollups.get_stats.side_effect = psycopg2.Error
+
+    with pytest.raises(psycopg2.Error):
+        url_db_operations.get_stats(mock_connection)
+
+
+def test_get_content_digest():
+    data = {'status_code': 200, 'h1': 'h1', 'title': None}
+    same_data = {'status_code': 500, 'h1': 'h1', 'description': None}
+
+    digest = url_db_operations.get_content_digest(data)
+
+    assert len(digest) == 32
+    assert digest == url_db_operations.get_content_digest(same_data)
+    assert digest != url_db_operations.get_content_digest({'h1': 'h2'})
+
+
+def test_get_content_digest_extended():
+    data = {'h1': 'h1', 'canonical': None, 'open_graph': {'og:a': 'b'}}
+
+    digest = url_db_operations.get_content_digest(data)
+
+    assert digest != url_db_operations.get_content_digest({'h1': 'h1'})
+    assert digest != url_db_operations.get_content_digest(
+        data | {'robots': 1})
+
+
 class TestCheckURL:
     url = 'http://example.com'
     Record = t.NamedTuple('Record', id=int)
@@ -258,10 +531,11 @@ class TestGetURLChecks:
         table = 'url_checks'
         fields = [('url_checks', 'id'),
                   ('url_checks', 'status_code'),
-                  ('url_checks', 'h1'),
-                  ('url_checks', 'title'),
-                  ('url_checks', 'description'),
+                  ('check_contents', 'h1'),
+                  ('check_contents', 'title'),
+                  ('check_contents', 'description'),
                   ('url_checks', 'created_at')]
+        joining = (('url_checks', 'content_id'), ('check_contents', 'id'))
         condition = (('url_checks', 'url_id'), self.url_id)
         sorting = [(('url_checks', 'created_at'), 'DESC')]
 
@@ -272,6 +546,7 @@ class TestGetURLChecks:
 
         assert table in select_kwargs
         assert fields in select_kwargs
+        assert joining in select_kwargs
         assert condition in select_kwargs
         assert sorting in select_kwargs
 
@@ -295,6 +570,34 @@ class TestGetURLChecks:
             url_db_operations.get_url_checks(mock_connection, self.url_id)
 
 
+class TestGetNewURLChecks:
+    url_id = 1
+
+    def test_get_new_url_checks_success(self,
+                                        mock_db_operations,
+                                        mock_connection):
+        checks = [rows.URLCheck(3, 200, None, None, None,
+                                datetime(2003, 3, 3, 3, 3, 3))]
+        mock_db_operations.execute_query.return_value = checks
+
+        result = url_db_operations.get_new_url_checks(mock_connection,
+                                                      self.url_id, 2)
+
+        call_kwargs = mock_db_operations.execute_query.call_args.kwargs
+        assert call_kwargs['params'] == {'url_id': self.url_id, 'after': 2}
+        assert call_kwargs['row_type'] is rows.URLCheck
+        assert result == checks
+
+    def test_get_new_url_checks_error(self,
+                                      mock_db_operations,
+                                      mock_connection):
+        mock_db_operations.execute_query.side_effect = psycopg2.Error
+
+        with pytest.raises(psycopg2.Error):
+            url_db_operations.get_new_url_checks(mock_connection,
+                                                 self.url_id, 2)
+
+
 class TestGetURL:
     url_id = 1
     Record = t.NamedTuple('Record', id=int, name=str, created_at=datetime)
@@ -336,3 +639,40 @@ class TestGetURL:
 
         with pytest.raises(psycopg2.Error):
             url_db_operations.get_url(mock_connection, self.url_id)
+
+
+def test_find_content_id_uncommitted():
+    data = {'h1': 'Uncommitted', 'title': None, 'description': None}
+    digest = url_db_operations.get_content_digest(data)
+    connection = db_operations.open_connection(DATABASE_URL)
+    try:
+        content_id = url_db_operations._store_content(connection, digest,
+                                                      data)
+        found = url_db_operations._find_content_id(connection, digest)
+        url_db_operations._get_content_id(connection, data)
+
+        assert found == (content_id, True)
+        assert content_cache.get_cached_content_id(digest) is None
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+def test_get_new_url_checks_db():
+    connection = db_operations.open_connection(DATABASE_URL)
+    try:
+        url_id = url_db_operations.create_url(connection,
+                                              'https://new-checks.test')
+        for status_code in (200, 301, 404):
+            url_db_operations.create_check(connection, url_id,
+                                           {'status_code': status_code})
+        checks = url_db_operations.get_new_url_checks(connection,
+                                                      url_id, 0)
+        newer = url_db_operations.get_new_url_checks(connection, url_id,
+                                                     checks[0].id)
+    finally:
+        connection.rollback()
+        connection.close()
+
+    assert [check.status_code for check in checks] == [200, 301, 404]
+    assert newer == checks[1:]